@@ -0,0 +1,43 @@
+"""
+Reads the same windows of a synthetic raster served over HTTP in several successive runs (as separate jobs would),
+with TLMIndex.read_window, without and with a TileByteCache shared on disk between the runs.
+"""
+
+import os
+import tempfile
+import time
+
+from rasterio.windows import Window
+from synthetic import serve_directory, write_synthetic_jp2
+
+from jp2io import TLMIndex
+from jp2io.cache import TileByteCache
+from jp2io.index import TLMMetadata
+
+
+def main(n_runs: int = 3, window_size: int = 512, latency: float = 0.02) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        index = write_synthetic_jp2(os.path.join(directory, "B04.jp2"))
+        tlm = TLMIndex.from_bytes(index, TLMMetadata(product_id="synthetic", band_id="B04", path="/synthetic/B04.jp2"))
+        windows = [Window(x, y, window_size, window_size) for y in (0, 1800, 3500) for x in (0, 1800, 3500)]
+
+        with serve_directory(directory, latency=latency) as (base_url, counters):
+            uri = f"{base_url}/B04.jp2"
+            cache_directory = os.path.join(directory, "tiles")
+            for byte_cache_enabled in (False, True):
+                for run in range(n_runs):
+                    # a new instance per run: only the files on disk are shared
+                    byte_cache = TileByteCache(cache_directory) if byte_cache_enabled else None
+                    counters["requests"] = 0
+                    t0 = time.perf_counter()
+                    for window in windows:
+                        tlm.read_window(uri, window, byte_cache=byte_cache)
+                    t1 = time.perf_counter()
+                    label = "byte cache" if byte_cache_enabled else "  no cache"
+                    print(f" {label}, run {run}: {t1 - t0:6.2f} s, {counters['requests']:4d} requests")
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
@@ -0,0 +1,105 @@
+"""
+Compares the memory used to keep the TLM indexes of a catalog of MGRS tiles in memory:
+one ParquetTLMProvider per tile, against a single CompactTLMProvider.
+
+Each provider is loaded in a separate process, which reports its resident set size (RSS) before and after loading.
+"""
+
+import gc
+import os
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from jp2io.provider import CompactTLMProvider, ParquetTLMProvider, TLMProvider
+
+BANDS = ("B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B11", "B12", "AOT", "SCL", "TCI", "WVP")
+
+
+def synthetic_index(n_tiles: int) -> bytes:
+    # u8 Ttlm and u16 Ptlm, as produced by s2tlm-indexer
+    entries = b"".join(struct.pack(">BH", i, 60000) for i in range(n_tiles))
+    tlm_segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, 0b00_01_0000) + entries
+    return struct.pack(">QQL", n_tiles * 60000 + 1000, 1000, len(tlm_segment)) + tlm_segment
+
+
+def write_catalog(directory: str, n_tiles: int, n_products: int) -> list[str]:
+    # 121 tiles for 10m bands, 36 for 20m bands, 4 for 60m bands
+    n_jp2_tiles = {"B02": 121, "B03": 121, "B04": 121, "B08": 121, "TCI": 121, "B01": 4, "B09": 4}
+    paths = []
+    for t in range(n_tiles):
+        mgrs = f"{t // 100 + 10}U{chr(ord('A') + t // 10 % 10)}{chr(ord('A') + t % 10)}"
+        product_ids = [f"S2A_MSIL2A_2024{i:04d}T105031_N0511_R051_T{mgrs}_20241016T151206" for i in range(n_products)]
+        table = pa.table(
+            {
+                "product_id": [pid for pid in product_ids for _ in BANDS],
+                "band_id": list(BANDS) * n_products,
+                "path": [f"/eodata/{pid}/{bid}.jp2" for pid in product_ids for bid in BANDS],
+                "index": [synthetic_index(n_jp2_tiles.get(bid, 36)) for _ in product_ids for bid in BANDS],
+            }
+        )
+        path = os.path.join(directory, f"{mgrs}.parquet")
+        pq.write_table(table, path)
+        paths.append(path)
+    return paths
+
+
+def rss() -> int:
+    """current resident set size, in bytes (Linux only)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def load(provider: str, directory: str) -> None:
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+    gc.collect()
+    before = rss()
+    t0 = time.perf_counter()
+    providers: dict[str, TLMProvider]
+    if provider == "parquet":
+        parquet_providers = {path: ParquetTLMProvider.from_local_file(path) for path in paths}
+        # the index blobs are Python bytes objects, each with its own header
+        index_bytes = sum(sys.getsizeof(index) for p in parquet_providers.values() for index in p.table["index"])
+        providers = dict(parquet_providers)
+    elif provider == "compact":
+        compact_provider = CompactTLMProvider.from_local_files(paths)
+        index_bytes = compact_provider.nbytes
+        providers = {"all": compact_provider}
+    else:
+        raise ValueError(provider)
+    t1 = time.perf_counter()
+    gc.collect()
+    after = rss()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(
+        f"{provider:>8}: {len(providers)} provider(s), RSS +{(after - before) / 1024**2:7.1f} MiB"
+        f" (peak {peak / 1024**2:7.1f} MiB), loaded in {t1 - t0:5.1f} s"
+    )
+    print(f"{'':>8}  of which indexes: {index_bytes / 1024**2:7.1f} MiB")
+
+
+def main(n_tiles: int = 500, n_products: int = 20) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        t0 = time.perf_counter()
+        write_catalog(directory, n_tiles, n_products)
+        print(
+            f"catalog of {n_tiles} MGRS tiles x {n_products} products x {len(BANDS)} bands"
+            f" written in {time.perf_counter() - t0:.1f} s"
+        )
+
+        for provider in ("parquet", "compact"):
+            subprocess.run([sys.executable, __file__, "load", provider, directory], check=True)
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire({"main": main, "load": load})
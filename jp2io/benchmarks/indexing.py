@@ -0,0 +1,43 @@
+"""
+Indexes copies of a synthetic raster served over HTTP with latency, one after the other with make_index
+against concurrently with make_indexes (obstore).
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from obstore.store import HTTPStore
+from synthetic import serve_directory, write_synthetic_jp2
+
+from jp2io.indexer import make_index, make_indexes
+
+
+def main(n_rasters: int = 32, latency: float = 0.02, max_concurrency: int = 16) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_jp2(os.path.join(directory, "B04.jp2"))
+        names = [f"B04-{i}.jp2" for i in range(n_rasters)]
+        for name in names:
+            shutil.copy(os.path.join(directory, "B04.jp2"), os.path.join(directory, name))
+
+        with serve_directory(directory, latency=latency) as (base_url, counters):
+            t0 = time.perf_counter()
+            sequential = [make_index(f"{base_url}/{name}") for name in names]
+            t1 = time.perf_counter()
+            print(f" make_index:   {t1 - t0:6.2f} s, {counters['requests']:5d} requests for {n_rasters} rasters")
+
+            counters["requests"] = 0
+            store = HTTPStore.from_url(base_url, client_options={"allow_http": True})
+            t0 = time.perf_counter()
+            concurrent = asyncio.run(make_indexes(store, names, max_concurrency=max_concurrency))
+            t1 = time.perf_counter()
+            print(f" make_indexes: {t1 - t0:6.2f} s, {counters['requests']:5d} requests for {n_rasters} rasters")
+            assert concurrent == sequential
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
@@ -0,0 +1,68 @@
+"""
+Peak memory of the export of the virtual cube of the 10m bands of a MGRS tile to parquet kerchunk references,
+building the whole dataset with open_all before writing it against streaming the references with iter_kerchunk_refs,
+for synthetic TLM tables of increasing numbers of products.
+"""
+
+import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import pyarrow as pa
+from obspec_utils.registry import ObjectStoreRegistry
+from virtual_cube import BANDS, synthetic_index
+
+from jp2io import ParquetTLMProvider
+from jp2io.zarr.virtualizarr import Sentinel2Datacube, iter_kerchunk_refs, write_kerchunk_parquet
+
+
+def make_datacube(n_products: int) -> Sentinel2Datacube:
+    dates = [datetime.datetime(2015, 7, 1, 10, 50, 31) + datetime.timedelta(days=2 * i) for i in range(n_products)]
+    product_ids = [f"S2A_MSIL2A_{date:%Y%m%dT%H%M%S}_N0511_R051_T31UDQ_20241016T151206" for date in dates]
+    table = pa.table(
+        {
+            "product_id": [pid for pid in product_ids for _ in BANDS],
+            "band_id": list(BANDS) * n_products,
+            "path": [f"/eodata/{pid}/{bid}.jp2" for pid in product_ids for bid in BANDS],
+            "index": [synthetic_index() for _ in product_ids for _ in BANDS],
+        }
+    )
+    return Sentinel2Datacube(
+        store_registry=ObjectStoreRegistry({}), tlm_provider=ParquetTLMProvider.from_pyarray(table)
+    )
+
+
+def measure(name: str, export: Callable[[], object], n_products: int) -> None:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    export()
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f" {name:>9}: {peak / 2**20:7.1f} MiB peak, {t1 - t0:6.2f} s for {n_products} products")
+
+
+def main(sizes: tuple[int, ...] = (250, 500, 1000)) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, "cube.kerchunk")
+        for n_products in sizes:
+            datacube = make_datacube(n_products)
+            measure(
+                "open_all",
+                lambda: datacube.open_all().vz.to_kerchunk(output_path, format="parquet"),
+                n_products,
+            )
+            measure(
+                "streaming",
+                lambda: write_kerchunk_parquet(iter_kerchunk_refs(datacube), output_path),
+                n_products,
+            )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
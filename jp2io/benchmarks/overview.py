@@ -0,0 +1,49 @@
+"""
+Reads a preview of a synthetic raster served over HTTP with TLMIndex.read_window(..., reduce=...),
+with an index without and with the end of the resolution levels of the tiles (RESO extension),
+and reports the number of bytes fetched.
+
+Without the extension, the full tiles are fetched, with it only the beginning of each tile is fetched.
+"""
+
+import dataclasses
+import os
+import tempfile
+import time
+
+from rasterio.windows import Window
+from synthetic import serve_directory, write_synthetic_jp2
+
+from jp2io import TLMIndex
+from jp2io.index import TLMMetadata, VirtualTLMIndex
+
+
+def main(reduce: int = 4, size: int = 4096, latency: float = 0.02) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        index = write_synthetic_jp2(os.path.join(directory, "B04.jp2"), size=size)
+        tlm = TLMIndex.from_bytes(index, TLMMetadata(product_id="synthetic", band_id="B04", path="/synthetic/B04.jp2"))
+        assert isinstance(tlm, VirtualTLMIndex)
+        reduced_size = -(-size // 2**reduce)
+        window = Window(0, 0, reduced_size, reduced_size)
+
+        with serve_directory(directory, latency=latency) as (base_url, counters):
+            uri = f"{base_url}/B04.jp2"
+            for label, index_tlm in (
+                ("full tiles", dataclasses.replace(tlm, resolution_ends=None)),
+                ("   prefixes", tlm),
+            ):
+                counters["requests"] = counters["bytes"] = 0
+                t0 = time.perf_counter()
+                index_tlm.read_window(uri, window, reduce=reduce)
+                t1 = time.perf_counter()
+                mib = counters["bytes"] / 1024**2
+                print(
+                    f" {label}: {t1 - t0:6.2f} s, {mib:7.2f} MiB in {counters['requests']:2d} requests"
+                    f" for a {reduced_size}x{reduced_size} preview (1/{2**reduce})"
+                )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
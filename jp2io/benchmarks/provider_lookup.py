@@ -0,0 +1,65 @@
+"""
+Measures ParquetTLMProvider.get_tlm on synthetic tables of increasing size.
+
+The lookup time should stay flat from 1k to 100k rows.
+"""
+
+import struct
+import time
+
+import pyarrow as pa
+
+from jp2io.provider import ParquetTLMProvider
+
+BANDS = ("B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B11", "B12", "AOT", "SCL", "TCI", "WVP")
+
+
+def synthetic_index() -> bytes:
+    # 121 tiles, u8 Ttlm and u16 Ptlm, as produced by s2tlm-indexer for 10m bands
+    entries = b"".join(struct.pack(">BH", i, 60000) for i in range(121))
+    tlm_segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, 0b00_01_0000) + entries
+    return struct.pack(">QQL", 121 * 60000 + 1000, 1000, len(tlm_segment)) + tlm_segment
+
+
+def synthetic_table(n_rows: int) -> pa.Table:
+    n_products = n_rows // len(BANDS)
+    product_ids = [f"S2A_MSIL2A_{i:08d}T105031_N0511_R051_T31UDQ_20241016T151206" for i in range(n_products)]
+    index = synthetic_index()
+    return pa.table(
+        {
+            "product_id": [pid for pid in product_ids for _ in BANDS],
+            "band_id": list(BANDS) * n_products,
+            "path": [f"/eodata/{pid}/{bid}.jp2" for pid in product_ids for bid in BANDS],
+            "index": [index] * (n_products * len(BANDS)),
+        }
+    )
+
+
+def main(n_lookups: int = 10_000) -> None:
+    for n_rows in (1_000, 10_000, 100_000):
+        table = synthetic_table(n_rows)
+
+        t0 = time.perf_counter()
+        provider = ParquetTLMProvider.from_pyarray(table)
+        t1 = time.perf_counter()
+
+        # worst case for a linear scan: the last products of the table
+        pids = table["product_id"].to_pylist()[-len(BANDS) * 10 :]
+        bids = table["band_id"].to_pylist()[-len(BANDS) * 10 :]
+        keys = list(zip(pids, bids))
+
+        t2 = time.perf_counter()
+        for i in range(n_lookups):
+            provider.get_tlm(*keys[i % len(keys)])
+        t3 = time.perf_counter()
+
+        print(
+            f"{n_rows:>7} rows: construction {1e3 * (t1 - t0):8.1f} ms,"
+            f" lookup {1e6 * (t3 - t2) / n_lookups:6.2f} us/call"
+        )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
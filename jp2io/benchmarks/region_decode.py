@@ -0,0 +1,48 @@
+"""
+Reads small windows (point extraction, small chips) from a synthetic raster with TLMIndex.read_window,
+decoding the full tiles (as with a TileCache) and only the precincts covering the windows.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from rasterio.windows import Window
+from synthetic import write_synthetic_jp2
+
+from jp2io import TLMIndex
+from jp2io.cache import TileCache
+from jp2io.index import TLMMetadata
+
+
+def main(window_size: int = 64, count: int = 50, seed: int = 0) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "B04.jp2")
+        index = write_synthetic_jp2(path)
+        tlm = TLMIndex.from_bytes(index, TLMMetadata(product_id="synthetic", band_id="B04", path=path))
+
+        rng = np.random.default_rng(seed)
+        windows = [
+            Window(int(x), int(y), window_size, window_size) for x, y in rng.integers(0, 4096 - window_size, (count, 2))
+        ]
+
+        # with a tile cache the tiles are decoded in full, a cache without budget does not keep them
+        t0 = time.perf_counter()
+        for window in windows:
+            full = tlm.read_window(path, window, tile_cache=TileCache(max_bytes=0))
+        t1 = time.perf_counter()
+        print(f" full tiles: {(t1 - t0) / count * 1000:6.1f} ms per {window_size}x{window_size} window")
+
+        t0 = time.perf_counter()
+        for window in windows:
+            region = tlm.read_window(path, window)
+        t1 = time.perf_counter()
+        print(f"     region: {(t1 - t0) / count * 1000:6.1f} ms per {window_size}x{window_size} window")
+        np.testing.assert_array_equal(full, region)
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
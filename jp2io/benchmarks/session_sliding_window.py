@@ -0,0 +1,56 @@
+"""
+Reads a sliding window over a synthetic raster served over HTTP, with TLMIndex.open for each window
+against a single ReaderSession.
+
+The session opens the raster once, instead of building the sparse file and fetching the header for each window.
+"""
+
+import os
+import tempfile
+import time
+import warnings
+
+from rasterio.windows import Window
+from synthetic import serve_directory, write_synthetic_jp2
+
+from jp2io import ReaderSession, TLMIndex
+from jp2io.index import TLMMetadata
+
+
+def main(n_windows: int = 50, window_size: int = 256, latency: float = 0.02) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        index = write_synthetic_jp2(os.path.join(directory, "B04.jp2"))
+        meta = TLMMetadata(product_id="synthetic", band_id="B04", path="/synthetic/B04.jp2")
+        tlm = TLMIndex.from_bytes(index, meta)
+
+        # diagonal sliding window, with half of each window overlapping the previous one
+        step = window_size // 2
+        windows = [Window(i * step % 3800, i * step % 3800, window_size, window_size) for i in range(n_windows)]
+
+        with serve_directory(directory, latency=latency) as (base_url, counters):
+            uri = f"/vsicurl/{base_url}/B04.jp2"
+            # without the cache of /vsicurl/, which would otherwise keep the header between the opens
+            env = {"CPL_VSIL_CURL_NON_CACHED": uri}
+
+            t0 = time.perf_counter()
+            for window in windows:
+                with tlm.open(uri, env) as src:
+                    src.read(1, window=window)
+            t1 = time.perf_counter()
+            print(f"  open per window: {t1 - t0:6.2f} s, {counters['requests']:4d} requests")
+
+            counters["requests"] = 0
+            t0 = time.perf_counter()
+            with ReaderSession(env_options=env) as session:
+                for window in windows:
+                    session.read(tlm, uri, window)
+            t1 = time.perf_counter()
+            print(f"   reader session: {t1 - t0:6.2f} s, {counters['requests']:4d} requests")
+
+
+if __name__ == "__main__":
+    import fire
+    import rasterio
+
+    warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+    fire.Fire(main)
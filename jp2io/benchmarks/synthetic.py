@@ -0,0 +1,159 @@
+"""
+Helpers shared by the benchmarks: a synthetic JP2 encoded like Sentinel-2 rasters, and a local HTTP server.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import struct
+import threading
+import time
+import warnings
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Generator
+
+import numpy as np
+import rasterio
+
+from jp2io.codestream import MainHeader
+
+
+def write_synthetic_jp2(path: str, size: int = 4096, tile_size: int = 1024) -> bytes:
+    """
+    Writes a lossless 15 bits JP2 with PLT markers and without TLM (as Sentinel-2 L2A rasters), and returns its index.
+    """
+    yy, xx = np.mgrid[0:size, 0:size]
+    noise = np.random.default_rng(0).integers(0, 200, (size, size))
+    array = ((np.sin(xx / 170) + np.cos(yy / 230)) * 3000 + 8000 + noise).astype(np.uint16)
+
+    profile = dict(driver="JP2OpenJPEG", width=size, height=size, count=1, dtype="uint16")
+    options = dict(
+        blockxsize=tile_size,
+        blockysize=tile_size,
+        CODEC="JP2",
+        QUALITY=100,
+        REVERSIBLE="YES",
+        NBITS=15,
+        RESOLUTIONS=6,
+        PRECINCTS="{256,256},{256,256},{256,256},{256,256},{256,256},{256,256}",
+        CODEBLOCK_WIDTH=64,
+        CODEBLOCK_HEIGHT=64,
+        PLT="ON",
+        TLM="OFF",
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(path, "w", **profile, **options) as dst:
+            dst.write(array, 1)
+
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+
+    # the length of the codestream box would not match once the TLM is injected, 0 means "until the end of the file"
+    jp2c = data.index(b"jp2c") - 4
+    data[jp2c : jp2c + 4] = struct.pack(">I", 0)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    return index_jp2(bytes(data))
+
+
+def index_jp2(data: bytes) -> bytes:
+    """
+    Indexes a JP2 file in memory, in the format of s2tlm-indexer, with the end of the resolution levels (RESO).
+    """
+    cur = 0
+    while True:
+        length, boxtype = struct.unpack_from(">II", data, cur)
+        if boxtype == 0x6A703263:  # jp2c
+            cur += 8
+            break
+        cur += length
+
+    cur += 2  # SOC
+    while True:
+        code, length = struct.unpack_from(">HH", data, cur)
+        if code == 0xFF90:  # SOT
+            break
+        cur += 2 + length
+    position_first_sot = cur
+
+    header = MainHeader.parse(data[:position_first_sot])
+    entries = b""
+    resolution_ends = bytes([header.cod.levels + 1])
+    n_tiles = 0
+    while struct.unpack_from(">H", data, cur)[0] != 0xFFD9:  # EOC
+        psot = struct.unpack_from(">I", data, cur + 6)[0]
+        entries += struct.pack(">BI", n_tiles, psot)
+        ends = header.resolution_ends(n_tiles, data[cur : cur + psot])
+        assert ends is not None
+        resolution_ends += struct.pack(f">{len(ends)}I", *ends)
+        n_tiles += 1
+        cur += psot
+
+    tlm_segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, 0b01_01_0000) + entries
+    index = struct.pack(">QQL", len(data), position_first_sot, len(tlm_segment)) + tlm_segment
+    return index + struct.pack(">4sL", b"RESO", len(resolution_ends)) + resolution_ends
+
+
+@contextlib.contextmanager
+def serve_directory(directory: str, latency: float = 0.0) -> Generator[tuple[str, dict[str, int]]]:
+    """
+    Serves a directory over HTTP with support of range requests, with an optional latency per request.
+
+    Yields the base URL and the counters of requests and bytes sent.
+    """
+    counters = {"requests": 0, "bytes": 0}
+    lock = threading.Lock()
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_HEAD(self) -> None:
+            self._respond(send_body=False)
+
+        def do_GET(self) -> None:
+            self._respond(send_body=True)
+
+        def _respond(self, send_body: bool) -> None:
+            time.sleep(latency)
+            path = self.translate_path(self.path)
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            size = os.path.getsize(path)
+            start, end = 0, size - 1
+            range_header = self.headers.get("Range")
+            if range_header is not None:
+                start_str, end_str = range_header.removeprefix("bytes=").split("-")
+                start, end = int(start_str), min(int(end_str), size - 1)
+
+            with open(path, "rb") as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+
+            self.send_response(206 if range_header is not None else 200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(len(body)))
+            if range_header is not None:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            with lock:
+                counters["requests"] += 1
+                counters["bytes"] += len(body) if send_body else 0
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", counters
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,52 @@
+"""
+Reads overlapping windows (as tiled inference does) from a synthetic raster with TLMIndex.read_window,
+without and with a TileCache, and reports the number of tiles decoded.
+"""
+
+import os
+import tempfile
+import time
+
+from rasterio.windows import Window
+from synthetic import write_synthetic_jp2
+
+from jp2io import TLMIndex
+from jp2io.cache import TileCache
+from jp2io.index import TLMMetadata
+
+
+def main(window_size: int = 512, stride: int = 256, max_megabytes: int = 256) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "B04.jp2")
+        index = write_synthetic_jp2(path)
+        tlm = TLMIndex.from_bytes(index, TLMMetadata(product_id="synthetic", band_id="B04", path=path))
+
+        windows = [
+            Window(x, y, window_size, window_size)
+            for y in range(0, 4096 - window_size + 1, stride)
+            for x in range(0, 4096 - window_size + 1, stride)
+        ]
+        # a cache without budget only counts the tiles decoded
+        no_cache = TileCache(max_bytes=0)
+        t0 = time.perf_counter()
+        for window in windows:
+            tlm.read_window(path, window, tile_cache=no_cache)
+        t1 = time.perf_counter()
+        print(f"   no cache: {t1 - t0:6.2f} s, {no_cache.stats.misses:4d} tiles decoded for {len(windows)} windows")
+
+        tile_cache = TileCache(max_bytes=max_megabytes * 1024**2)
+        t0 = time.perf_counter()
+        for window in windows:
+            tlm.read_window(path, window, tile_cache=tile_cache)
+        t1 = time.perf_counter()
+        stats = tile_cache.stats
+        print(
+            f" tile cache: {t1 - t0:6.2f} s, {stats.misses:4d} tiles decoded for {len(windows)} windows"
+            f" ({stats.hits} hits, {stats.evictions} evictions, {tile_cache.nbytes / 1024**2:.0f} MiB cached)"
+        )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
@@ -0,0 +1,60 @@
+"""
+Builds the virtual (time, y, x) cube of the 10m bands of a MGRS tile with Sentinel2Datacube,
+one dataset per product concatenated with xarray (as open_all did before), against the bulk open_all,
+for a synthetic TLM table of `n_products` products.
+"""
+
+import datetime
+import struct
+import time
+
+import pyarrow as pa
+import xarray as xr
+from obspec_utils.registry import ObjectStoreRegistry
+
+from jp2io import ParquetTLMProvider
+from jp2io.zarr.virtualizarr import Sentinel2Datacube
+
+BANDS = ("B02", "B03", "B04", "B08")
+
+
+def synthetic_index(n_tiles: int = 121) -> bytes:
+    # u8 Ttlm and u16 Ptlm, as produced by s2tlm-indexer
+    entries = b"".join(struct.pack(">BH", i, 60000) for i in range(n_tiles))
+    tlm_segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, 0b00_01_0000) + entries
+    return struct.pack(">QQL", n_tiles * 60000 + 1000, 1000, len(tlm_segment)) + tlm_segment
+
+
+def main(n_products: int = 500) -> None:
+    dates = [datetime.datetime(2015, 7, 1, 10, 50, 31) + datetime.timedelta(days=5 * i) for i in range(n_products)]
+    product_ids = [f"S2A_MSIL2A_{date:%Y%m%dT%H%M%S}_N0511_R051_T31UDQ_20241016T151206" for date in dates]
+    table = pa.table(
+        {
+            "product_id": [pid for pid in product_ids for _ in BANDS],
+            "band_id": list(BANDS) * n_products,
+            "path": [f"/eodata/{pid}/{bid}.jp2" for pid in product_ids for bid in BANDS],
+            "index": [synthetic_index() for _ in product_ids for _ in BANDS],
+        }
+    )
+    datacube = Sentinel2Datacube(
+        store_registry=ObjectStoreRegistry({}), tlm_provider=ParquetTLMProvider.from_pyarray(table)
+    )
+
+    t0 = time.perf_counter()
+    per_product = xr.concat(
+        [datacube.open_r10m(pid) for pid in product_ids], dim="time", coords="minimal", data_vars="minimal"
+    )
+    t1 = time.perf_counter()
+    print(f" per product: {t1 - t0:6.2f} s for {len(product_ids)} products")
+
+    t0 = time.perf_counter()
+    bulk = datacube.open_all()
+    t1 = time.perf_counter()
+    print(f"        bulk: {t1 - t0:6.2f} s for {len(product_ids)} products")
+    assert per_product.sizes == bulk.sizes
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
@@ -0,0 +1,97 @@
+"""
+Decodes batches of chunks with the zarr v3 Sentinel2Jpeg2000Codec, for several sizes of the decoder pool,
+and reports the throughput in chunks/s and chunks/s per core used (at most one per thread).
+
+The tiles come from a synthetic raster encoded with the tiling, resolution levels and precincts of Sentinel-2:
+the codec decodes them with the Sentinel-2 header, whose quantization differs from the synthetic one,
+so the decoding work is the same but the decoded values are not checked.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import rasterio
+from zarr.core.array_spec import ArrayConfig, ArraySpec
+from zarr.core.buffer import default_buffer_prototype
+from zarr.core.buffer.cpu import Buffer
+from zarr.core.dtype import parse_dtype
+
+from jp2io.zarr.codec import Sentinel2Jpeg2000Codec, set_decoder_pool_size
+
+
+def write_tiles(path: str, size: int = 4096) -> list[bytes]:
+    """
+    Writes a JPEG2000 codestream tiled as the 10m bands of Sentinel-2, and returns its tile-parts.
+    """
+    yy, xx = np.mgrid[0:size, 0:size]
+    noise = np.random.default_rng(0).integers(0, 200, (size, size))
+    array = ((np.sin(xx / 170) + np.cos(yy / 230)) * 3000 + 8000 + noise).astype(np.uint16)
+
+    profile = dict(driver="JP2OpenJPEG", width=size, height=size, count=1, dtype="uint16")
+    options = dict(
+        blockxsize=1024,
+        blockysize=1024,
+        CODEC="J2K",
+        QUALITY=100,
+        REVERSIBLE="YES",
+        NBITS=15,
+        RESOLUTIONS=5,
+        PRECINCTS="{256,256},{256,256},{256,256},{256,256},{256,256}",
+        CODEBLOCK_WIDTH=64,
+        CODEBLOCK_HEIGHT=64,
+        TLM="ON",
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(path, "w", **profile, **options) as dst:
+            dst.write(array, 1)
+
+    with open(path, "rb") as f:
+        data = f.read()
+    tiles = []
+    cur = data.index(b"\xff\x90")
+    while data[cur : cur + 2] == b"\xff\x90":
+        length = int.from_bytes(data[cur + 6 : cur + 10], "big")
+        tiles.append(data[cur : cur + length])
+        cur += length
+    return tiles
+
+
+def main(batch: int = 64, pool_sizes: tuple[int, ...] = (1, 2, 4), reduce: int = 0) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        tiles = write_tiles(os.path.join(directory, "B04.j2k"))
+
+    chunk_size = 1024 >> reduce
+    spec = ArraySpec(
+        shape=(chunk_size, chunk_size),
+        dtype=parse_dtype("uint16", zarr_format=3),
+        fill_value=0,
+        config=ArrayConfig(order="C", write_empty_chunks=False),
+        prototype=default_buffer_prototype(),
+    )
+    chunks = [(Buffer.from_bytes(tiles[i % len(tiles)]), spec) for i in range(batch)]
+    codec = Sentinel2Jpeg2000Codec(reduce=reduce)
+
+    pool_sizes = tuple(sorted({*pool_sizes, os.cpu_count() or 1}))
+    for pool_size in pool_sizes:
+        set_decoder_pool_size(pool_size)
+        asyncio.run(codec.decode(chunks[:pool_size]))  # warm-up
+        t0 = time.perf_counter()
+        asyncio.run(codec.decode(chunks))
+        t1 = time.perf_counter()
+        throughput = batch / (t1 - t0)
+        cores = min(pool_size, os.cpu_count() or 1)
+        print(
+            f" {pool_size:3d} threads: {throughput:6.1f} chunks/s, {throughput / cores:5.1f} chunks/s per core"
+            f" ({chunk_size}x{chunk_size} chunks)"
+        )
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
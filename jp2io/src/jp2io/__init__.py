@@ -1,7 +1,12 @@
+from .cache import ShardDiskCache as ShardDiskCache
 from .exception import JP2IOException as JP2IOException
 from .index import TLMIndex as TLMIndex
+from .indexer import IndexingTLMProvider as IndexingTLMProvider
+from .provider import CompactTLMProvider as CompactTLMProvider
+from .provider import LazyParquetTLMProvider as LazyParquetTLMProvider
 from .provider import ParquetTLMProvider as ParquetTLMProvider
 from .provider import S3TLMProvider as S3TLMProvider
 from .provider import TLMProvider as TLMProvider
+from .session import ReaderSession as ReaderSession
 
 # TODO: warn if the good openjpeg is not installed
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import obstore
+import pyarrow.parquet as pq
+from numpy.typing import NDArray
+from obstore.exceptions import NotFoundError
+from obstore.store import ObjectStore
+from rasterio.windows import Window
+from typing_extensions import override
+
+from jp2io.cache import TileByteCache, TileCache
+from jp2io.exception import JP2IOException, TLMIndexNotFound
+from jp2io.index import TLMIndex, VirtualTLMIndex
+from jp2io.planner import CoalescedRange, plan_ranges
+from jp2io.provider import LazyParquetTLMProvider, TLMProvider, _RangeFile
+from jp2io.reader import WindowAssembler, decode_tile
+
+
+class AsyncTLMProvider(abc.ABC):
+    """
+    asyncio equivalent of TLMProvider, see `ObjectStoreTLMProvider`. Requires the optional dependencies `jp2io[aio]`.
+    """
+
+    @abc.abstractmethod
+    async def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        """
+        Returns a TLMIndex object for the given product_id and band_id.
+
+        Raises:
+            TLMIndexNotFound: if no TLMIndex object is found.
+        """
+
+    @staticmethod
+    def wrap(provider: TLMProvider) -> AsyncTLMProvider:
+        """
+        Async interface over an in-memory provider (ParquetTLMProvider, CompactTLMProvider, ...).
+        The lookups are made in the event loop, do not use it with providers making requests.
+        """
+        return _WrappedTLMProvider(provider=provider)
+
+
+@dataclass(frozen=True)
+class _WrappedTLMProvider(AsyncTLMProvider):
+    provider: TLMProvider
+
+    @override
+    async def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        return self.provider.get_tlm(product_id, band_id)
+
+
+@dataclass(frozen=True)
+class ObjectStoreTLMProvider(AsyncTLMProvider):
+    """
+    Async equivalent of S3TLMProvider: the TLM parquet files are read with ranged requests of obstore,
+    the footer first, then only the row groups that can contain the requested product. The parquet files are opened
+    once per (level, mgrs_tile) even when requested concurrently, and missing parquet files are remembered for
+    `negative_cache_ttl` seconds.
+
+    The row groups are read and decoded in threads (`asyncio.to_thread`), not in the event loop.
+
+    The provider should only be used from a single event loop.
+    """
+
+    store: ObjectStore
+    path_pattern: str
+    """ path of the parquet files in the store, must contain {level} and {mgrs_tile} as a placeholder """
+    maxsize: int = 32
+    """ number of parquet files kept in memory """
+    negative_cache_ttl: float = 300.0
+    """ in seconds """
+
+    _providers: collections.OrderedDict[tuple[str, str], asyncio.Task[TLMProvider]] = field(
+        init=False, repr=False, compare=False, default_factory=collections.OrderedDict
+    )
+    _missing: dict[tuple[str, str], tuple[float, TLMIndexNotFound]] = field(
+        init=False, repr=False, compare=False, default_factory=dict
+    )
+
+    @override
+    async def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        mgrs_tile = product_id.split("_")[5][1:]
+        level = product_id.split("_")[1][3:]
+        provider = await self._get_provider((level, mgrs_tile))
+        return await asyncio.to_thread(provider.get_tlm, product_id, band_id)
+
+    async def _get_provider(self, key: tuple[str, str]) -> TLMProvider:
+        if key in self._missing:
+            expiration, exception = self._missing[key]
+            if time.monotonic() < expiration:
+                # the exception is shared by the lookups, its traceback would grow with each of them
+                raise exception.with_traceback(None)
+            del self._missing[key]
+
+        task = self._providers.get(key)
+        if task is None:
+            # concurrent calls await the same task
+            task = asyncio.ensure_future(self._load_provider(*key))
+            self._providers[key] = task
+            while len(self._providers) > self.maxsize:
+                self._providers.popitem(last=False)
+        self._providers.move_to_end(key)
+
+        try:
+            # shielded: the cancellation of a caller does not cancel the load for the others
+            return await asyncio.shield(task)
+        except BaseException as e:
+            if task.done() and self._providers.get(key) is task:
+                del self._providers[key]
+                if isinstance(e, TLMIndexNotFound):
+                    self._missing[key] = (time.monotonic() + self.negative_cache_ttl, e)
+            raise
+
+    async def _load_provider(self, level: str, mgrs_tile: str) -> TLMProvider:
+        path = self.path_pattern.format(level=level, mgrs_tile=mgrs_tile)
+        try:
+            file = await _ObjectStoreRangeFile.open(self.store, path)
+        except (FileNotFoundError, NotFoundError):
+            raise TLMIndexNotFound(f"Could not find TLM Parquet file for collection {level} and tile {mgrs_tile}")
+
+        def open_parquet() -> TLMProvider:
+            # pre_buffer coalesces the reads of the column chunks of a row group into a single request
+            return LazyParquetTLMProvider(parquet_file=pq.ParquetFile(file, pre_buffer=True))
+
+        return await asyncio.to_thread(open_parquet)
+
+
+class _ObjectStoreRangeFile(_RangeFile):
+    """
+    `_RangeFile` over an object of an obstore store. The tail is fetched asynchronously by `open`,
+    the other ranges synchronously, from the threads reading the row groups.
+    """
+
+    def __init__(self, store: ObjectStore, path: str, tail: bytes, size: int) -> None:
+        self.store = store
+        self.path = path
+        super().__init__(tail, size)
+
+    @staticmethod
+    async def open(store: ObjectStore, path: str, tail_size: int = 64 * 1024) -> _ObjectStoreRangeFile:
+        result = await obstore.get_async(store, path, options={"range": {"suffix": tail_size}})
+        tail = bytes(await result.bytes_async())
+        return _ObjectStoreRangeFile(store, path, tail, result.meta["size"])
+
+    @override
+    def read_range(self, start: int, end: int) -> bytes:
+        return bytes(obstore.get_range(self.store, self.path, start=start, end=end))
+
+
+@functools.cache
+def _default_decode_executor() -> concurrent.futures.Executor:
+    return concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="jp2io-decode")
+
+
+async def read_window(
+    tlm: TLMIndex,
+    store: ObjectStore,
+    path: str,
+    window: Window,
+    executor: concurrent.futures.Executor | None = None,
+    max_gap: int = 64 * 1024,
+    tile_cache: TileCache | None = None,
+    byte_cache: TileByteCache | None = None,
+    reduce: int = 0,
+) -> NDArray[Any]:
+    """
+    Async equivalent of `TLMIndex.read_window`: the tiles intersecting the window are fetched with obstore,
+    and decoded in `executor`. A single event loop can read many windows concurrently, without a thread per request.
+
+    Parameters
+    ----------
+    store
+        Store containing the raster, for example an obstore.store.S3Store on the CDSE bucket.
+    path
+        Path of the raster in the store, for example `tlm.path`.
+    executor
+        Executor in which the tiles are decoded, by default a thread pool with one thread per CPU,
+        shared by all the calls, so that the number of concurrent decodes is bounded whatever the number of requests.
+    max_gap
+        Byte ranges of tiles separated by at most `max_gap` bytes are fetched with a single request.
+    tile_cache
+        Decoded tiles shared between the reads, keyed by `path`.
+    byte_cache
+        Compressed tiles cached on disk, keyed by `path`. The disk accesses are made in `executor`.
+    reduce
+        Reads the image at 1/2**reduce of its resolution, see `TLMIndex.read_window`.
+    """
+    if not isinstance(tlm, VirtualTLMIndex):
+        raise JP2IOException("read_window is not supported for JP2 files that already contain a TLM")
+    if executor is None:
+        executor = _default_decode_executor()
+    loop = asyncio.get_running_loop()
+
+    main_header = tlm.main_header
+    if main_header is None:
+        main_header = bytes(await obstore.get_range_async(store, path, start=0, length=tlm.position_first_sot))
+    assembler = WindowAssembler.prepare(main_header, window, reduce)
+
+    ranges = tlm.into_tiles_range(reduce)
+
+    def decode(tile_index: int, tile_data: bytes | memoryview, fetched: bool) -> NDArray[Any]:
+        if fetched and byte_cache is not None:
+            offset, length = int(ranges.tiles_position[tile_index]), int(ranges.tiles_length[tile_index])
+            byte_cache.put(path, offset, length, tile_data)
+        region = None if tile_cache is not None else assembler.region(tile_index)
+        return decode_tile(assembler.header, tile_index, tile_data, region)
+
+    async def decode_and_paste(tile_index: int, tile_data: bytes | memoryview, fetched: bool) -> None:
+        tile = await loop.run_in_executor(executor, decode, tile_index, tile_data, fetched)
+        if tile_cache is not None:
+            tile_cache.put(TileCache.key(path, tile_index, reduce), tile)
+        assembler.paste(tile_index, tile)
+
+    async def fetch_and_decode(coalesced: CoalescedRange) -> None:
+        buf = await obstore.get_range_async(store, path, start=coalesced.offset, length=coalesced.length)
+        await asyncio.gather(
+            *(
+                decode_and_paste(tile_index, tile_data, fetched=True)
+                for tile_index, tile_data in zip(coalesced.tiles, coalesced.split(memoryview(buf)))
+            )
+        )
+
+    def get_cached(tiles: list[int]) -> list[tuple[int, memoryview | None]]:
+        assert byte_cache is not None
+        return [(t, byte_cache.get(path, int(ranges.tiles_position[t]), int(ranges.tiles_length[t]))) for t in tiles]
+
+    tiles = assembler.tiles()
+    if tile_cache is not None:
+        tiles = assembler.paste_from_cache(tile_cache, path)
+
+    cached: list[tuple[int, memoryview]] = []
+    if byte_cache is not None:
+        lookups = await loop.run_in_executor(executor, get_cached, tiles)
+        cached = [(t, data) for t, data in lookups if data is not None]
+        tiles = [t for t, data in lookups if data is None]
+
+    plan = plan_ranges(ranges, tiles, max_gap=max_gap)
+    await asyncio.gather(
+        *(decode_and_paste(tile_index, tile_data, fetched=False) for tile_index, tile_data in cached),
+        *(fetch_and_decode(coalesced) for coalesced in plan),
+    )
+    return assembler.result()
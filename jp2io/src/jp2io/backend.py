@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy as np
+import xarray as xr
+from numpy.typing import NDArray
+from rasterio.windows import Window
+from typing_extensions import override
+from xarray.backends import BackendArray, BackendEntrypoint
+from xarray.core import indexing
+
+from jp2io.cache import SingleFlightCache
+from jp2io.codestream import ImageAndTileSize, MainHeader
+from jp2io.exception import JP2IOException
+from jp2io.index import TLMIndex, VirtualTLMIndex
+from jp2io.provider import ParquetTLMProvider, TLMProvider
+from jp2io.rangereader import RangeReader
+from jp2io.timeseries import sensing_time
+
+
+@dataclass(frozen=True, eq=False)
+class TLMBackendArray(BackendArray):
+    """
+    Lazy (time, y, x) array of a band over several products, read with `TLMIndex.read_window`:
+    only the tiles containing the requested pixels are fetched and decoded.
+    """
+
+    tlms: Sequence[VirtualTLMIndex]
+    """ index of the raster of each time step """
+    uri_of: Callable[[TLMIndex], str]
+    range_reader: RangeReader | None
+    reduce: int
+    shape: tuple[int, int, int]
+    dtype: np.dtype[Any]
+    executor: concurrent.futures.Executor | None = None
+    """ reads the time steps of a selection concurrently, one after another if None """
+
+    _rasters: SingleFlightCache[int, tuple[VirtualTLMIndex, ImageAndTileSize]] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        # the main header is fetched once per raster, instead of once per read
+        rasters: SingleFlightCache[int, tuple[VirtualTLMIndex, ImageAndTileSize]] = SingleFlightCache(
+            maxsize=max(len(self.tlms), 1)
+        )
+        object.__setattr__(self, "_rasters", rasters)
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> Any:
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC, self._getitem)
+
+    def _getitem(self, key: tuple[int | slice, ...]) -> NDArray[Any]:
+        times, rows, cols = (np.atleast_1d(np.arange(size)[k]) for k, size in zip(key, self.shape))
+        out = np.zeros((len(times), len(rows), len(cols)), dtype=self.dtype)
+
+        def read(i: int) -> None:
+            tlm, siz = self._raster(int(times[i]))
+            # one window per run of consecutive tiles containing selected pixels, so that the tiles skipped by
+            # a strided selection are not read
+            for rs in _tile_runs(rows, siz.ytsiz, siz.yosiz - siz.ytosiz):
+                for cs in _tile_runs(cols, siz.xtsiz, siz.xosiz - siz.xtosiz):
+                    r, c = rows[rs], cols[cs]
+                    window = Window(c[0], r[0], c[-1] - c[0] + 1, r[-1] - r[0] + 1)
+                    array = tlm.read_window(
+                        self.uri_of(tlm), window, range_reader=self.range_reader, reduce=self.reduce
+                    )
+                    out[i, rs, cs] = array[r[:, None] - r[0], c[None, :] - c[0]]
+
+        if out.size > 0:
+            if self.executor is None or len(times) == 1:
+                for i in range(len(times)):
+                    read(i)
+            else:
+                # each time step fills its own slice of `out`
+                for future in [self.executor.submit(read, i) for i in range(len(times))]:
+                    future.result()
+        squeeze = tuple(0 if isinstance(k, (int, np.integer)) else slice(None) for k in key)
+        result: NDArray[Any] = out[squeeze]
+        return result
+
+    def _raster(self, t: int) -> tuple[VirtualTLMIndex, ImageAndTileSize]:
+        def load() -> tuple[VirtualTLMIndex, ImageAndTileSize]:
+            tlm = _with_main_header(self.tlms[t], self.uri_of(self.tlms[t]), self.range_reader)
+            assert tlm.main_header is not None
+            return tlm, MainHeader.parse(tlm.main_header).reduced(self.reduce).siz
+
+        return self._rasters.get(t, load)
+
+
+def _tile_runs(pixels: NDArray[Any], tile_size: int, offset: int) -> list[slice]:
+    """
+    Splits increasing pixel coordinates into runs of pixels in consecutive tiles, returned as slices of `pixels`.
+    `offset` is the position of the first pixel in the tile grid.
+    """
+    tiles = (pixels + offset) // tile_size
+    bounds = [0, *(np.flatnonzero(np.diff(tiles) > 1) + 1).tolist(), len(pixels)]
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _with_main_header(tlm: VirtualTLMIndex, uri: str, range_reader: RangeReader | None) -> VirtualTLMIndex:
+    if tlm.main_header is not None:
+        return tlm
+    if range_reader is None:
+        range_reader = RangeReader.for_uri(uri)
+    return dataclasses.replace(tlm, main_header=range_reader.read(uri, 0, tlm.position_first_sot))
+
+
+def open_tlm_dataset(
+    tlm_provider: TLMProvider,
+    product_ids: Sequence[str],
+    bands: Sequence[str],
+    uri_of: Callable[[TLMIndex], str] | None = None,
+    range_reader: RangeReader | None = None,
+    reduce: int = 0,
+    executor: concurrent.futures.Executor | None = None,
+) -> xr.Dataset:
+    """
+    Opens the bands of the products as lazy (time, y, x) variables, from their TLM indexes only:
+    the main header of the first product of each band is read to know the size of the rasters,
+    the other reads are deferred until the values are accessed.
+
+    With `xr.open_dataset(..., engine="jp2io", chunks={})`, the variables are dask arrays with one chunk per tile.
+
+    Parameters
+    ----------
+    product_ids
+        Products of the time series, in this order.
+    bands
+        Bands of the same resolution, as they share the dimensions y and x.
+    uri_of
+        Returns the path of the raster of a band, as accepted by `TLMIndex.read_window`,
+        for example `lambda tlm: f"https://.../{tlm.path}"`. By default the path of the index.
+    range_reader
+        Used to fetch the tiles, by default `RangeReader.for_uri`.
+    reduce
+        Number of resolution levels discarded, the variables being at 1/2**reduce of the resolution of the rasters.
+    executor
+        Reads the time steps of each access concurrently, for example `ReaderSession.executor`.
+        By default they are read one after another, and the only parallelism is the one of dask over the chunks.
+        The accesses should not be made from the threads of `executor`, which would wait for themselves.
+    """
+    if not product_ids:
+        raise JP2IOException("no product to open")
+    if uri_of is None:
+        uri_of = _path_of
+
+    variables = {}
+    shape = None
+    for bid in bands:
+        tlms = []
+        for pid in product_ids:
+            tlm = tlm_provider.get_tlm(pid, bid)
+            if not isinstance(tlm, VirtualTLMIndex):
+                raise JP2IOException(f"the raster of {pid} {bid} already contains a TLM, use TLMIndex.open")
+            tlms.append(tlm)
+        first = _with_main_header(tlms[0], uri_of(tlms[0]), range_reader)
+        assert first.main_header is not None
+        siz = MainHeader.parse(first.main_header).reduced(reduce).siz
+        if len(siz.components) != 1:
+            raise JP2IOException(
+                f"band {bid} has {len(siz.components)} components, only single-component are supported"
+            )
+        if shape is not None and shape != (len(tlms), siz.height, siz.width):
+            raise JP2IOException(f"the bands {', '.join(bands)} have different sizes, open them separately")
+        shape = (len(tlms), siz.height, siz.width)
+
+        array = TLMBackendArray(
+            tlms=[first, *tlms[1:]],
+            uri_of=uri_of,
+            range_reader=range_reader,
+            reduce=reduce,
+            shape=shape,
+            dtype=siz.dtype,
+            executor=executor,
+        )
+        variables[bid] = xr.Variable(
+            ("time", "y", "x"),
+            indexing.LazilyIndexedArray(array),
+            encoding={"preferred_chunks": {"time": 1, "y": siz.ytsiz, "x": siz.xtsiz}},
+        )
+
+    coords = {
+        "time": [sensing_time(pid) for pid in product_ids],
+        "product_id": ("time", list(product_ids)),
+    }
+    return xr.Dataset(variables, coords=coords)
+
+
+def _path_of(tlm: TLMIndex) -> str:
+    return tlm.path
+
+
+class JP2IOBackendEntrypoint(BackendEntrypoint):
+    """
+    xarray backend of `open_tlm_dataset`, with `filename_or_obj` a `TLMProvider` or the path of a parquet file
+    of TLM indexes:
+
+        xr.open_dataset(tlm_provider, engine="jp2io", product_ids=product_ids, bands=["B02", "B03"], chunks={})
+    """
+
+    description = "Open Sentinel-2 JPEG2000 rasters from their TLM indexes, without reference files"
+    url = "https://github.com/Kayrros/sentinel-2-jp2-tlm"
+    open_dataset_parameters = (
+        "filename_or_obj",
+        "drop_variables",
+        "product_ids",
+        "bands",
+        "uri_of",
+        "range_reader",
+        "reduce",
+        "executor",
+    )
+
+    @override
+    def open_dataset(  # type: ignore[override]
+        self,
+        filename_or_obj: str | os.PathLike[Any] | TLMProvider,
+        *,
+        drop_variables: str | Iterable[str] | None = None,
+        product_ids: Sequence[str],
+        bands: Sequence[str] = ("B02", "B03", "B04", "B08"),
+        uri_of: Callable[[TLMIndex], str] | None = None,
+        range_reader: RangeReader | None = None,
+        reduce: int = 0,
+        executor: concurrent.futures.Executor | None = None,
+    ) -> xr.Dataset:
+        if isinstance(filename_or_obj, TLMProvider):
+            tlm_provider = filename_or_obj
+        else:
+            tlm_provider = ParquetTLMProvider.from_local_file(os.fspath(filename_or_obj))
+
+        if isinstance(drop_variables, str):
+            drop_variables = [drop_variables]
+        if drop_variables is not None:
+            bands = [bid for bid in bands if bid not in drop_variables]
+        return open_tlm_dataset(
+            tlm_provider,
+            product_ids,
+            bands,
+            uri_of=uri_of,
+            range_reader=range_reader,
+            reduce=reduce,
+            executor=executor,
+        )
+
+    @override
+    def guess_can_open(self, filename_or_obj: Any) -> bool:
+        # the parquet files of TLM indexes are opened only with engine="jp2io"
+        return isinstance(filename_or_obj, TLMProvider)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+from rasterio.windows import Window
+
+from jp2io.exception import JP2IOException
+from jp2io.index import TLMIndex
+from jp2io.session import ReaderSession
+
+BAND_RESOLUTION: dict[str, int] = {
+    "B01": 60,
+    "B02": 10,
+    "B03": 10,
+    "B04": 10,
+    "B05": 20,
+    "B06": 20,
+    "B07": 20,
+    "B08": 10,
+    "B8A": 20,
+    "B09": 60,
+    "B10": 60,
+    "B11": 20,
+    "B12": 20,
+    "AOT": 10,
+    "WVP": 10,
+    "TCI": 10,
+    "SCL": 20,
+}
+""" native resolution (in meters) of the rasters of the Sentinel-2 bands """
+
+
+def native_window(window: Window, factor: int) -> Window:
+    """
+    Returns the smallest window of a raster `factor` times coarser that covers `window`.
+    """
+    x0, y0 = int(window.col_off) // factor, int(window.row_off) // factor
+    x1 = -(-(int(window.col_off) + int(window.width)) // factor)
+    y1 = -(-(int(window.row_off) + int(window.height)) // factor)
+    return Window(x0, y0, x1 - x0, y1 - y0)
+
+
+def read_bands(
+    tlms: Sequence[TLMIndex],
+    window: Window,
+    uri_of: Callable[[TLMIndex], str],
+    session: ReaderSession | None = None,
+) -> NDArray[Any]:
+    """
+    Reads the same window of several bands of a product concurrently, see `TLMProvider.read_bands`.
+    """
+    if not tlms:
+        raise JP2IOException("no band to read")
+
+    factors = []
+    for tlm in tlms:
+        if tlm.band_id not in BAND_RESOLUTION:
+            raise JP2IOException(f"unknown resolution for band {tlm.band_id}")
+        factors.append(BAND_RESOLUTION[tlm.band_id] // 10)
+
+    x0, y0 = int(window.col_off), int(window.row_off)
+    x1, y1 = x0 + int(window.width), y0 + int(window.height)
+
+    def read(tlm: TLMIndex, factor: int) -> NDArray[Any]:
+        assert session is not None
+        handle = session.dataset(tlm, uri_of(tlm))
+        if handle.dataset.count != 1:
+            # TCI: the bands of the output would not be the bands of the product
+            raise JP2IOException(
+                f"band {tlm.band_id} has {handle.dataset.count} components, only single-component bands are supported"
+            )
+        if factor == 1:
+            return handle.read(1, window=window)
+
+        native = native_window(window, factor)
+        array = handle.read(1, window=native)
+        # nearest neighbour upsampling to the 10m grid
+        rows = np.arange(y0, y1) // factor - int(native.row_off)
+        cols = np.arange(x0, x1) // factor - int(native.col_off)
+        upsampled: NDArray[Any] = array[np.ix_(rows, cols)]
+        return upsampled
+
+    own_session = session is None
+    if session is None:
+        session = ReaderSession(max_workers=len(tlms))
+    try:
+        # the threads of the session keep their datasets open from one call to the next
+        arrays = list(session.executor.map(read, tlms, factors))
+    finally:
+        if own_session:
+            session.close()
+
+    return np.stack(arrays)
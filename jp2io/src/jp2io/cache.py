@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import collections
+import glob
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+from numpy.typing import NDArray
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class CachedShard:
+    path: str
+    """ local path of the cached file """
+    etag: str
+
+
+@dataclass(frozen=True)
+class ShardDiskCache:
+    """
+    Local directory caching files downloaded from an object store (typically the TLM parquet files), with their ETag.
+
+    The directory can be shared between processes:
+    files are written atomically, and each version of a file has its own name (derived from its ETag),
+    so that a file opened by a process is never modified by another one.
+    When the total size exceeds `max_size`, the least recently used files are removed.
+    """
+
+    directory: str
+    max_size: int = 2 * 1024**3
+    """ in bytes """
+
+    def __post_init__(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _prefix(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def get(self, key: str) -> CachedShard | None:
+        candidates = []
+        for path in glob.glob(f"{self._prefix(key)}-*.bin"):
+            try:
+                candidates.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                # evicted by another process
+                pass
+        if not candidates:
+            return None
+
+        _, path = max(candidates)
+        etag = bytes.fromhex(path.rsplit("-", maxsplit=1)[-1].removesuffix(".bin")).decode("utf-8")
+        try:
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return CachedShard(path=path, etag=etag)
+
+    def put(self, key: str, data: bytes, etag: str) -> CachedShard:
+        prefix = self._prefix(key)
+        path = f"{prefix}-{etag.encode('utf-8').hex()}.bin"
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # remove the previous versions of this file
+        for old_path in glob.glob(f"{prefix}-*.bin"):
+            if old_path != path:
+                _unlink_if_exists(old_path)
+
+        self.evict(keep=path)
+        return CachedShard(path=path, etag=etag)
+
+    def evict(self, keep: str | None = None) -> None:
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.bin")):
+            if path == keep:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total_size += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            _unlink_if_exists(path)
+            total_size -= size
+
+
+def _unlink_if_exists(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        # removed by another process
+        pass
+
+
+@dataclass
+class SingleFlightStats:
+    hits: int = 0
+    """ values found in the cache """
+    loads: int = 0
+    """ calls to the loading function """
+    coalesced: int = 0
+    """ misses that waited for a load already in progress instead of loading the value again """
+    negative_hits: int = 0
+    """ misses answered by the negative cache """
+
+
+class SingleFlightCache(Generic[K, V]):
+    """
+    Thread-safe LRU cache where concurrent misses on the same key share a single call to the loading function.
+
+    Exceptions of type `negative_exceptions` raised by the loading function are cached for `negative_ttl` seconds,
+    so that a missing value does not trigger a new load on each lookup.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        negative_ttl: float = 300.0,
+        negative_exceptions: tuple[type[Exception], ...] = (),
+    ) -> None:
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.negative_exceptions = negative_exceptions
+        self.stats = SingleFlightStats()
+
+        self._lock = threading.Lock()
+        self._values: collections.OrderedDict[K, V] = collections.OrderedDict()
+        self._missing: dict[K, tuple[float, Exception]] = {}
+        self._inflight: dict[K, Future[V]] = {}
+
+    def get(self, key: K, load: Callable[[], V]) -> V:
+        with self._lock:
+            if key in self._values:
+                self.stats.hits += 1
+                self._values.move_to_end(key)
+                return self._values[key]
+
+            if key in self._missing:
+                expiration, exception = self._missing[key]
+                if time.monotonic() < expiration:
+                    self.stats.negative_hits += 1
+                    # the exception is shared by the lookups, its traceback would grow with each of them
+                    raise exception.with_traceback(None)
+                del self._missing[key]
+
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.stats.coalesced += 1
+            else:
+                self.stats.loads += 1
+                future: Future[V] = Future()
+                self._inflight[key] = future
+
+        if pending is not None:
+            # raises the exception of the load, if any
+            return pending.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                if isinstance(e, self.negative_exceptions):
+                    self._missing[key] = (time.monotonic() + self.negative_ttl, e)
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._values[key] = value
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+
+@dataclass
+class TileCacheStats:
+    hits: int = 0
+    misses: int = 0
+    """ tiles that had to be fetched and decoded """
+    evictions: int = 0
+
+
+class TileCache:
+    """
+    Thread-safe LRU cache of decoded tiles, bounded by the total size of the tiles, in bytes.
+
+    Keys are (uri, tile index, resolution level), see `TileCache.key`.
+    Cached tiles are read-only, as they are shared between the reads.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024**2) -> None:
+        self.max_bytes = max_bytes
+        self.stats = TileCacheStats()
+
+        self._lock = threading.Lock()
+        self._tiles: collections.OrderedDict[Hashable, NDArray[Any]] = collections.OrderedDict()
+        self._nbytes = 0
+
+    @staticmethod
+    def key(uri: str, tile_index: int, reduce: int = 0) -> tuple[str, int, int]:
+        return (uri, tile_index, reduce)
+
+    @property
+    def nbytes(self) -> int:
+        """total size of the cached tiles"""
+        return self._nbytes
+
+    def get(self, key: Hashable) -> NDArray[Any] | None:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key: Hashable, tile: NDArray[Any]) -> None:
+        if tile.nbytes > self.max_bytes:
+            return
+        tile.flags.writeable = False
+
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._tiles[key] = tile
+            self._nbytes += tile.nbytes
+
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+            self._nbytes = 0
+
+
+class TileByteCache:
+    """
+    Local directory caching byte ranges of remote files, typically the compressed tiles of the JP2 files,
+    which never change for a given path.
+
+    Each range is stored in its own file, written atomically with a name derived from (uri, offset, length),
+    so that the directory can be shared between processes. Cached ranges are returned as memory maps, without copy.
+    When the total size exceeds `max_size`, the least recently used files are removed (down to 90% of `max_size`).
+    """
+
+    def __init__(self, directory: str, max_size: int = 10 * 1024**3) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.stats = TileCacheStats()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # updated by this process only, the actual size is computed when it exceeds `max_size`
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def path(self, uri: str, offset: int, length: int) -> str:
+        # the same file can be reached through GDAL or directly
+        uri = uri.removeprefix("/vsicurl/")
+        if uri.startswith("/vsis3/"):
+            uri = "s3://" + uri.removeprefix("/vsis3/")
+        key = f"{uri}\0{offset}\0{length}".encode("utf-8")
+        return os.path.join(self.directory, f"{hashlib.sha256(key).hexdigest()}.seg")
+
+    def get(self, uri: str, offset: int, length: int) -> memoryview | None:
+        """
+        Returns a read-only view of the cached bytes, or None if they are not cached.
+        """
+        path = self.path(uri, offset, length)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # mark as recently used
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # not cached, or evicted by another process (ValueError: empty file)
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        with self._lock:
+            self.stats.hits += 1
+        # the file stays mapped as long as the view is referenced, even if it is evicted in the meantime
+        return memoryview(data)
+
+    def put(self, uri: str, offset: int, length: int, data: bytes | memoryview) -> str:
+        """
+        Returns the path of the cached file.
+        """
+        path = self.path(uri, offset, length)
+        if os.path.exists(path):
+            return path
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._size += len(data)
+            over_budget = self._size > self.max_size
+        if over_budget:
+            self.evict()
+        return path
+
+    def evict(self) -> None:
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total_size <= 0.9 * self.max_size:
+                break
+            _unlink_if_exists(path)
+            total_size -= size
+            evicted += 1
+
+        with self._lock:
+            self._size = total_size
+            self.stats.evictions += evicted
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".seg"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
@@ -0,0 +1,590 @@
+from __future__ import annotations
+
+import dataclasses
+import math
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from jp2io.exception import JP2IOException
+
+# See https://web.archive.org/web/20250209200219/https://ics.uci.edu/~dhirschb/class/267/papers/jpeg2000.pdf
+
+JP2_JP = 0x6A502020
+""" JPEG 2000 signature box """
+JP2_JP2C = 0x6A703263
+""" Contiguous codestream box """
+
+J2K_MS_SOC = 0xFF4F
+J2K_MS_SIZ = 0xFF51
+J2K_MS_COD = 0xFF52
+J2K_MS_COC = 0xFF53
+J2K_MS_TLM = 0xFF55
+J2K_MS_PLM = 0xFF57
+J2K_MS_PLT = 0xFF58
+J2K_MS_QCD = 0xFF5C
+J2K_MS_QCC = 0xFF5D
+J2K_MS_POC = 0xFF5F
+J2K_MS_PPM = 0xFF60
+J2K_MS_CRG = 0xFF63
+J2K_MS_COM = 0xFF64
+J2K_MS_SOT = 0xFF90
+J2K_MS_SOD = 0xFF93
+J2K_MS_EOC = 0xFFD9
+
+PROGRESSION_LRCP = 0
+PROGRESSION_RLCP = 1
+PROGRESSION_RPCL = 2
+
+TRANSFORMATION_IRREVERSIBLE_97 = 0
+TRANSFORMATION_REVERSIBLE_53 = 1
+
+# markers of the main header that are not needed to decode a tile on its own
+_SKIPPED_MARKERS = (J2K_MS_TLM, J2K_MS_PLM, J2K_MS_CRG, J2K_MS_COM)
+
+
+@dataclass(frozen=True)
+class ImageAndTileSize:
+    """
+    Content of the SIZ marker.
+    """
+
+    rsiz: int
+    xsiz: int
+    ysiz: int
+    xosiz: int
+    yosiz: int
+    xtsiz: int
+    ytsiz: int
+    xtosiz: int
+    ytosiz: int
+    components: tuple[tuple[int, int, int], ...]
+    """ (Ssiz, XRsiz, YRsiz) of each component """
+
+    @property
+    def width(self) -> int:
+        return self.xsiz - self.xosiz
+
+    @property
+    def height(self) -> int:
+        return self.ysiz - self.yosiz
+
+    @property
+    def n_tiles_x(self) -> int:
+        return math.ceil((self.xsiz - self.xtosiz) / self.xtsiz)
+
+    @property
+    def n_tiles_y(self) -> int:
+        return math.ceil((self.ysiz - self.ytosiz) / self.ytsiz)
+
+    @property
+    def dtype(self) -> np.dtype:
+        ssiz = self.components[0][0]
+        depth = (ssiz & 0x7F) + 1
+        signed = ssiz & 0x80 != 0
+        for bits in (8, 16, 32):
+            if depth <= bits:
+                return np.dtype(f"{'i' if signed else 'u'}{bits // 8}")
+        raise JP2IOException(f"unsupported bit depth ({depth})")
+
+    def tile_bounds(self, tile_index: int) -> tuple[int, int, int, int]:
+        """
+        Returns (x0, y0, x1, y1) of the tile, relative to the origin of the image.
+        """
+        p = tile_index % self.n_tiles_x
+        q = tile_index // self.n_tiles_x
+        x0 = max(self.xtosiz + p * self.xtsiz, self.xosiz)
+        y0 = max(self.ytosiz + q * self.ytsiz, self.yosiz)
+        x1 = min(self.xtosiz + (p + 1) * self.xtsiz, self.xsiz)
+        y1 = min(self.ytosiz + (q + 1) * self.ytsiz, self.ysiz)
+        return x0 - self.xosiz, y0 - self.yosiz, x1 - self.xosiz, y1 - self.yosiz
+
+    def tiles_intersecting(self, x0: int, y0: int, x1: int, y1: int) -> list[int]:
+        """
+        Returns the indices of the tiles intersecting the area (x0, y0, x1, y1), relative to the origin of the image.
+        """
+        x0 += self.xosiz - self.xtosiz
+        x1 += self.xosiz - self.xtosiz
+        y0 += self.yosiz - self.ytosiz
+        y1 += self.yosiz - self.ytosiz
+        p0, p1 = max(x0 // self.xtsiz, 0), min((x1 - 1) // self.xtsiz, self.n_tiles_x - 1)
+        q0, q1 = max(y0 // self.ytsiz, 0), min((y1 - 1) // self.ytsiz, self.n_tiles_y - 1)
+        return [q * self.n_tiles_x + p for q in range(q0, q1 + 1) for p in range(p0, p1 + 1)]
+
+    def to_marker(self, xsiz: int, ysiz: int) -> bytes:
+        """
+        Returns a SIZ marker for an image of size (xsiz, ysiz) at the origin, with the same tiling and components.
+        """
+        header = struct.pack(
+            ">HHHIIIIIIIIH",
+            J2K_MS_SIZ,
+            38 + 3 * len(self.components),  # Lsiz
+            self.rsiz,
+            xsiz,
+            ysiz,
+            0,  # XOsiz
+            0,  # YOsiz
+            self.xtsiz,
+            self.ytsiz,
+            0,  # XTOsiz
+            0,  # YTOsiz
+            len(self.components),
+        )
+        return header + b"".join(struct.pack(">BBB", *c) for c in self.components)
+
+    @staticmethod
+    def from_marker(segment: bytes) -> ImageAndTileSize:
+        (rsiz, xsiz, ysiz, xosiz, yosiz, xtsiz, ytsiz, xtosiz, ytosiz, csiz) = struct.unpack_from(
+            ">HIIIIIIIIH", segment, 4
+        )
+        components = tuple(struct.unpack_from(">BBB", segment, 40 + 3 * i) for i in range(csiz))
+        return ImageAndTileSize(rsiz, xsiz, ysiz, xosiz, yosiz, xtsiz, ytsiz, xtosiz, ytosiz, components)
+
+
+@dataclass(frozen=True)
+class CodingStyle:
+    """
+    Content of the COD marker needed to locate the packets of a tile.
+    """
+
+    progression: int
+    layers: int
+    levels: int
+    """ number of decomposition levels (NL), the tiles have NL + 1 resolution levels """
+    precincts: tuple[tuple[int, int], ...]
+    """ (PPx, PPy) of each resolution level, from the lowest """
+    style: int = 0
+    """ Scod: user-defined precincts (0x01), SOP (0x02) and EPH (0x04) markers """
+    transformation: int = TRANSFORMATION_REVERSIBLE_53
+    """ wavelet filter, irreversible 9/7 (0) or reversible 5/3 (1) """
+
+    @property
+    def sop(self) -> bool:
+        return self.style & 0x02 != 0
+
+    @property
+    def eph(self) -> bool:
+        return self.style & 0x04 != 0
+
+    @property
+    def resolution_progressive(self) -> bool:
+        """
+        True if, in each tile, the packets of a resolution level come before the packets of the higher levels.
+        """
+        return self.progression in (PROGRESSION_RLCP, PROGRESSION_RPCL) or (
+            self.progression == PROGRESSION_LRCP and self.layers == 1
+        )
+
+    @staticmethod
+    def from_marker(segment: bytes) -> CodingStyle:
+        (scod, progression, layers, _mct, levels, _xcb, _ycb, _cbstyle, transformation) = struct.unpack_from(
+            ">BBHBBBBBB", segment, 4
+        )
+        if scod & 0x01:
+            precincts = tuple((p & 0x0F, p >> 4) for p in segment[14 : 14 + levels + 1])
+        else:
+            precincts = ((15, 15),) * (levels + 1)
+        return CodingStyle(
+            progression=progression,
+            layers=layers,
+            levels=levels,
+            precincts=precincts,
+            style=scod,
+            transformation=transformation,
+        )
+
+
+@dataclass(frozen=True)
+class MainHeader:
+    """
+    Main header of a JPEG2000 codestream, with what is needed to decode each tile independently.
+    """
+
+    siz: ImageAndTileSize
+    cod: CodingStyle
+    markers: bytes
+    """ marker segments of the main header (COD, QCD, ...), excluding SOC and SIZ """
+    reduce: int = 0
+    """ number of resolution levels discarded from the original image, see `reduced` """
+
+    @staticmethod
+    def parse(buf: bytes) -> MainHeader:
+        """
+        Parameters
+        ----------
+        buf
+            Beginning of a JP2 file or of a J2K codestream, containing at least the whole main header.
+        """
+        cur = _find_codestream(buf)
+
+        (code,) = struct.unpack_from(">H", buf, cur)
+        if code != J2K_MS_SOC:
+            raise JP2IOException("invalid codestream: SOC marker not found")
+        cur += 2
+
+        siz = None
+        cod = None
+        markers = []
+        while True:
+            if cur == len(buf):
+                # the buffer stops right before the first SOT marker
+                break
+            if cur + 4 > len(buf):
+                raise JP2IOException("incomplete main header")
+            (code, length) = struct.unpack_from(">HH", buf, cur)
+            if code == J2K_MS_SOT:
+                break
+            segment = buf[cur : cur + 2 + length]
+            if code == J2K_MS_SIZ:
+                siz = ImageAndTileSize.from_marker(segment)
+            elif code == J2K_MS_PPM:
+                raise JP2IOException("unsupported codestream: PPM marker found")
+            elif code not in _SKIPPED_MARKERS:
+                if code == J2K_MS_COD:
+                    cod = CodingStyle.from_marker(segment)
+                markers.append(segment)
+            cur += 2 + length
+
+        if siz is None:
+            raise JP2IOException("invalid codestream: SIZ marker not found")
+        if cod is None:
+            raise JP2IOException("invalid codestream: COD marker not found")
+        return MainHeader(siz=siz, cod=cod, markers=b"".join(markers))
+
+    def reduced(self, reduce: int) -> MainHeader:
+        """
+        Returns the header of the image at 1/2**reduce of its resolution, obtained by keeping only the packets of
+        the resolution levels 0 to NL - reduce of each tile (see `tile_codestream` and `resolution_ends`).
+        """
+        if reduce == 0:
+            return self
+        siz, cod = self.siz, self.cod
+        if not 0 < reduce <= cod.levels:
+            raise JP2IOException(f"reduce should be between 0 and {cod.levels}, got {reduce}")
+        if not cod.resolution_progressive:
+            raise JP2IOException(
+                "reduce requires a resolution-progressive codestream (LRCP with one layer, RLCP, RPCL)"
+            )
+        if (siz.xosiz, siz.yosiz, siz.xtosiz, siz.ytosiz) != (0, 0, 0, 0):
+            raise JP2IOException("reduce is not supported for images or tiles with an offset")
+        if siz.xtsiz % 2**reduce != 0 or siz.ytsiz % 2**reduce != 0:
+            raise JP2IOException(f"reduce is not supported for tiles of size {siz.xtsiz}x{siz.ytsiz}")
+
+        levels = cod.levels - reduce
+        markers = []
+        cur = 0
+        while cur < len(self.markers):
+            (code, length) = struct.unpack_from(">HH", self.markers, cur)
+            segment = self.markers[cur : cur + 2 + length]
+            cur += 2 + length
+            if code in (J2K_MS_COC, J2K_MS_QCC, J2K_MS_POC):
+                raise JP2IOException("reduce is not supported for codestreams with COC, QCC or POC markers")
+            if code == J2K_MS_COD:
+                # SPcod: number of decomposition levels, then the precinct sizes of the remaining resolution levels
+                precincts = segment[14 : 14 + levels + 1] if segment[4] & 0x01 else b""
+                body = segment[4:9] + bytes([levels]) + segment[10:14] + precincts
+                segment = struct.pack(">HH", J2K_MS_COD, 2 + len(body)) + body
+            elif code == J2K_MS_QCD:
+                # SPqcd: one value per subband (1 + 3 NL), except for the scalar derived quantization
+                style = segment[4] & 0x1F
+                if style != 1:
+                    size = 1 if style == 0 else 2
+                    body = segment[4 : 5 + size * (1 + 3 * levels)]
+                    segment = struct.pack(">HH", J2K_MS_QCD, 2 + len(body)) + body
+            markers.append(segment)
+
+        siz = dataclasses.replace(
+            siz,
+            xsiz=_ceil_div(siz.xsiz, 2**reduce),
+            ysiz=_ceil_div(siz.ysiz, 2**reduce),
+            xtsiz=siz.xtsiz // 2**reduce,
+            ytsiz=siz.ytsiz // 2**reduce,
+        )
+        cod = dataclasses.replace(cod, levels=levels, precincts=cod.precincts[: levels + 1])
+        return MainHeader(siz=siz, cod=cod, markers=b"".join(markers), reduce=self.reduce + reduce)
+
+    def packets_per_resolution(self, tile_index: int) -> list[int]:
+        """
+        Returns the number of packets of each resolution level of the tile, all components and layers included.
+        """
+        packets = []
+        for r in range(self.cod.levels + 1):
+            n = 0
+            for c in range(len(self.siz.components)):
+                _, _, nx, ny = self._precinct_grid(tile_index, r, c)
+                n += nx * ny
+            packets.append(n * self.cod.layers)
+        return packets
+
+    def _precinct_grid(self, tile_index: int, r: int, c: int) -> tuple[int, int, int, int]:
+        """
+        Returns (px0, py0, nx, ny): index of the first precinct of the tile-component at the resolution level r
+        (in the precinct partition of the whole resolution level) and number of precincts.
+        """
+        rx0, ry0, rx1, ry1 = self._resolution_bounds(tile_index, r, c)
+        ppx, ppy = self.cod.precincts[r]
+        if rx1 <= rx0 or ry1 <= ry0:
+            return 0, 0, 0, 0
+        px0, py0 = rx0 // 2**ppx, ry0 // 2**ppy
+        return px0, py0, _ceil_div(rx1, 2**ppx) - px0, _ceil_div(ry1, 2**ppy) - py0
+
+    def _resolution_bounds(
+        self, tile_index: int, r: int, c: int, area: tuple[int, int, int, int] | None = None
+    ) -> tuple[int, int, int, int]:
+        """
+        Returns the bounds of the tile-component (or of an `area` relative to the tile) at the resolution level r.
+        """
+        siz = self.siz
+        x0, y0, x1, y1 = siz.tile_bounds(tile_index)
+        if area is not None:
+            x0, y0, x1, y1 = x0 + area[0], y0 + area[1], x0 + area[2], y0 + area[3]
+        x0, x1 = x0 + siz.xosiz, x1 + siz.xosiz
+        y0, y1 = y0 + siz.yosiz, y1 + siz.yosiz
+        _, dx, dy = siz.components[c]
+        scale = 2 ** (self.cod.levels - r)
+        return (
+            _ceil_div(_ceil_div(x0, dx), scale),
+            _ceil_div(_ceil_div(y0, dy), scale),
+            _ceil_div(_ceil_div(x1, dx), scale),
+            _ceil_div(_ceil_div(y1, dy), scale),
+        )
+
+    def resolution_ends(self, tile_index: int, tile_data: bytes | memoryview) -> list[int] | None:
+        """
+        Returns, for each resolution level, the position relative to the SOT marker where its packets end
+        in the tile-part, computed from the PLT markers of the tile-part header.
+        Returns None if the tile-part has no PLT marker.
+
+        Parameters
+        ----------
+        tile_data
+            Beginning of the tile-part, from the SOT marker and containing at least its header.
+        """
+        if not self.cod.resolution_progressive:
+            raise JP2IOException("the codestream is not resolution-progressive")
+        header_length, packet_lengths = _parse_tile_header(tile_data)
+        if packet_lengths is None:
+            return None
+
+        ends = []
+        end, n = header_length, 0
+        for count in self.packets_per_resolution(tile_index):
+            end += sum(packet_lengths[n : n + count])
+            n += count
+            ends.append(end)
+        if n != len(packet_lengths):
+            raise JP2IOException(f"tile {tile_index}: expected {n} packets, found {len(packet_lengths)} in PLT")
+        return ends
+
+    def tile_codestream(
+        self, tile_data: bytes | memoryview, tile_index: int, region: tuple[int, int, int, int] | None = None
+    ) -> bytes:
+        """
+        Returns a standalone codestream containing only the given tile.
+
+        Parameters
+        ----------
+        tile_data
+            Tile-part, from the SOT marker to the end of its data.
+        tile_index
+            Index of the tile in the original image.
+        region
+            Area (x0, y0, x1, y1) of the tile that is needed, relative to the tile. The packets of the precincts
+            that do not contribute to it are replaced by empty packets, so that their code-blocks are not decoded:
+            the decoded pixels are only valid inside the area. Ignored if the tile-part has no PLT marker,
+            and for the codestreams where the area can not be isolated this way (9/7 wavelet, COC or POC markers).
+        """
+        x0, y0, x1, y1 = self.siz.tile_bounds(tile_index)
+        tile_data = memoryview(tile_data)
+        if region is not None and region == (0, 0, x1 - x0, y1 - y0):
+            region = None
+        if self.reduce > 0 or region is not None:
+            tile_data = self._rewrite_packets(tile_index, tile_data, region)
+        return b"".join(
+            (
+                struct.pack(">H", J2K_MS_SOC),
+                self.siz.to_marker(x1 - x0, y1 - y0),
+                self.markers,
+                tile_data[:4],
+                b"\x00\x00",  # Isot: the tile is the first and only one of the new codestream
+                tile_data[6:],
+                struct.pack(">H", J2K_MS_EOC),
+            )
+        )
+
+    def _rewrite_packets(
+        self, tile_index: int, tile_data: memoryview, region: tuple[int, int, int, int] | None
+    ) -> memoryview:
+        """
+        Keeps only the packets of the resolution levels of this (reduced) header, empties the packets of the
+        precincts outside of `region`, and rewrites the tile-part header.
+        """
+        header_length, packet_lengths = _parse_tile_header(tile_data)
+        if packet_lengths is None:
+            # the packets can not be located without PLT markers: the whole tile-part is kept, and the decoder stops
+            # after the packets of the resolution levels of this header, the first ones of a resolution-progressive
+            # codestream (the index has no RESO extension then, so the tile-part is complete)
+            return tile_data
+
+        n_packets = sum(self.packets_per_resolution(tile_index))
+        if header_length + sum(packet_lengths[:n_packets]) > len(tile_data):
+            raise JP2IOException(f"tile {tile_index}: incomplete tile-part for reduce={self.reduce}")
+
+        keep = None
+        if region is not None and self._can_empty_packets():
+            keep = self._packets_intersecting(tile_index, region)
+
+        if keep is None:
+            body = tile_data[header_length : header_length + sum(packet_lengths[:n_packets])].tobytes()
+        else:
+            # an empty packet: a single zero bit in the packet header
+            empty = b"\x00\xff\x92" if self.cod.eph else b"\x00"
+            parts = []
+            cur = header_length
+            for length, kept in zip(packet_lengths[:n_packets], keep):
+                parts.append(tile_data[cur : cur + length] if kept else empty)
+                cur += length
+            body = b"".join(parts)
+
+        sot = struct.pack(">HHHIBB", J2K_MS_SOT, 10, 0, 12 + 2 + len(body), 0, 1)
+        sod = struct.pack(">H", J2K_MS_SOD)
+        return memoryview(sot + sod + body)
+
+    def _can_empty_packets(self) -> bool:
+        """
+        True if the packets of the precincts outside of a region can be emptied without changing the decoded pixels
+        inside it: the order of the packets is given by the COD marker alone (no COC or POC marker), and the
+        wavelet is the reversible 5/3, whose spread is covered by the margin of `_packets_intersecting`
+        (the longer 9/7 filters are not, as observed on rasters encoded by GDAL).
+        """
+        cod = self.cod
+        return (
+            cod.progression in (PROGRESSION_LRCP, PROGRESSION_RLCP)
+            and not cod.sop
+            and cod.transformation == TRANSFORMATION_REVERSIBLE_53
+            and not {J2K_MS_COC, J2K_MS_POC} & set(_marker_codes(self.markers))
+        )
+
+    def _packets_intersecting(self, tile_index: int, region: tuple[int, int, int, int]) -> list[bool]:
+        """
+        For each packet of the tile, in the order of the codestream (LRCP or RLCP), whether its precinct contributes
+        to the region.
+        """
+        precincts = {}
+        for c in range(len(self.siz.components)):
+            # samples of the resolution level r needed to reconstruct the region, from the highest level down
+            x0, y0, x1, y1 = self._resolution_bounds(tile_index, self.cod.levels, c, region)
+            for r in reversed(range(self.cod.levels + 1)):
+                ppx, ppy = self.cod.precincts[r]
+                px0, py0, nx, ny = self._precinct_grid(tile_index, r, c)
+                if r == 0:
+                    ax0, ay0, ax1, ay1 = x0, y0, x1, y1
+                else:
+                    # the 5/3 synthesis of the sample 2n (or 2n + 1) uses the low-pass coefficients n to n + 1 (the
+                    # samples of the level r - 1) and the high-pass coefficients n - 1 to n + 1 (at 2n - 1 to 2n + 3
+                    # on the grid of the level r, where the precincts of its subbands are laid out)
+                    ax0, ay0 = 2 * (x0 // 2) - 2, 2 * (y0 // 2) - 2
+                    ax1, ay1 = 2 * (x1 // 2) + 2, 2 * (y1 // 2) + 2
+                    x0, y0, x1, y1 = x0 // 2, y0 // 2, x1 // 2 + 1, y1 // 2 + 1
+                precincts[r, c] = [
+                    (px0 + px) * 2**ppx < ax1
+                    and (px0 + px + 1) * 2**ppx > ax0
+                    and (py0 + py) * 2**ppy < ay1
+                    and (py0 + py + 1) * 2**ppy > ay0
+                    for py in range(ny)
+                    for px in range(nx)
+                ]
+
+        resolutions = range(self.cod.levels + 1)
+        components = range(len(self.siz.components))
+        layers = range(self.cod.layers)
+        if self.cod.progression == PROGRESSION_LRCP:
+            order = [(r, c) for _ in layers for r in resolutions for c in components]
+        else:
+            order = [(r, c) for r in resolutions for _ in layers for c in components]
+        return [kept for key in order for kept in precincts[key]]
+
+
+def _marker_codes(markers: bytes) -> list[int]:
+    """
+    Returns the codes of a sequence of marker segments.
+    """
+    codes = []
+    cur = 0
+    while cur + 4 <= len(markers):
+        (code, length) = struct.unpack_from(">HH", markers, cur)
+        codes.append(code)
+        cur += 2 + length
+    return codes
+
+
+def _parse_tile_header(tile_data: bytes | memoryview) -> tuple[int, list[int] | None]:
+    """
+    Returns the length of the tile-part header (until the end of the SOD marker),
+    and the length of each packet read from its PLT markers, or None if there is no PLT marker.
+    """
+    buf = memoryview(tile_data)
+    (code, lsot) = struct.unpack_from(">HH", buf, 0)
+    if code != J2K_MS_SOT:
+        raise JP2IOException("invalid tile-part: SOT marker not found")
+
+    cur = 2 + lsot
+    plt = []
+    while True:
+        if cur + 2 > len(buf):
+            raise JP2IOException("incomplete tile-part header")
+        (code,) = struct.unpack_from(">H", buf, cur)
+        if code == J2K_MS_SOD:
+            cur += 2
+            break
+        (length,) = struct.unpack_from(">H", buf, cur + 2)
+        if code == J2K_MS_PLT:
+            # Zplt, then the packet lengths
+            plt.append(buf[cur + 5 : cur + 2 + length])
+        else:
+            raise JP2IOException(f"unsupported marker 0x{code:04X} in tile-part header")
+        cur += 2 + length
+
+    if not plt:
+        return cur, None
+
+    # Iplt: 7 bits per byte, the highest bit is set on all the bytes of a value except the last one
+    packet_lengths = []
+    value = 0
+    for byte in b"".join(plt):
+        value = (value << 7) | (byte & 0x7F)
+        if byte & 0x80 == 0:
+            packet_lengths.append(value)
+            value = 0
+    return cur, packet_lengths
+
+
+def _ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def _find_codestream(buf: bytes) -> int:
+    """
+    Returns the position of the SOC marker, skipping the boxes of the JP2 file if any.
+    """
+    if buf[:2] == struct.pack(">H", J2K_MS_SOC):
+        return 0
+
+    cur = 0
+    while cur + 8 <= len(buf):
+        (length, boxtype) = struct.unpack_from(">II", buf, cur)
+        if length == 1:
+            (length,) = struct.unpack_from(">Q", buf, cur + 8)
+            data_start = cur + 16
+        else:
+            data_start = cur + 8
+        if cur == 0 and boxtype != JP2_JP:
+            raise JP2IOException("invalid JP2 file: signature box not found")
+        if boxtype == JP2_JP2C:
+            return data_start
+        if length == 0:
+            break
+        cur += length
+
+    raise JP2IOException("invalid JP2 file: codestream box not found")
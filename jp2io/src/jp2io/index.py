@@ -2,17 +2,33 @@ from __future__ import annotations
 
 import abc
 import contextlib
+import functools
+import math
+import os
 import struct
+from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import Any, Generator
+from typing import TYPE_CHECKING, Any, Generator
 
+import numpy as np
 import rasterio
+from numpy.typing import NDArray
 from rasterio.io import MemoryFile
+from rasterio.windows import Window
 from typing_extensions import override
 
 from jp2io.exception import JP2IOException
 from jp2io.parsefile import JP2WithTLMSparseFile
 
+if TYPE_CHECKING:
+    from jp2io.cache import TileByteCache, TileCache
+    from jp2io.rangereader import RangeReader
+
+INDEX_EXTENSION_MAIN_HEADER = b"MHDR"
+""" Extension of the index containing the beginning of the JP2 file, until the first SOT marker. """
+INDEX_EXTENSION_RESOLUTION_ENDS = b"RESO"
+""" Extension of the index containing the position where each resolution level ends in each tile. """
+
 
 @dataclass(frozen=True, slots=True)
 class TLMMetadata(abc.ABC):
@@ -40,7 +56,9 @@ class TLMIndex(abc.ABC):
 
     @abc.abstractmethod
     @contextlib.contextmanager
-    def open(self, uri: str, env_options: dict[str, Any] = {}) -> Generator[rasterio.DatasetReader]:
+    def open(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> Generator[rasterio.DatasetReader]:
         """
         Parameters
         ----------
@@ -50,6 +68,55 @@ class TLMIndex(abc.ABC):
         env_options
             rasterio.open will happen in a rasterio.Env with some default options.
             Use this parameter to override/add options.
+        byte_cache
+            Tiles present in this cache are read from the local files instead of `uri`, see `prefetch_tiles`.
+        """
+
+    @abc.abstractmethod
+    def open_dataset(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> DatasetHandle:
+        """
+        Same as `open`, but the dataset stays open until `DatasetHandle.close` is called.
+        Used to read several windows without opening the raster again, see `jp2io.session.ReaderSession`.
+        """
+
+    @abc.abstractmethod
+    def read_window(
+        self,
+        uri: str,
+        window: Window,
+        range_reader: RangeReader | None = None,
+        max_workers: int = 8,
+        max_gap: int = 64 * 1024,
+        tile_cache: TileCache | None = None,
+        byte_cache: TileByteCache | None = None,
+        reduce: int = 0,
+    ) -> NDArray[Any]:
+        """
+        Reads a window of the raster without GDAL: only the tiles intersecting the window are fetched and decoded.
+        Requires the optional dependency imagecodecs.
+
+        Parameters
+        ----------
+        uri
+            Path to the raster: local path or http(s) URL. Other protocols require a `range_reader`.
+        window
+            Window to read, in pixels.
+        range_reader
+            Used to fetch the byte ranges of the tiles, by default inferred from the uri.
+        max_workers
+            Number of tiles fetched and decoded concurrently.
+        max_gap
+            Byte ranges of tiles separated by at most `max_gap` bytes are fetched with a single request.
+        tile_cache
+            Decoded tiles shared between the reads, for example to read overlapping windows.
+        byte_cache
+            Compressed tiles cached on disk, shared between the reads and the processes.
+        reduce
+            Reads the image at 1/2**reduce of its resolution, `window` being in the pixels of the reduced image.
+            If the index records the end of each resolution level in the tiles (RESO extension),
+            only the beginning of the tiles is fetched.
         """
 
     @staticmethod
@@ -61,11 +128,23 @@ class TLMIndex(abc.ABC):
         # u64       u64                 u32                 = (20 bytes)
         (file_size, position_first_sot, tlm_segment_length) = struct.unpack(">QQL", buf[:20])
         tlm_segment = buf[20 : 20 + tlm_segment_length]
+
+        # optional extensions, absent from the indexes generated before they were introduced
+        # tag (4 bytes)  u32      payload
+        extensions = {}
+        cur = 20 + tlm_segment_length
+        while cur + 8 <= len(buf):
+            (tag, length) = struct.unpack_from(">4sL", buf, cur)
+            extensions[tag] = buf[cur + 8 : cur + 8 + length]
+            cur += 8 + length
+
         return VirtualTLMIndex(
             file_size=file_size,
             position_first_sot=position_first_sot,
             tlm_segment=tlm_segment,
             meta=meta,
+            main_header=extensions.get(INDEX_EXTENSION_MAIN_HEADER),
+            resolution_ends=extensions.get(INDEX_EXTENSION_RESOLUTION_ENDS),
         )
 
 
@@ -74,9 +153,44 @@ class UnsupportedJP2Exception(Exception):
 
 
 @dataclass(frozen=True)
+class DatasetHandle:
+    """
+    A dataset opened by `TLMIndex.open_dataset`, with what is needed to use and close it later.
+    """
+
+    dataset: rasterio.DatasetReader
+    env: dict[str, Any]
+    """ options of the rasterio.Env in which the dataset should be used """
+    sparsefile: JP2WithTLMSparseFile | None = None
+
+    def read(self, *args: Any, **kwargs: Any) -> NDArray[Any]:
+        """
+        Calls `dataset.read` in the expected rasterio.Env.
+        """
+        with rasterio.Env(**self.env):
+            array: NDArray[Any] = self.dataset.read(*args, **kwargs)
+            return array
+
+    def close(self) -> None:
+        self.dataset.close()
+        if self.sparsefile is not None:
+            self.sparsefile.close()
+
+
+@dataclass(frozen=True, eq=False)
 class TilesRange:
-    tiles_position: list[int]
-    tiles_length: list[int]
+    tiles_position: NDArray[np.uint64]
+    tiles_length: NDArray[np.uint64]
+
+    @property
+    def grid_shape(self) -> tuple[int, int]:
+        """
+        Shape (rows, columns) of the grid of tiles, assuming a square grid as in Sentinel-2 rasters.
+        """
+        n = math.isqrt(len(self.tiles_position))
+        if n * n != len(self.tiles_position):
+            raise UnsupportedJP2Exception(f"the number of tiles ({len(self.tiles_position)}) is not a square")
+        return n, n
 
 
 @dataclass(frozen=True)
@@ -85,23 +199,82 @@ class VirtualTLMIndex(TLMIndex):
     position_first_sot: int
     tlm_segment: bytes
     meta: TLMMetadata
+    main_header: bytes | None = None
+    """ Beginning of the JP2 file until the first SOT marker (boxes and main header), if embedded in the index. """
+    resolution_ends: bytes | None = None
+    """
+    Payload of the RESO extension, if present in the index: the number of resolution levels (u8), then for each tile
+    and each resolution level, the position relative to the SOT marker where the packets of the level end (u32).
+    """
 
     @override
     def _get_tlmmetadata(self) -> TLMMetadata:
         return self.meta
 
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the index in the format of s2tlm-indexer, see `TLMIndex.from_bytes`.
+        """
+        buf = struct.pack(">QQL", self.file_size, self.position_first_sot, len(self.tlm_segment)) + self.tlm_segment
+        if self.main_header is not None:
+            buf += struct.pack(">4sL", INDEX_EXTENSION_MAIN_HEADER, len(self.main_header)) + self.main_header
+        if self.resolution_ends is not None:
+            buf += struct.pack(">4sL", INDEX_EXTENSION_RESOLUTION_ENDS, len(self.resolution_ends))
+            buf += self.resolution_ends
+        return buf
+
     @override
     @contextlib.contextmanager
-    def open(self, uri: str, env_options: dict[str, Any] = {}) -> Generator[rasterio.DatasetReader]:
-        sparsefile = self.make_vsi_file_for_uri(uri)
+    def open(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> Generator[rasterio.DatasetReader]:
+        handle = self.open_dataset(uri, env_options, byte_cache)
+        try:
+            with rasterio.Env(**handle.env):
+                yield handle.dataset
+        finally:
+            handle.close()
+
+    @override
+    def open_dataset(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> DatasetHandle:
+        sparsefile = self.make_vsi_file_for_uri(uri, byte_cache)
         try:
             env = self.recommended_env_vars().copy()
             env |= env_options
             with rasterio.Env(**env):
-                with rasterio.open(sparsefile.name) as src:
-                    yield src
-        finally:
+                dataset = rasterio.open(sparsefile.name)
+        except BaseException:
             sparsefile.close()
+            raise
+        return DatasetHandle(dataset=dataset, env=env, sparsefile=sparsefile)
+
+    @override
+    def read_window(
+        self,
+        uri: str,
+        window: Window,
+        range_reader: RangeReader | None = None,
+        max_workers: int = 8,
+        max_gap: int = 64 * 1024,
+        tile_cache: TileCache | None = None,
+        byte_cache: TileByteCache | None = None,
+        reduce: int = 0,
+    ) -> NDArray[Any]:
+        from jp2io.reader import read_window
+
+        return read_window(
+            self,
+            uri,
+            window,
+            range_reader=range_reader,
+            max_workers=max_workers,
+            max_gap=max_gap,
+            tile_cache=tile_cache,
+            byte_cache=byte_cache,
+            reduce=reduce,
+        )
 
     def recommended_env_vars(self) -> dict[str, Any]:
         return {
@@ -113,27 +286,58 @@ class VirtualTLMIndex(TLMIndex):
             # "CPL_VSIL_CURL_CHUNK_SIZE": "500000",
         }
 
-    def make_vsi_file_for_uri(self, uri: str) -> JP2WithTLMSparseFile:
+    def make_vsi_file_for_uri(self, uri: str, byte_cache: TileByteCache | None = None) -> JP2WithTLMSparseFile:
         """
         Parameters
         ----------
         uri
             Path to the raster.
             It should be in a format accepted by GDAL, for example starting with /vsicurl/ or /vsis3/ for remote access.
+        byte_cache
+            Tiles present in this cache are read from the local files instead of `uri`.
         """
         if uri.startswith("s3://") or uri.startswith("https://"):
             raise JP2IOException(f"Uri unsupported ('{uri}'): make sure to use /vsis3/ or /vsicurl/")
 
         tlm_mem = MemoryFile(self.tlm_segment, ext=".tlm")
+        children = [tlm_mem]
+
+        # JP2 until the end of the main header: from memory if embedded in the index, to avoid a request at opening
+        if self.main_header is not None:
+            header_mem = MemoryFile(self.main_header, ext=".jp2h")
+            children.append(header_mem)
+            header_filename = header_mem.name
+        else:
+            header_filename = uri
+
+        tlm_segment_length = len(self.tlm_segment)
+
+        # JP2 after the main header: (filename, source offset, length), in the order of the original file
+        regions: list[tuple[str, int, int]] = [(uri, self.position_first_sot, self.file_size - self.position_first_sot)]
+        if byte_cache is not None:
+            regions = []
+            ranges = self.into_tiles_range()
+            for position, length in zip(ranges.tiles_position.tolist(), ranges.tiles_length.tolist()):
+                cached = byte_cache.path(uri, position, length)
+                if os.path.exists(cached):
+                    regions.append((cached, 0, length))
+                elif regions and regions[-1][0] == uri:
+                    # merged with the previous remote region
+                    filename, offset, previous_length = regions[-1]
+                    regions[-1] = (filename, offset, previous_length + length)
+                else:
+                    regions.append((uri, position, length))
+            end = int(ranges.tiles_position[-1] + ranges.tiles_length[-1])
+            if end < self.file_size:
+                regions.append((uri, end, self.file_size - end))
 
         def make_content() -> bytes:
-            tlm_segment_length = len(self.tlm_segment)
             content = "<VSISparseFile>"
 
             # JP2 until the end of the main header
             content += f"""
             <SubfileRegion>
-                <Filename>{uri}</Filename>
+                <Filename>{header_filename}</Filename>
                 <DestinationOffset>0</DestinationOffset>
                 <SourceOffset>0</SourceOffset>
                 <RegionLength>{self.position_first_sot}</RegionLength>
@@ -151,14 +355,17 @@ class VirtualTLMIndex(TLMIndex):
             """
 
             # JP2 after the main header
-            content += f"""
+            destination = self.position_first_sot + tlm_segment_length
+            for filename, offset, length in regions:
+                content += f"""
             <SubfileRegion>
-                <Filename>{uri}</Filename>
-                <DestinationOffset>{self.position_first_sot + tlm_segment_length}</DestinationOffset>
-                <SourceOffset>{self.position_first_sot}</SourceOffset>
-                <RegionLength>{self.file_size - self.position_first_sot}</RegionLength>
+                <Filename>{filename}</Filename>
+                <DestinationOffset>{destination}</DestinationOffset>
+                <SourceOffset>{offset}</SourceOffset>
+                <RegionLength>{length}</RegionLength>
             </SubfileRegion>
             """
+                destination += length
 
             content += "</VSISparseFile>"
             content = content.encode("utf-8")
@@ -169,14 +376,46 @@ class VirtualTLMIndex(TLMIndex):
 
         return JP2WithTLMSparseFile(
             name=f"/vsisparse/{jp2_mem.name}",
-            _children=[jp2_mem, tlm_mem],
+            _children=[jp2_mem, *children],
             _content=content,
         )
 
-    def into_tiles_range(self) -> TilesRange:
+    def into_tiles_range(self, reduce: int = 0) -> TilesRange:
         """
+        Position and length of each tile in the original file, decoded once and then cached.
+
+        With `reduce` > 0, the length is the one of the beginning of the tile that is enough to decode it
+        at 1/2**reduce of its resolution, if the index contains the RESO extension, or the full length otherwise.
+
         See https://web.archive.org/web/20250209200219/https://ics.uci.edu/~dhirschb/class/267/papers/jpeg2000.pdf
         """
+        ranges = self._tiles_range
+        if reduce == 0 or self._resolution_ends is None:
+            return ranges
+
+        n_resolutions = self._resolution_ends.shape[1]
+        if not 0 < reduce < n_resolutions:
+            raise JP2IOException(f"reduce should be between 0 and {n_resolutions - 1}, got {reduce}")
+        tiles_length = np.ascontiguousarray(self._resolution_ends[:, n_resolutions - 1 - reduce])
+        tiles_length.flags.writeable = False
+        return TilesRange(ranges.tiles_position, tiles_length)
+
+    @functools.cached_property
+    def _resolution_ends(self) -> NDArray[np.uint64] | None:
+        if self.resolution_ends is None:
+            return None
+        n_resolutions = self.resolution_ends[0]
+        ends = np.frombuffer(self.resolution_ends, dtype=">u4", offset=1).astype(np.uint64)
+        if n_resolutions == 0 or len(ends) != n_resolutions * len(self._tiles_range.tiles_length):
+            raise UnsupportedJP2Exception()
+        ends = ends.reshape(-1, n_resolutions)
+        if not np.array_equal(ends[:, -1], self._tiles_range.tiles_length):
+            # the last resolution level ends with the tile
+            raise UnsupportedJP2Exception()
+        return ends
+
+    @functools.cached_property
+    def _tiles_range(self) -> TilesRange:
         tlm_marker = self.tlm_segment
 
         tlm, ltlm, ztlm, stlm = struct.unpack_from(">HHBB", tlm_marker)
@@ -189,65 +428,155 @@ class VirtualTLMIndex(TLMIndex):
         if ztlm != 0:
             raise UnsupportedJP2Exception()
 
-        if stlm & 0b00_11_0000 == 0b00_00_0000:
-            ttlm_size = 0
-        elif stlm & 0b00_11_0000 == 0b00_01_0000:
-            ttlm_size = 8
-        elif stlm & 0b00_11_0000 == 0b00_10_0000:
-            ttlm_size = 16
-        else:
-            # not possible according to the spec
+        dtype = _tlm_entry_dtype(stlm)
+        if (len(tlm_marker) - 6) % dtype.itemsize != 0:
             raise UnsupportedJP2Exception()
+        entries = np.frombuffer(tlm_marker, dtype=dtype, offset=6)
 
-        if stlm & 0b01000000 != 0:
-            ptlm_size = 32
-        else:
-            ptlm_size = 16
-
-        tiles_position = []
-        tiles_length = []
-        tile_index = 0
-        cumulative_position = self.position_first_sot
-
-        offset = 6
-        while offset < len(tlm_marker):
-            if ttlm_size == 0:
-                ttlm = tile_index
-            elif ttlm_size == 8:
-                ttlm = struct.unpack_from(">B", tlm_marker, offset)[0]
-                offset += 1
-            elif ttlm_size == 16:
-                ttlm = struct.unpack_from(">H", tlm_marker, offset)[0]
-                offset += 2
-            else:
-                # not possible according to the spec
-                raise UnsupportedJP2Exception()
-
-            # assuming sorted tiles
-            if ttlm != tile_index:
-                raise UnsupportedJP2Exception()
-
-            if ptlm_size == 0:
-                ptlm = 0
-            elif ptlm_size == 16:
-                ptlm = struct.unpack_from(">H", tlm_marker, offset)[0]
-                offset += 2
-            elif ptlm_size == 32:
-                ptlm = struct.unpack_from(">I", tlm_marker, offset)[0]
-                offset += 4
-            else:
-                # not possible according to the spec
-                raise UnsupportedJP2Exception()
-
-            tiles_position.append(+cumulative_position)
-            tiles_length.append(ptlm)
-
-            cumulative_position += ptlm
-            tile_index += 1
+        # assuming sorted tiles
+        if "ttlm" in dtype.names and not np.array_equal(entries["ttlm"], np.arange(len(entries))):  # type: ignore
+            raise UnsupportedJP2Exception()
 
+        tiles_length = entries["ptlm"].astype(np.uint64)
+        tiles_position = np.empty_like(tiles_length)
+        tiles_position[0:1] = self.position_first_sot
+        np.cumsum(tiles_length[:-1], out=tiles_position[1:])
+        tiles_position[1:] += np.uint64(self.position_first_sot)
+
+        tiles_position.flags.writeable = False
+        tiles_length.flags.writeable = False
         return TilesRange(tiles_position, tiles_length)
 
 
+def _tlm_entry_dtype(stlm: int) -> np.dtype[Any]:
+    """
+    One entry per tile in the TLM marker: Ttlm (tile index, optional) then Ptlm (tile length).
+    """
+    fields = []
+    if stlm & 0b00_11_0000 == 0b00_00_0000:
+        pass
+    elif stlm & 0b00_11_0000 == 0b00_01_0000:
+        fields.append(("ttlm", ">u1"))
+    elif stlm & 0b00_11_0000 == 0b00_10_0000:
+        fields.append(("ttlm", ">u2"))
+    else:
+        # not possible according to the spec
+        raise UnsupportedJP2Exception()
+
+    if stlm & 0b01000000 != 0:
+        fields.append(("ptlm", ">u4"))
+    else:
+        fields.append(("ptlm", ">u2"))
+    return np.dtype(fields)
+
+
+def stack_tiles_ranges(indexes: Sequence[bytes], reduce: int = 0) -> tuple[NDArray[np.uint64], NDArray[np.uint64]]:
+    """
+    Decodes many indexes at once, as `VirtualTLMIndex.into_tiles_range` would for each of them,
+    without creating TLMIndex objects: the cost is a few NumPy operations on all the indexes.
+
+    The indexes must describe rasters with the same number of tiles, for example a band of a MGRS tile over time.
+
+    Returns
+    -------
+    The positions and the lengths of the tiles, two arrays of shape (len(indexes), number of tiles).
+    """
+    starts = np.zeros(len(indexes) + 1, dtype=np.int64)
+    np.cumsum([len(index) for index in indexes], out=starts[1:])
+    starts, stops = starts[:-1], starts[1:]
+    data = np.frombuffer(b"".join(indexes), dtype=np.uint8)
+    if len(indexes) == 0:
+        return np.empty((0, 0), dtype=np.uint64), np.empty((0, 0), dtype=np.uint64)
+
+    def gather(rows: NDArray[np.int64], offsets: NDArray[np.int64], dtype: Any, count: int = 1) -> NDArray[Any]:
+        # `count` items of `dtype` at the given offsets of each of these indexes, shape (len(rows), count)
+        size = np.dtype(dtype).itemsize * count
+        if np.any(offsets + size > stops[rows]):
+            raise UnsupportedJP2Exception()
+        return data[offsets[:, None] + np.arange(size)].view(dtype)
+
+    # see `TLMIndex.from_bytes` and `VirtualTLMIndex._tiles_range`
+    if np.any(stops == starts):
+        # empty indexes are the ones of JP2 files already containing a TLM
+        raise UnsupportedJP2Exception("the indexes should all contain a TLM segment")
+    header_dtype = np.dtype(
+        [
+            ("file_size", ">u8"),
+            ("position_first_sot", ">u8"),
+            ("tlm_segment_length", ">u4"),
+            ("tlm", ">u2"),
+            ("ltlm", ">u2"),
+            ("ztlm", "u1"),
+            ("stlm", "u1"),
+        ]
+    )
+    headers = gather(np.arange(len(indexes)), starts, header_dtype)[:, 0]
+    segment_length = headers["tlm_segment_length"].astype(np.int64)
+    if (
+        np.any(headers["tlm"] != 0xFF55)
+        or np.any(headers["ltlm"] != segment_length - 2)
+        or np.any(headers["ztlm"] != 0)
+    ):
+        raise UnsupportedJP2Exception()
+
+    n_tiles = None
+    tiles_length = np.empty(0, dtype=np.uint64)
+    for stlm in np.unique(headers["stlm"]):
+        rows = np.flatnonzero(headers["stlm"] == stlm)
+        dtype = _tlm_entry_dtype(int(stlm))
+        counts = np.unique(segment_length[rows] - 6)
+        if len(counts) != 1 or counts[0] % dtype.itemsize != 0 or n_tiles not in (None, counts[0] // dtype.itemsize):
+            raise UnsupportedJP2Exception("the indexes should all have the same number of tiles")
+        n_tiles = int(counts[0] // dtype.itemsize)
+        if n_tiles == 0:
+            raise UnsupportedJP2Exception()
+        if len(tiles_length) == 0:
+            tiles_length = np.empty((len(indexes), n_tiles), dtype=np.uint64)
+
+        entries = gather(rows, starts[rows] + 26, dtype, n_tiles)
+        # assuming sorted tiles
+        if "ttlm" in dtype.names and not np.all(entries["ttlm"] == np.arange(n_tiles)):  # type: ignore
+            raise UnsupportedJP2Exception()
+        tiles_length[rows] = entries["ptlm"]
+
+    assert n_tiles is not None
+    tiles_position = np.empty_like(tiles_length)
+    tiles_position[:, 0] = 0
+    np.cumsum(tiles_length[:, :-1], axis=1, out=tiles_position[:, 1:])
+    tiles_position += headers["position_first_sot"].astype(np.uint64)[:, None]
+    if reduce == 0:
+        return tiles_position, tiles_length
+
+    # the payload of the RESO extension of each index, if any, the extensions being walked in step for all the indexes
+    extension_dtype = np.dtype([("tag", "S4"), ("length", ">u4")])
+    resolution_ends = np.full(len(indexes), -1, dtype=np.int64)
+    payload_length = np.zeros(len(indexes), dtype=np.int64)
+    cursor = starts + 20 + segment_length
+    while np.any(pending := (cursor + 8 <= stops) & (resolution_ends < 0)):
+        rows = np.flatnonzero(pending)
+        extensions = gather(rows, cursor[rows], extension_dtype)[:, 0]
+        found = extensions["tag"] == INDEX_EXTENSION_RESOLUTION_ENDS
+        resolution_ends[rows[found]] = cursor[rows[found]] + 8
+        payload_length[rows[found]] = extensions["length"][found]
+        cursor[rows] += 8 + extensions["length"].astype(np.int64)
+
+    has_extension = resolution_ends >= 0
+    n_resolutions = np.zeros(len(indexes), dtype=np.int64)
+    n_resolutions[has_extension] = data[resolution_ends[has_extension]]
+    for n in np.unique(n_resolutions[has_extension]):
+        if not 0 < reduce < n:
+            raise JP2IOException(f"reduce should be between 0 and {n - 1}, got {reduce}")
+        rows = np.flatnonzero(has_extension & (n_resolutions == n))
+        if np.any(payload_length[rows] != 1 + 4 * n * n_tiles):
+            raise UnsupportedJP2Exception()
+        ends = gather(rows, resolution_ends[rows] + 1, ">u4", n * n_tiles).reshape(-1, n_tiles, n)
+        if not np.array_equal(ends[:, :, -1], tiles_length[rows]):
+            # the last resolution level ends with the tile
+            raise UnsupportedJP2Exception()
+        tiles_length[rows] = ends[:, :, n - 1 - reduce]
+    return tiles_position, tiles_length
+
+
 @dataclass(frozen=True)
 class NoopTLMIndex(TLMIndex):
     """
@@ -262,13 +591,40 @@ class NoopTLMIndex(TLMIndex):
 
     @override
     @contextlib.contextmanager
-    def open(self, uri: str, env_options: dict[str, Any] = {}) -> Generator[rasterio.DatasetReader]:
+    def open(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> Generator[rasterio.DatasetReader]:
+        # without index, the tiles can not be located: the cache is not used
         env = self.recommended_env_vars().copy()
         env |= env_options
         with rasterio.Env(**env):
             with rasterio.open(uri) as src:
                 yield src
 
+    @override
+    def open_dataset(
+        self, uri: str, env_options: dict[str, Any] = {}, byte_cache: TileByteCache | None = None
+    ) -> DatasetHandle:
+        env = self.recommended_env_vars().copy()
+        env |= env_options
+        with rasterio.Env(**env):
+            dataset = rasterio.open(uri)
+        return DatasetHandle(dataset=dataset, env=env)
+
+    @override
+    def read_window(
+        self,
+        uri: str,
+        window: Window,
+        range_reader: RangeReader | None = None,
+        max_workers: int = 8,
+        max_gap: int = 64 * 1024,
+        tile_cache: TileCache | None = None,
+        byte_cache: TileByteCache | None = None,
+        reduce: int = 0,
+    ) -> NDArray[Any]:
+        raise JP2IOException("read_window is not supported for JP2 files that already contain a TLM, use open()")
+
     def recommended_env_vars(self) -> dict[str, Any]:
         return {
             "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
@@ -0,0 +1,371 @@
+"""
+Indexing of JP2 rasters in Python, as `make_index` of s2tlm-indexer: the boxes, the main header and the SOT marker of
+each tile are read with ranged requests, without fetching the tiles themselves.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+import warnings
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Generator, Iterable
+
+from typing_extensions import override
+
+from jp2io.cache import SingleFlightCache, SingleFlightStats
+from jp2io.codestream import (
+    J2K_MS_COC,
+    J2K_MS_EOC,
+    J2K_MS_POC,
+    J2K_MS_SOC,
+    J2K_MS_SOD,
+    J2K_MS_SOT,
+    J2K_MS_TLM,
+    JP2_JP,
+    JP2_JP2C,
+    MainHeader,
+)
+from jp2io.exception import JP2IOException, TLMIndexNotFound
+from jp2io.index import (
+    INDEX_EXTENSION_MAIN_HEADER,
+    INDEX_EXTENSION_RESOLUTION_ENDS,
+    TLMIndex,
+    TLMMetadata,
+    UnsupportedJP2Exception,
+)
+from jp2io.provider import TLMProvider
+from jp2io.rangereader import RangeReader
+
+if TYPE_CHECKING:
+    from obstore.store import ObjectStore
+
+FIRST_READ_SIZE = 4096
+""" the JP2 boxes and the main header of Sentinel-2 rasters usually fit in the first request """
+PREFETCH_SIZE = 128
+""" minimum size of the next requests, enough for the SOT marker of a tile and the beginning of the next one """
+
+_Walk = Generator[tuple[int, int], bytes, bytes]
+""" yields the (offset, length) to fetch, receives the bytes, returns the index """
+
+
+def make_index(
+    uri: str,
+    range_reader: RangeReader | None = None,
+    embed_main_header: bool = False,
+    resolution_ends: bool = False,
+) -> bytes:
+    """
+    Returns the index of a JP2 raster, in the format of s2tlm-indexer (see `TLMIndex.from_bytes`),
+    or an empty index if the raster already contains a TLM marker.
+
+    The SOT markers are read one tile after the other, with one small request per tile:
+    to index many rasters, see `make_indexes`.
+
+    Parameters
+    ----------
+    range_reader
+        Used to fetch the headers, by default `RangeReader.for_uri`.
+    embed_main_header
+        Embeds the JP2 boxes and the main header of the codestream in the index (`MHDR` extension).
+    resolution_ends
+        Records the end of each resolution level in each tile (`RESO` extension), read from the PLT markers.
+        Requires to read the header of each tile; skipped with a warning if the codestream is not
+        resolution-progressive or if a tile has no PLT marker.
+    """
+    if range_reader is None:
+        range_reader = RangeReader.for_uri(uri)
+
+    walk = _walk(embed_main_header, resolution_ends)
+    try:
+        offset, length = next(walk)
+        while True:
+            offset, length = walk.send(range_reader.read(uri, offset, length))
+    except StopIteration as stop:
+        index: bytes = stop.value
+        return index
+
+
+async def make_index_async(
+    store: ObjectStore,
+    path: str,
+    embed_main_header: bool = False,
+    resolution_ends: bool = False,
+) -> bytes:
+    """
+    Async equivalent of `make_index`, the headers being fetched with obstore.
+    """
+    import obstore
+
+    walk = _walk(embed_main_header, resolution_ends)
+    try:
+        offset, length = next(walk)
+        while True:
+            data = await obstore.get_range_async(store, path, start=offset, length=length)
+            offset, length = walk.send(bytes(data))
+    except StopIteration as stop:
+        index: bytes = stop.value
+        return index
+
+
+async def make_indexes(
+    store: ObjectStore,
+    paths: Iterable[str],
+    max_concurrency: int = 64,
+    embed_main_header: bool = False,
+    resolution_ends: bool = False,
+) -> list[bytes | Exception]:
+    """
+    Indexes many rasters concurrently with `make_index_async`, at most `max_concurrency` at a time:
+    the requests of a raster depend on each other, the latency is hidden by indexing the rasters in parallel.
+
+    Returns the indexes in the order of `paths`. The rasters that could not be indexed have the exception raised
+    in place of their index, so that one invalid raster does not discard the others.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def index(path: str) -> bytes | Exception:
+        async with semaphore:
+            try:
+                return await make_index_async(
+                    store, path, embed_main_header=embed_main_header, resolution_ends=resolution_ends
+                )
+            except Exception as e:
+                return e
+
+    return list(await asyncio.gather(*(index(path) for path in paths)))
+
+
+class _CachedReads:
+    """
+    Serves the reads of the walk from the last fetched range, prefetching at least `prefetch_size` bytes
+    (as the CachedReader of s2tlm-indexer).
+    """
+
+    def __init__(self, prefetch_size: int) -> None:
+        self.prefetch_size = prefetch_size
+        self.buffer = b""
+        self.offset = 0
+        self.next_size = FIRST_READ_SIZE
+
+    def read(self, offset: int, length: int) -> _Walk:
+        start = offset - self.offset
+        if start < 0 or start + length > len(self.buffer):
+            self.buffer = yield (offset, max(length, self.next_size))
+            self.offset, start = offset, 0
+            self.next_size = self.prefetch_size
+            if len(self.buffer) < length:
+                raise JP2IOException(f"invalid JP2 file: unexpected end of file at {offset + len(self.buffer)}")
+        return self.buffer[start : start + length]
+
+
+def _walk(embed_main_header: bool, resolution_ends: bool) -> _Walk:
+    # the tile headers with their PLT markers are read in one request
+    reader = _CachedReads(FIRST_READ_SIZE if resolution_ends else PREFETCH_SIZE)
+
+    # look for the codestream box
+    cur = 0
+    while True:
+        (length, boxtype) = struct.unpack(">II", (yield from reader.read(cur, 8)))
+        data_start = cur + 8
+        if length == 1:
+            (length,) = struct.unpack(">Q", (yield from reader.read(cur + 8, 8)))
+            data_start = cur + 16
+        if cur == 0 and boxtype != JP2_JP:
+            raise JP2IOException("invalid JP2 file: signature box not found")
+        if boxtype == JP2_JP2C:
+            break
+        if length == 0:
+            raise JP2IOException("invalid JP2 file: codestream box not found")
+        cur += length
+
+    # look for the first SOT marker, skipping the other ones (SIZ, COD, ...)
+    cur = data_start
+    (code,) = struct.unpack(">H", (yield from reader.read(cur, 2)))
+    if code != J2K_MS_SOC:
+        raise JP2IOException("invalid codestream: SOC marker not found")
+    cur += 2
+    has_coc = False
+    has_poc = False
+    while True:
+        (code,) = struct.unpack(">H", (yield from reader.read(cur, 2)))
+        if code in (J2K_MS_SOT, J2K_MS_EOC):
+            # a codestream may have no tile at all
+            break
+        (length,) = struct.unpack(">H", (yield from reader.read(cur + 2, 2)))
+        if code == J2K_MS_TLM:
+            # the raster can be read efficiently as it is
+            return b""
+        has_coc |= code == J2K_MS_COC
+        has_poc |= code == J2K_MS_POC
+        cur += 2 + length
+    position_first_sot = cur
+
+    main_header = b""
+    if embed_main_header or resolution_ends:
+        main_header = yield from reader.read(0, position_first_sot)
+
+    # the resolution levels can only be located if they are in the same order in all the tiles and components,
+    # and if the progression order of the COD marker is not changed by a POC marker
+    header = None
+    ends: list[tuple[int, list[int]]] | None = None
+    if resolution_ends:
+        header = MainHeader.parse(main_header)
+        if header.cod.resolution_progressive and not has_coc and not has_poc:
+            ends = []
+        else:
+            warnings.warn("codestream not resolution-progressive, the end of the resolution levels is not indexed")
+
+    # iterate through the tiles until the end of the codestream
+    tiles = []
+    while True:
+        (code,) = struct.unpack(">H", (yield from reader.read(cur, 2)))
+        if code == J2K_MS_EOC:
+            break
+        if code != J2K_MS_SOT:
+            raise JP2IOException(f"invalid codestream: expected a SOT marker at {cur}, found 0x{code:04X}")
+        (lsot, isot, psot, tpsot, tnsot) = struct.unpack(">HHIBB", (yield from reader.read(cur + 2, 10)))
+        # multi-parts per tile is not supported (as in s2tlm-indexer)
+        if tpsot != 0 or tnsot != 1:
+            raise UnsupportedJP2Exception(f"tile {isot}: only tiles in a single tile-part are supported")
+        if psot == 0:
+            raise UnsupportedJP2Exception(f"tile {isot}: tile-part without length (Psot=0) is not supported")
+
+        if header is not None and ends is not None:
+            # tile-part header, from the SOT marker until the end of the SOD marker
+            end = cur + 2 + lsot
+            while True:
+                (code, length) = struct.unpack(">HH", (yield from reader.read(end, 4)))
+                if code == J2K_MS_SOD:
+                    end += 2
+                    break
+                end += 2 + length
+            tile_ends = header.resolution_ends(isot, (yield from reader.read(cur, end - cur)))
+            if tile_ends is None:
+                warnings.warn(f"tile {isot} has no PLT marker, the end of the resolution levels is not indexed")
+                ends = None
+            else:
+                ends.append((isot, tile_ends))
+
+        tiles.append((isot, psot))
+        cur += psot
+
+    index = _tlm_index(cur + 2, position_first_sot, tiles)
+    if embed_main_header:
+        index += _extension(INDEX_EXTENSION_MAIN_HEADER, main_header)
+    if ends:
+        # without tiles, there is no resolution level to record
+        ends.sort()
+        payload = bytes([len(ends[0][1])])
+        payload += b"".join(struct.pack(f">{len(e)}I", *e) for _, e in ends)
+        index += _extension(INDEX_EXTENSION_RESOLUTION_ENDS, payload)
+    return index
+
+
+def _tlm_index(file_size: int, position_first_sot: int, tiles: list[tuple[int, int]]) -> bytes:
+    """
+    Encodes the index header and the TLM marker segment, with the same field sizes as s2tlm-indexer.
+    """
+    tiles = sorted(tiles)
+    if not tiles:
+        stlm, isot_format = 0, ""
+    elif tiles[-1][0] <= 254:
+        stlm, isot_format = 0b0001_0000, "B"
+    else:
+        stlm, isot_format = 0b0010_0000, "H"
+    psot_format = "H"
+    if any(psot > 65_534 for _, psot in tiles):
+        stlm |= 0b0100_0000
+        psot_format = "I"
+
+    entry = struct.Struct(f">{isot_format}{psot_format}")
+    entries = b"".join(entry.pack(isot, psot) if isot_format else entry.pack(psot) for isot, psot in tiles)
+    segment = struct.pack(">HHBB", J2K_MS_TLM, 4 + len(entries), 0, stlm) + entries
+    return struct.pack(">QQL", file_size, position_first_sot, len(segment)) + segment
+
+
+def _extension(tag: bytes, payload: bytes) -> bytes:
+    return struct.pack(">4sL", tag, len(payload)) + payload
+
+
+@dataclass(frozen=True)
+class IndexingTLMProvider(TLMProvider):
+    """
+    Indexes with `make_index` the rasters that `provider` does not know (for example, products more recent than its
+    parquet files), so that they are read with a TLM index as well instead of falling back to the slow path.
+
+    The indexes are kept in memory, a raster requested by several threads at the same time is indexed once,
+    and the rasters that could not be indexed (missing or unsupported) are remembered for `negative_cache_ttl`
+    seconds. The other errors, for example timeouts, are raised to the caller without being remembered.
+    """
+
+    provider: TLMProvider
+    path_of: Callable[[str, str], str]
+    """ path of the raster of (product_id, band_id), recorded in the index; may raise TLMIndexNotFound """
+    uri_of: Callable[[str], str] | None = None
+    """ URI of the raster at a path, as accepted by `range_reader`; by default the path """
+    range_reader: RangeReader | None = None
+    embed_main_header: bool = True
+    """ the main header is read anyway to index the raster, keeping it saves a request to each read """
+    resolution_ends: bool = False
+    cache_maxsize: int = 1024
+    """ number of indexes kept in memory """
+    negative_cache_ttl: float = 300.0
+    """ in seconds """
+
+    _indexes: SingleFlightCache[tuple[str, str], TLMIndex] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        indexes: SingleFlightCache[tuple[str, str], TLMIndex] = SingleFlightCache(
+            maxsize=self.cache_maxsize,
+            negative_ttl=self.negative_cache_ttl,
+            negative_exceptions=(TLMIndexNotFound,),
+        )
+        object.__setattr__(self, "_indexes", indexes)
+
+    @property
+    def stats(self) -> SingleFlightStats:
+        """Counters of the cache of the indexes made by this provider."""
+        return self._indexes.stats
+
+    @override
+    def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        try:
+            return self.provider.get_tlm(product_id, band_id)
+        except TLMIndexNotFound:
+            pass
+        return self._indexes.get((product_id, band_id), lambda: self._index(product_id, band_id))
+
+    def _index(self, product_id: str, band_id: str) -> TLMIndex:
+        path = self.path_of(product_id, band_id)
+        uri = self.uri_of(path) if self.uri_of is not None else path
+        try:
+            index = make_index(
+                uri,
+                range_reader=self.range_reader,
+                embed_main_header=self.embed_main_header,
+                resolution_ends=self.resolution_ends,
+            )
+        except (JP2IOException, UnsupportedJP2Exception) as e:
+            # the callers fall back to reading the raster without index, as for any missing index
+            raise TLMIndexNotFound(f"Could not index {uri} for product {product_id} and band {band_id}: {e}") from e
+        except Exception as e:
+            # other errors (timeouts, throttling, ...) are not remembered, the next request tries again
+            if not _is_not_found(e):
+                raise
+            raise TLMIndexNotFound(f"Could not find {uri} for product {product_id} and band {band_id}") from e
+        return TLMIndex.from_bytes(index, TLMMetadata(product_id=product_id, band_id=band_id, path=path))
+
+
+def _is_not_found(e: BaseException) -> bool:
+    """
+    Returns True if the exception is caused by a missing file, from the range readers of `jp2io.rangereader`.
+    """
+    if isinstance(e, FileNotFoundError):
+        return True
+    if getattr(e, "code", None) == 404:
+        # urllib.error.HTTPError
+        return True
+    response = getattr(e, "response", None)
+    # botocore.exceptions.ClientError
+    return isinstance(response, dict) and response.get("Error", {}).get("Code") in ("404", "NoSuchKey")
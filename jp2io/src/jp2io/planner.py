@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+from jp2io.index import TilesRange
+
+
+@dataclass(frozen=True)
+class CoalescedRange:
+    """
+    A single request covering one or several tiles.
+    """
+
+    offset: int
+    length: int
+    tiles: tuple[int, ...]
+    """ indices of the tiles served by this range """
+    tiles_offset: tuple[int, ...]
+    """ position of each tile relative to `offset` """
+    tiles_length: tuple[int, ...]
+
+    def split(self, buf: bytes | memoryview) -> list[memoryview]:
+        """
+        Returns the bytes of each tile from the bytes of the whole range, without copy.
+        """
+        view = memoryview(buf)
+        return [view[o : o + n] for o, n in zip(self.tiles_offset, self.tiles_length)]
+
+
+def plan_ranges(
+    ranges: TilesRange,
+    tiles: Sequence[int],
+    max_gap: int = 64 * 1024,
+    max_length: int | None = None,
+) -> list[CoalescedRange]:
+    """
+    Merges the byte ranges of the requested tiles into fewer requests.
+
+    Sentinel-2 tiles are stored contiguously in raster order, so the tiles of a row of a window are adjacent.
+
+    Parameters
+    ----------
+    ranges
+        Position and length of all the tiles of the raster.
+    tiles
+        Indices of the tiles to read.
+    max_gap
+        Two ranges separated by at most `max_gap` unneeded bytes are merged (the gap is read and discarded).
+    max_length
+        Ranges are not merged beyond this length, if given.
+    """
+    sorted_tiles = sorted(set(tiles), key=lambda t: ranges.tiles_position[t])
+
+    plan: list[CoalescedRange] = []
+    group: list[int] = []
+
+    def flush() -> None:
+        if not group:
+            return
+        start = int(ranges.tiles_position[group[0]])
+        end = max(int(ranges.tiles_position[t]) + int(ranges.tiles_length[t]) for t in group)
+        plan.append(
+            CoalescedRange(
+                offset=start,
+                length=end - start,
+                tiles=tuple(group),
+                tiles_offset=tuple(int(ranges.tiles_position[t]) - start for t in group),
+                tiles_length=tuple(int(ranges.tiles_length[t]) for t in group),
+            )
+        )
+        group.clear()
+
+    start = end = 0
+    for t in sorted_tiles:
+        position = int(ranges.tiles_position[t])
+        length = int(ranges.tiles_length[t])
+        if group:
+            too_far = position - end > max_gap
+            too_long = max_length is not None and max(end, position + length) - start > max_length
+            if too_far or too_long:
+                flush()
+        if not group:
+            start = end = position
+        group.append(t)
+        end = max(end, position + length)
+
+    flush()
+    return plan
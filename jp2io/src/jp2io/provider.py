@@ -3,16 +3,26 @@ from __future__ import annotations
 import abc
 import functools
 import io
-import weakref
-from dataclasses import dataclass
-from typing import Any, TypedDict
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Sequence, TypedDict
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
+from numpy.typing import NDArray
 from typing_extensions import override
 
+from jp2io.cache import ShardDiskCache, SingleFlightCache, SingleFlightStats
 from jp2io.exception import TLMIndexNotFound
 from jp2io.index import TLMIndex, TLMMetadata
 
+if TYPE_CHECKING:
+    from rasterio.windows import Window
+
+    from jp2io.session import ReaderSession
+
 
 class TLMProvider(abc.ABC):
     @abc.abstractmethod
@@ -24,6 +34,44 @@ class TLMProvider(abc.ABC):
             TLMIndexNotFound: if no TLMIndex object is found.
         """
 
+    def get_tlms(self, product_id: str, band_ids: Sequence[str]) -> list[TLMIndex]:
+        """
+        Returns the TLMIndex objects of several bands of a product, in the same order as `band_ids`.
+
+        Raises:
+            TLMIndexNotFound: if one of the TLMIndex objects is not found.
+        """
+        return [self.get_tlm(product_id, band_id) for band_id in band_ids]
+
+    def read_bands(
+        self,
+        product_id: str,
+        band_ids: Sequence[str],
+        window: Window,
+        uri_of: Callable[[TLMIndex], str],
+        session: ReaderSession | None = None,
+    ) -> NDArray[Any]:
+        """
+        Reads the same window of several bands of a product, concurrently.
+
+        Returns an array of shape (band, height, width).
+
+        Parameters
+        ----------
+        window
+            Window to read, in pixels of the 10m grid.
+            For bands at 20m or 60m, the window is read from the raster of the band and upsampled (nearest neighbour).
+        uri_of
+            Returns the path of the raster of a band, as accepted by `TLMIndex.open`,
+            for example `lambda tlm: f"/vsis3{tlm.path}"`.
+        session
+            Used to keep the datasets open between calls, the bands being read in the threads of the session.
+            By default the datasets are closed after the read.
+        """
+        from jp2io.bands import read_bands
+
+        return read_bands(self.get_tlms(product_id, band_ids), window, uri_of, session=session)
+
 
 class _ParquetTLMTable(TypedDict):
     product_id: list[str]
@@ -35,74 +83,484 @@ class _ParquetTLMTable(TypedDict):
 @dataclass(frozen=True)
 class ParquetTLMProvider(TLMProvider):
     table: _ParquetTLMTable
+    cache_maxsize: int = 256
+    """ number of decoded TLMIndex objects kept in memory """
+
+    _rows: dict[tuple[str, str], int] = field(init=False, repr=False, compare=False)
+    _decode_row: Callable[[int], TLMIndex] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # (product_id, band_id) -> row, built once so that lookups do not depend on the size of the table
+        # in case of duplicates, the first row wins (same as the previous linear scan)
+        rows: dict[tuple[str, str], int] = {}
+        for row, key in enumerate(zip(self.table["product_id"], self.table["band_id"])):
+            rows.setdefault(key, row)
+        object.__setattr__(self, "_rows", rows)
+        object.__setattr__(
+            self, "_decode_row", functools.lru_cache(maxsize=self.cache_maxsize)(self._decode_row_uncached)
+        )
 
     @staticmethod
-    def from_pyarray(table: Any) -> ParquetTLMProvider:
+    def from_pyarray(table: Any, cache_maxsize: int = 256) -> ParquetTLMProvider:
         table = table.to_pydict()
-        return ParquetTLMProvider(table=table)
+        return ParquetTLMProvider(table=table, cache_maxsize=cache_maxsize)
 
     @staticmethod
-    def from_local_file(path: str) -> ParquetTLMProvider:
+    def from_local_file(path: str, cache_maxsize: int = 256) -> ParquetTLMProvider:
         db = pq.read_table(path)
-        return ParquetTLMProvider.from_pyarray(db)
+        return ParquetTLMProvider.from_pyarray(db, cache_maxsize=cache_maxsize)
 
     @override
     def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        row = self._rows.get((product_id, band_id))
+        if row is None:
+            raise TLMIndexNotFound(f"Could not find TLM index for product {product_id} and band {band_id}")
+        return self._decode_row(row)
+
+    @override
+    def get_tlms(self, product_id: str, band_ids: Sequence[str]) -> list[TLMIndex]:
+        rows = [self._rows.get((product_id, band_id)) for band_id in band_ids]
+        for band_id, row in zip(band_ids, rows):
+            if row is None:
+                raise TLMIndexNotFound(f"Could not find TLM index for product {product_id} and band {band_id}")
+        return [self._decode_row(row) for row in rows if row is not None]
+
+    def _decode_row_uncached(self, row: int) -> TLMIndex:
         table = self.table
-        for pid, bid, path, index in zip(table["product_id"], table["band_id"], table["path"], table["index"]):
-            if pid == product_id and bid == band_id:
-                meta = TLMMetadata(
-                    product_id=product_id,
-                    band_id=band_id,
-                    path=path,
-                )
-                tlm_index = TLMIndex.from_bytes(index, meta)
-                return tlm_index
+        meta = TLMMetadata(
+            product_id=table["product_id"][row],
+            band_id=table["band_id"][row],
+            path=table["path"][row],
+        )
+        return TLMIndex.from_bytes(table["index"][row], meta)
+
+
+@dataclass(frozen=True)
+class LazyParquetTLMProvider(TLMProvider):
+    """
+    Reads the TLM parquet on demand, instead of loading the full table in memory.
+
+    Only the row groups whose product_id/band_id statistics may contain the requested product are read,
+    and the index blobs stay in Arrow buffers until they are requested.
+    This works best when the parquet is sorted by product_id, which is the case for s2tlm-indexer outputs.
+    """
+
+    parquet_file: Any
+    """ a pyarrow.parquet.ParquetFile """
+    cache_maxsize: int = 256
+    """ number of decoded TLMIndex objects kept in memory """
+    row_groups_cache_maxsize: int = 16
+    """ number of row groups kept in memory """
+
+    _statistics: list[tuple[Any, Any]] = field(init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(init=False, repr=False, compare=False, default_factory=threading.Lock)
+    _read_row_group: Callable[[int], tuple[dict[tuple[str, str], int], Any]] = field(
+        init=False, repr=False, compare=False
+    )
+    _decode_row: Callable[[int, int], TLMIndex] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        metadata = self.parquet_file.metadata
+        names = [metadata.schema.column(j).name for j in range(metadata.num_columns)]
+        columns = [names.index("product_id"), names.index("band_id")]
+
+        # (min, max) of (product_id, band_id) for each row group, None if the statistics are not available
+        statistics = []
+        for i in range(metadata.num_row_groups):
+            bounds = []
+            for j in columns:
+                stats = metadata.row_group(i).column(j).statistics
+                bounds.append((stats.min, stats.max) if stats is not None and stats.has_min_max else None)
+            statistics.append(tuple(bounds))
+        object.__setattr__(self, "_statistics", statistics)
+
+        object.__setattr__(
+            self,
+            "_read_row_group",
+            functools.lru_cache(maxsize=self.row_groups_cache_maxsize)(self._read_row_group_uncached),
+        )
+        object.__setattr__(
+            self, "_decode_row", functools.lru_cache(maxsize=self.cache_maxsize)(self._decode_row_uncached)
+        )
+
+    @staticmethod
+    def from_local_file(path: str, cache_maxsize: int = 256) -> LazyParquetTLMProvider:
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        return LazyParquetTLMProvider(parquet_file=parquet_file, cache_maxsize=cache_maxsize)
+
+    @override
+    def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        return self.get_tlms(product_id, [band_id])[0]
+
+    @override
+    def get_tlms(self, product_id: str, band_ids: Sequence[str]) -> list[TLMIndex]:
+        # each candidate row group is read once for all the bands, the first row group containing a band wins
+        located: dict[str, tuple[int, int]] = {}
+        for row_group in self._candidate_row_groups(product_id, band_ids):
+            rows, _ = self._read_row_group(row_group)
+            for band_id in band_ids:
+                row = rows.get((product_id, band_id))
+                if row is not None:
+                    located.setdefault(band_id, (row_group, row))
+            if len(located) == len(set(band_ids)):
+                break
+
+        for band_id in band_ids:
+            if band_id not in located:
+                raise TLMIndexNotFound(f"Could not find TLM index for product {product_id} and band {band_id}")
+        return [self._decode_row(*located[band_id]) for band_id in band_ids]
+
+    def _candidate_row_groups(self, product_id: str, band_ids: Sequence[str]) -> list[int]:
+        """
+        Row groups whose statistics may contain the product and at least one of the bands.
+        """
+        candidates = []
+        for i, (product_bounds, band_bounds) in enumerate(self._statistics):
+            if product_bounds is not None and not product_bounds[0] <= product_id <= product_bounds[1]:
+                continue
+            if band_bounds is None or any(band_bounds[0] <= band_id <= band_bounds[1] for band_id in band_ids):
+                candidates.append(i)
+        return candidates
+
+    def _read_row_group_uncached(self, row_group: int) -> tuple[dict[tuple[str, str], int], Any]:
+        with self._lock:
+            table = self.parquet_file.read_row_group(row_group, columns=["product_id", "band_id", "path", "index"])
+
+        rows: dict[tuple[str, str], int] = {}
+        keys = zip(table["product_id"].to_pylist(), table["band_id"].to_pylist())
+        for row, key in enumerate(keys):
+            rows.setdefault(key, row)
+        return rows, table
+
+    def _decode_row_uncached(self, row_group: int, row: int) -> TLMIndex:
+        _, table = self._read_row_group(row_group)
+        meta = TLMMetadata(
+            product_id=table["product_id"][row].as_py(),
+            band_id=table["band_id"][row].as_py(),
+            path=table["path"][row].as_py(),
+        )
+        return TLMIndex.from_bytes(table["index"][row].as_buffer().to_pybytes(), meta)
+
+
+@dataclass(frozen=True)
+class CompactTLMProvider(TLMProvider):
+    """
+    Keeps the TLM indexes of many products in memory with little overhead, for example a catalog of MGRS tiles.
+
+    The index blobs and the paths are concatenated into contiguous buffers addressed by offsets arrays,
+    and the product and band ids are dictionary-encoded, so the memory used does not grow with Python objects per row.
+    Rows are sorted by (product, band): a lookup is a dictionary lookup of the product followed by a binary search.
+    TLMIndex objects are only created when requested, from slices of the buffers.
+    """
+
+    product_ids: tuple[str, ...]
+    """ distinct product ids, the code of a product is its position """
+    band_ids: tuple[str, ...]
+    """ distinct band ids, the code of a band is its position """
+    keys: NDArray[np.int64]
+    """ `product code * len(band_ids) + band code` of each row, sorted and unique """
+    index_data: NDArray[np.uint8]
+    index_offsets: NDArray[np.int64]
+    """ the index of row i is `index_data[index_offsets[i]:index_offsets[i + 1]]` """
+    path_data: NDArray[np.uint8]
+    path_offsets: NDArray[np.int64]
+    """ the path of row i is `path_data[path_offsets[i]:path_offsets[i + 1]]`, utf-8 encoded """
+    cache_maxsize: int = 256
+    """ number of decoded TLMIndex objects kept in memory """
+
+    _product_codes: dict[str, int] = field(init=False, repr=False, compare=False)
+    _band_codes: dict[str, int] = field(init=False, repr=False, compare=False)
+    _decode_row: Callable[[int], TLMIndex] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_product_codes", {pid: i for i, pid in enumerate(self.product_ids)})
+        object.__setattr__(self, "_band_codes", {bid: i for i, bid in enumerate(self.band_ids)})
+        object.__setattr__(
+            self, "_decode_row", functools.lru_cache(maxsize=self.cache_maxsize)(self._decode_row_uncached)
+        )
+
+    @staticmethod
+    def from_pyarrays(tables: Iterable[Any], cache_maxsize: int = 256) -> CompactTLMProvider:
+        """
+        Parameters
+        ----------
+        tables
+            pyarrow tables with the schema of the parquet files of s2tlm-indexer, for example one per MGRS tile.
+            They are consumed one at a time, so that only one of them needs to be in memory.
+            In case of duplicates, the first row wins.
+        """
+        product_codes: dict[str, int] = {}
+        band_codes: dict[str, int] = {}
+        keys_parts = []
+        index_parts = []
+        path_parts = []
+        for table in tables:
+            codes = []
+            for column, dictionary in ((table["product_id"], product_codes), (table["band_id"], band_codes)):
+                values = pc.unique(column)
+                mapping = np.array([dictionary.setdefault(v, len(dictionary)) for v in values.to_pylist()])
+                codes.append(mapping[pc.index_in(column, value_set=values).to_numpy()].astype(np.int64))
+            keys_parts.append(codes)
+            index_parts.append(table["index"].cast(pa.large_binary()).combine_chunks())
+            path_parts.append(table["path"].cast(pa.large_binary()).combine_chunks())
+            del table
+
+        # the number of bands is only known at the end
+        keys = np.concatenate(
+            [np.empty(0, dtype=np.int64)] + [p * len(band_codes) + b for p, b in keys_parts],
+        )
+
+        # stable sort, then only keep the first row of each key
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        order = order[first]
+        keys = keys[first]
+        keys.flags.writeable = False
+
+        index_data, index_offsets = _to_arena(pa.concat_arrays(index_parts).take(pa.array(order)))
+        del index_parts
+        path_data, path_offsets = _to_arena(pa.concat_arrays(path_parts).take(pa.array(order)))
+        del path_parts
+        # the allocator of Arrow keeps the memory of the intermediate arrays otherwise
+        pa.default_memory_pool().release_unused()
+
+        return CompactTLMProvider(
+            product_ids=tuple(product_codes),
+            band_ids=tuple(band_codes),
+            keys=keys,
+            index_data=index_data,
+            index_offsets=index_offsets,
+            path_data=path_data,
+            path_offsets=path_offsets,
+            cache_maxsize=cache_maxsize,
+        )
+
+    @staticmethod
+    def from_local_files(paths: Iterable[str], cache_maxsize: int = 256) -> CompactTLMProvider:
+        return CompactTLMProvider.from_pyarrays(
+            (pq.read_table(path, columns=["product_id", "band_id", "path", "index"]) for path in paths),
+            cache_maxsize=cache_maxsize,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the buffers, excluding the dictionaries of product and band ids.
+        """
+        arrays = (self.keys, self.index_data, self.index_offsets, self.path_data, self.path_offsets)
+        return sum(a.nbytes for a in arrays)
+
+    @override
+    def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        product_code = self._product_codes.get(product_id)
+        band_code = self._band_codes.get(band_id)
+        if product_code is not None and band_code is not None:
+            key = product_code * len(self.band_ids) + band_code
+            row = int(np.searchsorted(self.keys, key))
+            if row < len(self.keys) and self.keys[row] == key:
+                return self._decode_row(row)
 
         raise TLMIndexNotFound(f"Could not find TLM index for product {product_id} and band {band_id}")
 
+    def _decode_row_uncached(self, row: int) -> TLMIndex:
+        product_code, band_code = divmod(int(self.keys[row]), len(self.band_ids))
+        path = self.path_data[self.path_offsets[row] : self.path_offsets[row + 1]]
+        meta = TLMMetadata(
+            product_id=self.product_ids[product_code],
+            band_id=self.band_ids[band_code],
+            path=path.tobytes().decode("utf-8"),
+        )
+        return TLMIndex.from_bytes(
+            self.index_data[self.index_offsets[row] : self.index_offsets[row + 1]].tobytes(), meta
+        )
+
+
+def _to_arena(array: Any) -> tuple[NDArray[np.uint8], NDArray[np.int64]]:
+    """
+    Copies a large_binary pyarrow array into (data, offsets) numpy arrays, with offsets starting at 0.
+    """
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[array.offset : array.offset + len(array) + 1]
+    if data_buffer is None:
+        return np.empty(0, dtype=np.uint8), offsets - offsets[0]
+    data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0] : offsets[-1]]
+    return data.copy(), offsets - offsets[0]
+
+
+class _RangeFile(io.RawIOBase):
+    """
+    Read-only file object over a remote object, where each read outside of its tail is a ranged request.
+
+    The tail of the object is fetched with the first request (which also gives the size of the object),
+    so that opening a parquet file costs a single request for its footer.
+    """
+
+    def __init__(self, tail: bytes, size: int) -> None:
+        super().__init__()
+        self.position = 0
+        self.tail = tail
+        self.size = size
+        self.tail_offset = size - len(tail)
+
+    @abc.abstractmethod
+    def read_range(self, start: int, end: int) -> bytes:
+        """
+        Fetches the bytes from `start` (included) to `end` (excluded) of the object.
+        """
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def seekable(self) -> bool:
+        return True
 
-# from https://stackoverflow.com/a/68052994
-def weak_lru(maxsize: int = 128, typed: bool = False):  # type: ignore
-    'LRU Cache decorator that keeps a weak reference to "self"'
+    @override
+    def tell(self) -> int:
+        return self.position
 
-    def wrapper(func):  # type: ignore
-        @functools.lru_cache(maxsize, typed)
-        def _func(_self, *args, **kwargs):  # type: ignore
-            return func(_self(), *args, **kwargs)
+    @override
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        return self.position
+
+    @override
+    def readinto(self, buffer: Any) -> int:
+        start = self.position
+        end = min(start + len(buffer), self.size)
+        if end <= start:
+            return 0
 
-        @functools.wraps(func)
-        def inner(self, *args, **kwargs):  # type: ignore
-            return _func(weakref.ref(self), *args, **kwargs)
+        if start >= self.tail_offset:
+            data = self.tail[start - self.tail_offset : end - self.tail_offset]
+        else:
+            data = self.read_range(start, end)
 
-        return inner
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
 
-    return wrapper
+
+class _S3RangeFile(_RangeFile):
+    """
+    `_RangeFile` over an S3 object, read with GET requests.
+    """
+
+    def __init__(self, s3_client: Any, bucket: str, key: str, tail_size: int = 64 * 1024) -> None:
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+
+        object = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=-{tail_size}")
+        tail = object["Body"].read()
+        content_range = object.get("ContentRange")
+        # "bytes start-end/size", absent if the whole object was returned
+        super().__init__(tail, int(content_range.split("/")[-1]) if content_range else len(tail))
+
+    @override
+    def read_range(self, start: int, end: int) -> bytes:
+        object = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end - 1}")
+        data: bytes = object["Body"].read()
+        return data
 
 
 @dataclass(frozen=True)
 class S3TLMProvider(TLMProvider):
+    """
+    Reads the TLM parquet files from S3 using ranged requests:
+    the footer is fetched first, then only the row groups that can contain the requested product.
+
+    If a `disk_cache` is given, the parquet files are downloaded entirely and kept on disk instead,
+    and later uses only cost a conditional request (If-None-Match) to check that the file did not change.
+
+    Parquet files are opened once per (level, mgrs_tile), even when several threads request them at the same time,
+    and missing parquet files are remembered for `negative_cache_ttl` seconds.
+    """
+
     s3_path_pattern: str
     """ must contain {level} and {mgrs_tile} as a placeholder """
     s3_client: Any
+    disk_cache: ShardDiskCache | None = None
+    negative_cache_ttl: float = 300.0
+    """ in seconds """
+
+    _providers: SingleFlightCache[tuple[str, str], TLMProvider] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        providers: SingleFlightCache[tuple[str, str], TLMProvider] = SingleFlightCache(
+            maxsize=32,
+            negative_ttl=self.negative_cache_ttl,
+            negative_exceptions=(TLMIndexNotFound,),
+        )
+        object.__setattr__(self, "_providers", providers)
+
+    @property
+    def stats(self) -> SingleFlightStats:
+        """Counters of the cache of parquet files."""
+        return self._providers.stats
 
     @override
     def get_tlm(self, product_id: str, band_id: str) -> TLMIndex:
+        return self._provider_of(product_id).get_tlm(product_id, band_id)
+
+    @override
+    def get_tlms(self, product_id: str, band_ids: Sequence[str]) -> list[TLMIndex]:
+        # the parquet file is looked up once for all the bands
+        return self._provider_of(product_id).get_tlms(product_id, band_ids)
+
+    def _provider_of(self, product_id: str) -> TLMProvider:
         mgrs_tile = product_id.split("_")[5][1:]
         level = product_id.split("_")[1][3:]
-        provider: ParquetTLMProvider = self._get_provider_for(level, mgrs_tile)
-        return provider.get_tlm(product_id, band_id)
+        return self._providers.get((level, mgrs_tile), lambda: self._get_provider_for(level, mgrs_tile))
 
-    @weak_lru(maxsize=32)  # type: ignore
-    def _get_provider_for(self, level: str, mgrs_tile: str) -> ParquetTLMProvider:
+    def _get_provider_for(self, level: str, mgrs_tile: str) -> TLMProvider:
         s3_path = self.s3_path_pattern.format(level=level, mgrs_tile=mgrs_tile)
         bucket, key = s3_path.removeprefix("s3://").split("/", maxsplit=1)
 
+        if self.disk_cache is not None:
+            return self._get_provider_from_disk_cache(self.disk_cache, s3_path, bucket, key)
+
         try:
-            object = self.s3_client.get_object(Bucket=bucket, Key=key)
+            file = _S3RangeFile(self.s3_client, bucket, key)
         except self.s3_client.exceptions.NoSuchKey:
             raise TLMIndexNotFound(f"Could not find TLM Parquet file for collection {level} and tile {mgrs_tile}")
 
-        body = io.BytesIO(object["Body"].read())
-        table = pq.read_table(body)
-        return ParquetTLMProvider.from_pyarray(table)
+        # pre_buffer coalesces the reads of the column chunks of a row group into a single request
+        parquet_file = pq.ParquetFile(file, pre_buffer=True)
+        return LazyParquetTLMProvider(parquet_file=parquet_file)
+
+    def _get_provider_from_disk_cache(
+        self, disk_cache: ShardDiskCache, s3_path: str, bucket: str, key: str
+    ) -> TLMProvider:
+        cached = disk_cache.get(s3_path)
+        while True:
+            conditions = {"IfNoneMatch": cached.etag} if cached is not None else {}
+
+            try:
+                object = self.s3_client.get_object(Bucket=bucket, Key=key, **conditions)
+            except self.s3_client.exceptions.NoSuchKey:
+                raise TLMIndexNotFound(f"Could not find TLM Parquet file {s3_path}")
+            except self.s3_client.exceptions.ClientError as e:
+                if cached is None or e.response["Error"]["Code"] != "304":
+                    raise
+                # not modified
+            else:
+                cached = disk_cache.put(s3_path, object["Body"].read(), object["ETag"])
+
+            try:
+                return LazyParquetTLMProvider.from_local_file(cached.path)
+            except FileNotFoundError:
+                if not conditions:
+                    raise
+                # evicted by another process since the revalidation: download it again
+                cached = None
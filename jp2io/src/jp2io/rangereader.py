@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import abc
+import concurrent.futures
+import urllib.request
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Generator, Sequence
+
+from rasterio.windows import Window
+from typing_extensions import override
+
+from jp2io.cache import TileByteCache
+from jp2io.codestream import MainHeader
+from jp2io.exception import JP2IOException
+from jp2io.planner import CoalescedRange, plan_ranges
+
+if TYPE_CHECKING:
+    from jp2io.index import TilesRange, VirtualTLMIndex
+
+
+class RangeReader(abc.ABC):
+    @abc.abstractmethod
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        """
+        Returns `length` bytes of the file `uri`, starting at `offset`.
+        """
+
+    @staticmethod
+    def for_uri(uri: str) -> RangeReader:
+        """
+        Returns a reader for local paths and http(s) URLs (/vsicurl/ prefix accepted).
+        For S3, use S3RangeReader.
+        """
+        if uri.startswith("https://") or uri.startswith("http://") or uri.startswith("/vsicurl/"):
+            return HTTPRangeReader()
+        if "://" in uri or uri.startswith("/vsi"):
+            raise JP2IOException(f"Uri unsupported ('{uri}'): provide a RangeReader explicitly")
+        return LocalRangeReader()
+
+
+@dataclass(frozen=True)
+class LocalRangeReader(RangeReader):
+    @override
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        with open(uri, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+@dataclass(frozen=True)
+class HTTPRangeReader(RangeReader):
+    headers: dict[str, str] = field(default_factory=dict)
+    timeout: float = 30.0
+    """ in seconds """
+
+    @override
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        url = uri.removeprefix("/vsicurl/")
+        headers = self.headers | {"Range": f"bytes={offset}-{offset + length - 1}"}
+        request = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data: bytes = response.read()
+        if response.status == 200:
+            # the server ignored the range
+            data = data[offset : offset + length]
+        return data
+
+
+@dataclass(frozen=True)
+class S3RangeReader(RangeReader):
+    """
+    Reads s3://<bucket>/<key> uris (or /vsis3/<bucket>/<key>) with a boto3 client.
+    """
+
+    s3_client: Any
+
+    @override
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        bucket, key = uri.removeprefix("s3://").removeprefix("/vsis3/").split("/", maxsplit=1)
+        object = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")
+        data: bytes = object["Body"].read()
+        return data
+
+
+def iter_tiles(
+    range_reader: RangeReader,
+    uri: str,
+    ranges: TilesRange,
+    tiles: Sequence[int],
+    pool: concurrent.futures.Executor,
+    max_gap: int = 64 * 1024,
+    byte_cache: TileByteCache | None = None,
+) -> Generator[tuple[int, bytes | memoryview]]:
+    """
+    Yields (tile index, bytes of the tile) for the given tiles, in no particular order.
+
+    Tiles found in `byte_cache` are yielded first, the others are fetched in `pool` with coalesced requests
+    (see `plan_ranges`) and added to `byte_cache`.
+    """
+    missing = []
+    for tile_index in tiles:
+        if byte_cache is not None:
+            data = byte_cache.get(uri, int(ranges.tiles_position[tile_index]), int(ranges.tiles_length[tile_index]))
+            if data is not None:
+                yield tile_index, data
+                continue
+        missing.append(tile_index)
+
+    def fetch(coalesced: CoalescedRange) -> tuple[CoalescedRange, bytes]:
+        return coalesced, range_reader.read(uri, coalesced.offset, coalesced.length)
+
+    for coalesced, buf in pool.map(fetch, plan_ranges(ranges, missing, max_gap=max_gap)):
+        for tile_index, data in zip(coalesced.tiles, coalesced.split(buf)):
+            if byte_cache is not None:
+                offset = int(ranges.tiles_position[tile_index])
+                byte_cache.put(uri, offset, int(ranges.tiles_length[tile_index]), data)
+            yield tile_index, data
+
+
+def prefetch_tiles(
+    tlm: VirtualTLMIndex,
+    uri: str,
+    byte_cache: TileByteCache,
+    window: Window | None = None,
+    range_reader: RangeReader | None = None,
+    max_workers: int = 8,
+    max_gap: int = 64 * 1024,
+    reduce: int = 0,
+) -> None:
+    """
+    Downloads the tiles intersecting the window (all the tiles by default) into `byte_cache`,
+    for example before opening the raster with `TLMIndex.open(uri, byte_cache=byte_cache)`.
+    With `reduce` > 0, only the beginning of the tiles needed by `TLMIndex.read_window(..., reduce=reduce)`
+    is downloaded, and `window` is in the pixels of the reduced image.
+    """
+    if range_reader is None:
+        range_reader = RangeReader.for_uri(uri)
+
+    ranges = tlm.into_tiles_range(reduce)
+    if window is None:
+        tiles: Sequence[int] = range(len(ranges.tiles_position))
+    else:
+        main_header = tlm.main_header
+        if main_header is None:
+            main_header = range_reader.read(uri, 0, tlm.position_first_sot)
+        x0, y0 = int(window.col_off), int(window.row_off)
+        siz = MainHeader.parse(main_header).reduced(reduce).siz
+        tiles = siz.tiles_intersecting(x0, y0, x0 + int(window.width), y0 + int(window.height))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for _ in iter_tiles(range_reader, uri, ranges, tiles, pool, max_gap=max_gap, byte_cache=byte_cache):
+            pass
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import concurrent.futures
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import imagecodecs
+import numpy as np
+from numpy.typing import NDArray
+from rasterio.windows import Window
+
+from jp2io.cache import TileByteCache, TileCache
+from jp2io.codestream import MainHeader
+from jp2io.exception import JP2IOException
+from jp2io.rangereader import RangeReader, iter_tiles
+
+if TYPE_CHECKING:
+    from jp2io.index import VirtualTLMIndex
+
+
+def read_window(
+    tlm: VirtualTLMIndex,
+    uri: str,
+    window: Window,
+    range_reader: RangeReader | None = None,
+    max_workers: int = 8,
+    max_gap: int = 64 * 1024,
+    tile_cache: TileCache | None = None,
+    byte_cache: TileByteCache | None = None,
+    reduce: int = 0,
+) -> NDArray[Any]:
+    """
+    Reads a window of the raster, fetching and decoding only the tiles that intersect it.
+    The byte ranges of adjacent tiles are fetched with a single request (see `plan_ranges`).
+    Only the code-blocks of the tiles contributing to the window are decoded (see `MainHeader.tile_codestream`),
+    except with a `tile_cache`: the tiles found in it are neither fetched nor decoded, and the decoded tiles
+    (decoded entirely, to be reused by other windows) are added to it.
+    Tiles found in `byte_cache` are not fetched, and the fetched tiles are added to it.
+    With `reduce` > 0, the window is in the pixels of the image at 1/2**reduce of its resolution,
+    and only the beginning of each tile is fetched if the index records the end of the resolution levels.
+
+    Returns an array of shape (height, width) for single-component rasters, (components, height, width) otherwise.
+    """
+    if range_reader is None:
+        range_reader = RangeReader.for_uri(uri)
+
+    main_header = tlm.main_header
+    if main_header is None:
+        main_header = range_reader.read(uri, 0, tlm.position_first_sot)
+    assembler = WindowAssembler.prepare(main_header, window, reduce)
+
+    tiles = assembler.tiles()
+    if tile_cache is not None:
+        tiles = assembler.paste_from_cache(tile_cache, uri)
+
+    ranges = tlm.into_tiles_range(reduce)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        decoded = [
+            (
+                tile_index,
+                pool.submit(
+                    decode_tile,
+                    assembler.header,
+                    tile_index,
+                    tile_data,
+                    None if tile_cache is not None else assembler.region(tile_index),
+                ),
+            )
+            for tile_index, tile_data in iter_tiles(
+                range_reader, uri, ranges, tiles, pool, max_gap=max_gap, byte_cache=byte_cache
+            )
+        ]
+
+        for tile_index, future in decoded:
+            tile = future.result()
+            if tile_cache is not None:
+                tile_cache.put(TileCache.key(uri, tile_index, reduce), tile)
+            assembler.paste(tile_index, tile)
+
+    return assembler.result()
+
+
+def decode_tile(
+    header: MainHeader,
+    tile_index: int,
+    tile_data: bytes | memoryview,
+    region: tuple[int, int, int, int] | None = None,
+) -> NDArray[Any]:
+    """
+    Decodes a tile-part of the codestream described by `header`, from its SOT marker to the end of its data.
+    If `region` is given, only the pixels of this area (x0, y0, x1, y1) relative to the tile are valid.
+    """
+    tile: NDArray[Any] = imagecodecs.jpeg2k_decode(header.tile_codestream(tile_data, tile_index, region))
+    return tile
+
+
+@dataclass(frozen=True)
+class WindowAssembler:
+    """
+    Output of a window read, filled tile by tile.
+    """
+
+    header: MainHeader
+    bounds: tuple[int, int, int, int]
+    """ (x0, y0, x1, y1) of the window """
+    out: NDArray[Any]
+    """ (components, height, width) """
+
+    @staticmethod
+    def prepare(main_header: bytes, window: Window, reduce: int = 0) -> WindowAssembler:
+        """
+        Parameters
+        ----------
+        main_header
+            Beginning of the JP2 file, until the first SOT marker.
+        reduce
+            Number of resolution levels discarded, the window being in the pixels of the reduced image.
+        """
+        header = MainHeader.parse(main_header).reduced(reduce)
+        siz = header.siz
+
+        x0, y0 = int(window.col_off), int(window.row_off)
+        x1, y1 = x0 + int(window.width), y0 + int(window.height)
+        if x0 < 0 or y0 < 0 or x1 > siz.width or y1 > siz.height or x1 <= x0 or y1 <= y0:
+            raise JP2IOException(f"window {window} is outside of the raster of size {siz.width}x{siz.height}")
+
+        out = np.zeros((len(siz.components), y1 - y0, x1 - x0), dtype=siz.dtype)
+        return WindowAssembler(header=header, bounds=(x0, y0, x1, y1), out=out)
+
+    def tiles(self) -> list[int]:
+        """
+        Indices of the tiles intersecting the window.
+        """
+        return self.header.siz.tiles_intersecting(*self.bounds)
+
+    def region(self, tile_index: int) -> tuple[int, int, int, int]:
+        """
+        Part of the tile covered by the window, relative to the tile.
+        """
+        x0, y0, x1, y1 = self.bounds
+        tx0, ty0, tx1, ty1 = self.header.siz.tile_bounds(tile_index)
+        return max(x0, tx0) - tx0, max(y0, ty0) - ty0, min(x1, tx1) - tx0, min(y1, ty1) - ty0
+
+    def paste_from_cache(self, tile_cache: TileCache, uri: str) -> list[int]:
+        """
+        Pastes the tiles of the window found in the cache, and returns the indices of the other tiles.
+        """
+        missing = []
+        for tile_index in self.tiles():
+            tile = tile_cache.get(TileCache.key(uri, tile_index, self.header.reduce))
+            if tile is None:
+                missing.append(tile_index)
+            else:
+                self.paste(tile_index, tile)
+        return missing
+
+    def paste(self, tile_index: int, tile: NDArray[Any]) -> None:
+        """
+        Copies the part of the decoded tile that intersects the window.
+        """
+        x0, y0, x1, y1 = self.bounds
+        tx0, ty0, tx1, ty1 = self.header.siz.tile_bounds(tile_index)
+        ix0, iy0, ix1, iy1 = max(x0, tx0), max(y0, ty0), min(x1, tx1), min(y1, ty1)
+        tile = tile.reshape(ty1 - ty0, tx1 - tx0, len(self.header.siz.components))
+        crop = tile[iy0 - ty0 : iy1 - ty0, ix0 - tx0 : ix1 - tx0]
+        self.out[:, iy0 - y0 : iy1 - y0, ix0 - x0 : ix1 - x0] = np.moveaxis(crop, -1, 0)
+
+    def result(self) -> NDArray[Any]:
+        """
+        Returns an array of shape (height, width) for single-component rasters, (components, height, width) otherwise.
+        """
+        if self.out.shape[0] == 1:
+            single_component: NDArray[Any] = self.out[0]
+            return single_component
+        return self.out
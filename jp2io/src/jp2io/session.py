@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from numpy.typing import NDArray
+from rasterio.windows import Window
+
+from jp2io.cache import TileByteCache
+from jp2io.index import DatasetHandle, TLMIndex
+
+
+@dataclass
+class ReaderSessionStats:
+    hits: int = 0
+    """ reads served by an already opened dataset """
+    opens: int = 0
+    evictions: int = 0
+
+
+class ReaderSession:
+    """
+    Keeps the datasets opened with `TLMIndex.open_dataset`, to read several windows of the same rasters
+    without building the sparse file and fetching the header of the raster again.
+
+    GDAL datasets can not be shared between threads: each thread has its own datasets,
+    in an LRU of at most `maxsize` datasets keyed by (uri, band_id). Evicted datasets are closed,
+    as well as the datasets of the threads that have exited.
+
+    To reuse the datasets between calls, the concurrent reads should run in the threads of `executor`,
+    which live as long as the session (as in `read_bands` and `extract_timeseries`): the session then holds
+    at most `maxsize` datasets per thread of the pool, in addition to those of the threads calling it directly.
+
+    `close` (or exiting the `with` block) stops the pool and closes the datasets of all the threads,
+    it should only be called once the threads are done reading.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 8,
+        env_options: dict[str, Any] = {},
+        byte_cache: TileByteCache | None = None,
+        max_workers: int = 16,
+    ) -> None:
+        self.maxsize = maxsize
+        self.env_options = env_options
+        self.byte_cache = byte_cache
+        """ tiles present in this cache are read from the local files, see `TLMIndex.open` """
+        self.max_workers = max_workers
+        """ number of threads of `executor` """
+        self.stats = ReaderSessionStats()
+
+        self._lock = threading.Lock()
+        self._caches: dict[threading.Thread, collections.OrderedDict[tuple[str, str], DatasetHandle]] = {}
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> ReaderSession:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def executor(self) -> concurrent.futures.Executor:
+        """
+        Pool of `max_workers` threads owned by the session, created on first use and stopped by `close`.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="jp2io-session"
+                )
+            return self._executor
+
+    def _cache(self) -> collections.OrderedDict[tuple[str, str], DatasetHandle]:
+        thread = threading.current_thread()
+        with self._lock:
+            cache = self._caches.get(thread)
+            if cache is not None:
+                return cache
+            cache = collections.OrderedDict()
+            self._caches[thread] = cache
+            return cache
+
+    def _close_dead_threads(self) -> int:
+        """
+        Closes the datasets of the threads that have exited, which can not be used anymore.
+        """
+        with self._lock:
+            orphans = [self._caches.pop(t) for t in list(self._caches) if not t.is_alive()]
+        closed = 0
+        for orphan in orphans:
+            closed += len(orphan)
+            self._close_all(orphan)
+        return closed
+
+    def dataset(self, tlm: TLMIndex, uri: str) -> DatasetHandle:
+        """
+        Returns the dataset of the calling thread for this raster, opening it if needed.
+
+        Parameters
+        ----------
+        uri
+            Path to the raster, as accepted by `TLMIndex.open`.
+        """
+        cache = self._cache()
+        key = (uri, tlm.band_id)
+        handle = cache.get(key)
+        if handle is not None:
+            cache.move_to_end(key)
+            with self._lock:
+                self.stats.hits += 1
+            return handle
+
+        handle = tlm.open_dataset(uri, self.env_options, self.byte_cache)
+        cache[key] = handle
+        evicted = []
+        while len(cache) > self.maxsize:
+            _, old = cache.popitem(last=False)
+            evicted.append(old)
+        for old in evicted:
+            old.close()
+        n_closed = self._close_dead_threads()
+
+        with self._lock:
+            self.stats.opens += 1
+            self.stats.evictions += len(evicted) + n_closed
+        return handle
+
+    def discard(self, tlm: TLMIndex, uri: str) -> None:
+        """
+        Closes the dataset of the calling thread for this raster, if any, for example after a failed read.
+        """
+        handle = self._cache().pop((uri, tlm.band_id), None)
+        if handle is not None:
+            handle.close()
+
+    def read(self, tlm: TLMIndex, uri: str, window: Window, indexes: int | list[int] | None = 1) -> NDArray[Any]:
+        """
+        Reads a window of the raster, as `rasterio.DatasetReader.read`.
+        """
+        return self.dataset(tlm, uri).read(indexes, window=window)
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        self._close_dead_threads()
+        with self._lock:
+            # the (empty) caches of the live threads are kept, they may use the session again
+            caches = list(self._caches.values())
+        for cache in caches:
+            self._close_all(cache)
+
+    @staticmethod
+    def _close_all(cache: collections.OrderedDict[tuple[str, str], DatasetHandle]) -> None:
+        while cache:
+            _, handle = cache.popitem(last=False)
+            handle.close()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Sequence
+from urllib.parse import urlparse
+
+from numpy.typing import NDArray
+from rasterio.windows import Window
+
+from jp2io.exception import JP2IOException
+from jp2io.index import TLMIndex
+from jp2io.provider import TLMProvider
+from jp2io.session import ReaderSession
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, for the errors of rate limiting (HTTP 429).
+    """
+
+    max_attempts: int = 5
+    initial_delay: float = 1.0
+    """ in seconds, doubled after each attempt """
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """
+        Delay before the attempt `attempt + 1`, `attempt` starting at 1.
+        """
+        delay = min(self.initial_delay * 2.0 ** (attempt - 1), self.max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+
+@dataclass(frozen=True)
+class TimeseriesItem:
+    index: int
+    """ position in the time series (and in `out`, if given) """
+    product_id: str
+    time: datetime.datetime
+    array: NDArray[Any]
+
+
+def sensing_time(product_id: str) -> datetime.datetime:
+    """
+    Returns the sensing time of a Sentinel-2 product, from its id.
+    """
+    return datetime.datetime.strptime(product_id.split("_")[2], "%Y%m%dT%H%M%S")
+
+
+def is_rate_limited(e: BaseException) -> bool:
+    """
+    Returns True if the exception is caused by a HTTP 429 (Too Many Requests) or an equivalent from S3.
+    """
+    if getattr(e, "code", None) == 429:
+        # urllib.error.HTTPError
+        return True
+    response = getattr(e, "response", None)
+    if isinstance(response, dict) and response.get("Error", {}).get("Code") in ("429", "SlowDown", "TooManyRequests"):
+        # botocore.exceptions.ClientError
+        return True
+    # errors of GDAL only have a message, "HTTP response code: 429" (or "HTTP error code: 429" for /vsis3/):
+    # a bare 429 may also be a byte offset, a tile index or part of a product id
+    return re.search(r"HTTP (response|error) code ?: ?429\b", str(e)) is not None
+
+
+def host_of(uri: str) -> str:
+    """
+    Returns the host serving a raster, used to limit the number of concurrent requests per host.
+    """
+    url = uri.removeprefix("/vsicurl/")
+    netloc = urlparse(url).netloc
+    if netloc:
+        return netloc
+    if url.startswith("/vsi"):
+        # /vsis3/, /vsigs/, ...: one host per virtual file system
+        return url.split("/")[1]
+    return "local"
+
+
+def extract_timeseries(
+    provider: TLMProvider,
+    product_ids: Sequence[str],
+    band_id: str,
+    window: Window,
+    uri_of: Callable[[TLMIndex], str],
+    out: NDArray[Any] | None = None,
+    max_workers: int = 16,
+    max_concurrency_per_host: int = 8,
+    retry: RetryPolicy = RetryPolicy(),
+    session: ReaderSession | None = None,
+) -> Generator[TimeseriesItem]:
+    """
+    Reads the same window of a band over several products, and yields the results in time order as they are ready.
+
+    At most `2 * max_workers` results are kept in memory while waiting for the earlier ones,
+    so that a long time series can be consumed (or written to `out`) without holding all the arrays.
+
+    Parameters
+    ----------
+    product_ids
+        Products to read, sorted by sensing time before reading.
+    uri_of
+        Returns the path of the raster of a band, as accepted by `TLMIndex.open`.
+    out
+        Array of shape (time, height, width), for example a numpy.memmap, in which the results are written.
+        The arrays of the yielded items are then views of `out`.
+    max_concurrency_per_host
+        Maximum number of concurrent reads on the same host (see `host_of`).
+    retry
+        Reads failing because of rate limiting are retried according to this policy.
+    max_workers
+        Number of concurrent reads, if no session is given (otherwise `ReaderSession.max_workers`).
+    session
+        Used to keep the datasets open between calls, the reads running in the threads of the session.
+        By default the datasets are closed at the end.
+    """
+    product_ids = sorted(product_ids, key=sensing_time)
+    height, width = int(window.height), int(window.width)
+    if out is not None and out.shape != (len(product_ids), height, width):
+        raise JP2IOException(f"out has shape {out.shape}, expected {(len(product_ids), height, width)}")
+
+    semaphores: dict[str, threading.BoundedSemaphore] = collections.defaultdict(
+        lambda: threading.BoundedSemaphore(max_concurrency_per_host)
+    )
+    semaphores_lock = threading.Lock()
+
+    def read(index: int, product_id: str) -> TimeseriesItem:
+        assert session is not None
+        tlm = provider.get_tlm(product_id, band_id)
+        uri = uri_of(tlm)
+        with semaphores_lock:
+            semaphore = semaphores[host_of(uri)]
+
+        attempt = 1
+        with semaphore:
+            while True:
+                try:
+                    array = session.read(tlm, uri, window)
+                    break
+                except Exception as e:
+                    session.discard(tlm, uri)
+                    if attempt >= retry.max_attempts or not is_rate_limited(e):
+                        raise
+                # the host is overloaded: keep the slot while waiting
+                time.sleep(retry.delay(attempt))
+                attempt += 1
+
+        if out is not None:
+            out[index] = array
+            array = out[index]
+        return TimeseriesItem(index=index, product_id=product_id, time=sensing_time(product_id), array=array)
+
+    pending: collections.deque[concurrent.futures.Future[TimeseriesItem]] = collections.deque()
+
+    def cancel_pending() -> None:
+        # the pool may outlive the generator (session given by the caller): wait for the reads writing to `out`
+        for future in pending:
+            future.cancel()
+        concurrent.futures.wait(pending)
+
+    with contextlib.ExitStack() as stack:
+        if session is None:
+            session = stack.enter_context(ReaderSession(max_workers=max_workers))
+        # the threads of the session keep their datasets open from one call to the next
+        pool = session.executor
+        stack.callback(cancel_pending)
+
+        todo = iter(enumerate(product_ids))
+
+        def submit_next() -> None:
+            task = next(todo, None)
+            if task is not None:
+                pending.append(pool.submit(read, *task))
+
+        for _ in range(2 * max_workers):
+            submit_next()
+
+        while pending:
+            item = pending.popleft().result()
+            submit_next()
+            yield item
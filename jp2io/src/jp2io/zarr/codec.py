@@ -1,44 +1,44 @@
 from __future__ import annotations
 
 import asyncio
-import math
+import concurrent.futures
+import functools
+import os
 import struct
+import threading
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 import imagecodecs
 import numcodecs.abc
 import numcodecs.registry
 import numpy as np
-from typing_extensions import override
+from typing_extensions import Self, override
 from zarr.abc.codec import BytesBytesCodec
 from zarr.core.array_spec import ArraySpec
-from zarr.core.buffer import Buffer, NDBuffer
+from zarr.core.buffer import Buffer
+from zarr.core.common import JSON, parse_named_configuration
+
+from jp2io.codestream import MainHeader
 
 
 # TODO: expose all parameters in the codec config
-def build_sentinel2_jp2_codestream(tile_data: bytes, tile_size: int, raster_size_x: int, raster_size_y: int) -> bytes:
+@functools.cache
+def sentinel2_main_header(tile_size: int, raster_size_x: int, raster_size_y: int, reduce: int = 0) -> MainHeader:
     """
+    Main header of a Sentinel-2 raster of this geometry, built once and shared by all the tiles.
+
     See https://web.archive.org/web/20250209200219/https://ics.uci.edu/~dhirschb/class/267/papers/jpeg2000.pdf
     Current values taken GDAL's dump_jp2 tool on a Sentinel-2 JP2 file.
     """
-    # from the SOT marker, read the Isot to know which tile we are considering
-    Isot = struct.unpack_from(">H", tile_data, 4)[0]
-    tile_x = Isot % 11
-    tile_y = Isot // 11
-
-    n_tile_x = math.ceil(raster_size_x / tile_size)
-    n_tile_y = math.ceil(raster_size_y / tile_size)
-    xsize = tile_size if tile_x < n_tile_x - 1 else (raster_size_x - (n_tile_x - 1) * tile_size)
-    ysize = tile_size if tile_y < n_tile_y - 1 else (raster_size_y - (n_tile_y - 1) * tile_size)
-
     soc_marker = struct.pack(">H", 0xFF4F)  # SOC marker (2 bytes)
     siz_marker = struct.pack(
         ">HHHIIIIIIIIHBBB",
         0xFF51,  # SIZ marker (2 bytes)
         41,  # Lsiz (uint16)
         0,  # Rsiz (uint16)
-        xsize,  # Xsiz (uint32)
-        ysize,  # Ysiz (uint32)
+        raster_size_x,  # Xsiz (uint32)
+        raster_size_y,  # Ysiz (uint32)
         0,  # XOsiz (uint32)
         0,  # YOsiz (uint32)
         tile_size,  # XTsiz (uint32)
@@ -88,20 +88,69 @@ def build_sentinel2_jp2_codestream(tile_data: bytes, tile_size: int, raster_size
         128,  # SPqcd11 (uint8)
         136,  # SPqcd12 (uint8)
     )
-    eoc_marker = struct.pack(">H", 0xFFD9)  # EOC marker (2 bytes)
+    return MainHeader.parse(soc_marker + siz_marker + cod_marker + qcd_marker).reduced(reduce)
+
+
+def build_sentinel2_jp2_codestream(
+    tile_data: bytes | memoryview,
+    tile_size: int,
+    raster_size_x: int,
+    raster_size_y: int,
+    reduce: int = 0,
+    region: tuple[int, int, int, int] | None = None,
+) -> bytes:
+    """
+    Returns a standalone codestream for a tile-part of a Sentinel-2 raster, with the header of `sentinel2_main_header`.
+    The tile data is only copied once, into the returned codestream.
+
+    With `reduce` > 0, the codestream only contains the resolution levels needed to decode the tile
+    at 1/2**reduce of its resolution (see `MainHeader.reduced`), `tile_data` can be the full tile or its beginning.
+    With a `region` (x0, y0, x1, y1) relative to the tile, only the code-blocks contributing to it are decoded
+    (see `MainHeader.tile_codestream`).
+    """
+    # from the SOT marker, read the Isot to know which tile we are considering
+    Isot = struct.unpack_from(">H", tile_data, 4)[0]
+    header = sentinel2_main_header(tile_size, raster_size_x, raster_size_y, reduce)
+    return header.tile_codestream(tile_data, Isot, region)
+
 
-    # overwrite the Isot (tile index) to be 0
-    mut_tile_data = bytearray(tile_data)
-    mut_tile_data[4:6] = struct.pack(">H", 0)
-    tile_data = bytes(mut_tile_data)
+_decoder_pool: concurrent.futures.ThreadPoolExecutor | None = None
+_decoder_pool_lock = threading.Lock()
 
-    codestream = soc_marker + siz_marker + cod_marker + qcd_marker + tile_data + eoc_marker
-    return codestream
 
+def set_decoder_pool_size(max_workers: int | None) -> None:
+    """
+    Sets the number of threads decoding the chunks, by default one per CPU.
+    The threads of the previous pool finish their current chunks before exiting.
+    """
+    global _decoder_pool
+    with _decoder_pool_lock:
+        previous, _decoder_pool = _decoder_pool, _make_decoder_pool(max_workers)
+    if previous is not None:
+        previous.shutdown(wait=False)
 
-def _decode_jp2_tile(chunk_data: Buffer, chunk_spec: ArraySpec) -> Buffer:
+
+def _make_decoder_pool(max_workers: int | None) -> concurrent.futures.ThreadPoolExecutor:
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers or os.cpu_count(), thread_name_prefix="jp2io-zarr-decode"
+    )
+
+
+def _get_decoder_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _decoder_pool
+    with _decoder_pool_lock:
+        if _decoder_pool is None:
+            _decoder_pool = _make_decoder_pool(None)
+        return _decoder_pool
+
+
+def _decode_jp2_tile(chunk_data: Buffer, chunk_spec: ArraySpec, reduce: int = 0) -> Buffer:
     codestream = build_sentinel2_jp2_codestream(
-        chunk_data.to_bytes(), tile_size=1024, raster_size_x=10980, raster_size_y=10980
+        chunk_data.as_numpy_array().data,
+        tile_size=1024,
+        raster_size_x=10980,
+        raster_size_y=10980,
+        reduce=reduce,
     )
     array = imagecodecs.jpeg2k_decode(codestream)
 
@@ -112,9 +161,13 @@ def _decode_jp2_tile(chunk_data: Buffer, chunk_spec: ArraySpec) -> Buffer:
     return chunk_spec.prototype.buffer.from_array_like(array)
 
 
-def _decode_jp2_tile_npy(chunk_data: np.ndarray) -> np.ndarray:
+def _decode_jp2_tile_npy(chunk_data: np.ndarray, reduce: int = 0) -> np.ndarray:
     codestream = build_sentinel2_jp2_codestream(
-        chunk_data.tobytes(), tile_size=1024, raster_size_x=10980, raster_size_y=10980
+        np.ascontiguousarray(chunk_data).data.cast("B"),
+        tile_size=1024,
+        raster_size_x=10980,
+        raster_size_y=10980,
+        reduce=reduce,
     )
     array = imagecodecs.jpeg2k_decode(codestream)
     return array
@@ -127,17 +180,20 @@ class Sentinel2Jpeg2000NumCodec(numcodecs.abc.Codec):
     """
 
     codec_id: str | None = "jp2io.zarr.Sentinel2Jpeg2000Codec"
+    reduce: int = 0
+    """ number of resolution levels discarded when decoding, the chunks being (1024 / 2**reduce) pixels wide """
     # TODO: 'raster_id' attribute, r10m_b02 / etc
 
     # id: str = ""  # to fix some zarr v2 / v3 issues
 
     @override  # for numcodecs
     def decode(self, buf, out=None):
-        tile = _decode_jp2_tile_npy(buf)
-        if tile.shape[0] < 1024:
-            tile = np.pad(tile, ((0, 1024 - tile.shape[0]), (0, 0)))
-        if tile.shape[1] < 1024:
-            tile = np.pad(tile, ((0, 0), (0, 1024 - tile.shape[1])))
+        tile = _decode_jp2_tile_npy(buf, reduce=self.reduce)
+        chunk_size = 1024 >> self.reduce
+        if tile.shape[0] < chunk_size:
+            tile = np.pad(tile, ((0, chunk_size - tile.shape[0]), (0, 0)))
+        if tile.shape[1] < chunk_size:
+            tile = np.pad(tile, ((0, 0), (0, chunk_size - tile.shape[1])))
         if out is not None:
             out[:] = tile[:]
         return tile
@@ -148,10 +204,10 @@ class Sentinel2Jpeg2000NumCodec(numcodecs.abc.Codec):
 
     @classmethod
     def from_config(cls, config) -> Sentinel2Jpeg2000NumCodec:
-        return Sentinel2Jpeg2000NumCodec()
+        return Sentinel2Jpeg2000NumCodec(reduce=config.get("reduce", 0))
 
     def get_config(self) -> dict:
-        return {"id": self.codec_id, "name": self.codec_id}
+        return {"id": self.codec_id, "name": self.codec_id, "reduce": self.reduce}
 
 
 @dataclass(frozen=True)
@@ -162,13 +218,51 @@ class Sentinel2Jpeg2000Codec(BytesBytesCodec):
 
     name: str = "jp2io.zarr.Sentinel2Jpeg2000Codec"
     id: str = "jp2io.zarr.Sentinel2Jpeg2000Codec"
+    reduce: int = 0
+    """ number of resolution levels discarded when decoding, the chunks being (1024 / 2**reduce) pixels wide """
 
     # TODO: 'raster_id' attribute, r10m_b02 / etc
 
+    @classmethod
+    @override
+    def from_dict(cls, data: dict[str, JSON]) -> Self:
+        _, configuration = parse_named_configuration(data, require_configuration=False)
+        if configuration is None:
+            # written before the codec had a configuration, with its fields next to its name
+            configuration = data
+        reduce = configuration.get("reduce", 0)
+        assert isinstance(reduce, int)
+        return cls(reduce=reduce)
+
+    @override
+    def to_dict(self) -> dict[str, JSON]:
+        return {"name": self.name, "configuration": {"reduce": self.reduce}}
+
+    @override
+    def compute_encoded_size(self, input_byte_length: int, chunk_spec: ArraySpec) -> int:
+        # decode-only codec: the chunks are the tiles of the JP2 files, never encoded by zarr
+        raise NotImplementedError("Sentinel2Jpeg2000Codec only decodes the tiles of existing JP2 files")
+
     # for zarr v3
     @override
-    async def _decode_single(self, chunk_data: Buffer, chunk_spec: ArraySpec) -> NDBuffer:
-        return await asyncio.to_thread(_decode_jp2_tile, chunk_data, chunk_spec)
+    async def _decode_single(self, chunk_data: Buffer, chunk_spec: ArraySpec) -> Buffer:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_decoder_pool(), _decode_jp2_tile, chunk_data, chunk_spec, self.reduce)
+
+    @override
+    async def decode(self, chunks_and_specs: Iterable[tuple[Buffer | None, ArraySpec]]) -> Iterable[Buffer | None]:
+        """
+        Decodes the chunks of a batch concurrently in the decoder pool, see `set_decoder_pool_size`.
+        Unlike the default implementation, the number of chunks in flight is not limited by `async.concurrency`.
+        """
+        loop = asyncio.get_running_loop()
+        pool = _get_decoder_pool()
+        futures = [
+            None if chunk_data is None else loop.run_in_executor(pool, _decode_jp2_tile, chunk_data, spec, self.reduce)
+            for chunk_data, spec in chunks_and_specs
+        ]
+        done = iter(await asyncio.gather(*(f for f in futures if f is not None)))
+        return [None if f is None else next(done) for f in futures]
 
 
 numcodecs.registry.register_codec(Sentinel2Jpeg2000NumCodec, codec_id="jp2io.zarr.Sentinel2Jpeg2000Codec")
@@ -1,27 +1,43 @@
+import base64
 import datetime
 import json
 import os
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping, Sequence
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 import xarray as xr
+from numpy.typing import NDArray
+from obspec_utils.registry import ObjectStoreRegistry
 from obstore.store import S3Store
-from virtualizarr import ChunkManifest, ManifestArray
-from virtualizarr.manifests.group import ManifestGroup
-from virtualizarr.manifests.store import ManifestStore, ObjectStoreRegistry
+from virtualizarr.manifests import ChunkManifest, ManifestArray, ManifestGroup, ManifestStore
 from virtualizarr.manifests.utils import create_v3_array_metadata
-from virtualizarr.parallel import get_executor
+from xarray.coding.times import decode_cf_datetime, encode_cf_datetime
+from zarr.core.metadata import ArrayV3Metadata
 
 import jp2io
-from jp2io.index import TilesRange
+from jp2io.exception import JP2IOException, TLMIndexNotFound
+from jp2io.index import TilesRange, stack_tiles_ranges
 
+if TYPE_CHECKING:
+    import icechunk
+    from obstore.store import S3Credential
 
-def make_manifest_group(path: str, ranges: TilesRange, group_name: str = "data") -> ManifestGroup:
+SENTINEL2_MAX_REDUCE = 4
+""" number of decomposition levels of the Sentinel-2 JP2, the overviews go down to 1/2**SENTINEL2_MAX_REDUCE """
+
+
+def make_manifest_array(path: str, ranges: TilesRange, reduce: int = 0) -> ManifestArray:
+    """
+    Virtual array of a 10m band, at 1/2**reduce of its resolution: the chunks are the tiles of the JP2,
+    decoded at a reduced resolution by the codec, so that they are (1024 / 2**reduce) pixels wide.
+    """
     tile_shape = (11, 11)
 
     tile_offsets = np.array(ranges.tiles_position, dtype=np.uint64).reshape(tile_shape)
     tile_lengths = np.array(ranges.tiles_length, dtype=np.uint64).reshape(tile_shape)
-    paths = np.full_like(tile_offsets, path, dtype=np.dtypes.StringDType)
+    paths = np.full(tile_shape, path, dtype=np.dtypes.StringDType())
 
     chunkmanifest = ChunkManifest.from_arrays(
         paths=paths,
@@ -29,61 +45,142 @@ def make_manifest_group(path: str, ranges: TilesRange, group_name: str = "data")
         lengths=tile_lengths,
         validate_paths=False,
     )
-
-    arraymetadata = create_v3_array_metadata(
-        shape=(10980, 10980),
+    return ManifestArray(metadata=make_array_metadata(reduce), chunkmanifest=chunkmanifest)
+
+
+def make_manifest_cube(
+    paths: Sequence[str], tiles_position: NDArray[np.uint64], tiles_length: NDArray[np.uint64], reduce: int = 0
+) -> ManifestArray:
+    """
+    Virtual (time, y, x) array of a 10m band over several products, in a single manifest (see `make_manifest_array`).
+
+    Parameters
+    ----------
+    paths
+        Path of the JP2 of each product.
+    tiles_position, tiles_length
+        Range of each tile in the JP2 of each product, of shape (len(paths), 121), see `jp2io.index.stack_tiles_ranges`.
+    """
+    shape = (len(paths), 11, 11)
+    paths_array = np.empty(shape, dtype=np.dtypes.StringDType())
+    paths_array[:] = np.array(paths, dtype=np.dtypes.StringDType())[:, None, None]
+    chunkmanifest = ChunkManifest.from_arrays(
+        paths=paths_array,
+        offsets=tiles_position.astype(np.uint64).reshape(shape),
+        lengths=tiles_length.astype(np.uint64).reshape(shape),
+        validate_paths=False,
+    )
+    return ManifestArray(metadata=make_array_metadata(reduce, time=len(paths)), chunkmanifest=chunkmanifest)
+
+
+def make_array_metadata(reduce: int = 0, time: int | None = None) -> ArrayV3Metadata:
+    """
+    Zarr metadata of a 10m band at 1/2**reduce of its resolution, (time, y, x) with one chunk per product if `time`
+    is given, (y, x) otherwise.
+    """
+    size = -(-10980 // 2**reduce)
+    shape: tuple[int, ...] = (size, size)
+    chunk_shape: tuple[int, ...] = (1024 >> reduce, 1024 >> reduce)
+    dimension_names: tuple[str, ...] = ("y", "x")
+    if time is not None:
+        shape, chunk_shape, dimension_names = (time, *shape), (1, *chunk_shape), ("time", *dimension_names)
+
+    return create_v3_array_metadata(
+        shape=shape,
         data_type=np.dtype(np.uint16),
-        chunk_shape=(1024, 1024),
+        chunk_shape=chunk_shape,
         fill_value=0,
         codecs=[
             {
-                # TODO: are both needed?...
                 "name": "jp2io.zarr.Sentinel2Jpeg2000Codec",
-                "id": "jp2io.zarr.Sentinel2Jpeg2000Codec",
+                "configuration": {"reduce": reduce},
                 # TODO: add tile specification of this band (it depends on the resolution etc)
             }
         ],
-        dimension_names=("y", "x"),
+        dimension_names=dimension_names,
     )
-    manifest = ManifestArray(metadata=arraymetadata, chunkmanifest=chunkmanifest)
 
+
+def make_manifest_group(path: str, ranges: TilesRange, group_name: str = "data", reduce: int = 0) -> ManifestGroup:
+    manifest = make_manifest_array(path, ranges, reduce)
     manifest_group = ManifestGroup(arrays={group_name: manifest})
     return manifest_group
 
 
-def extract_time(ds: xr.Dataset, pid: str) -> xr.Dataset:
+def multiscales_attributes(levels: int, name: str = "") -> dict[str, Any]:
+    """
+    Attributes of a group containing the overviews "0" (full resolution) to `levels` of a (time, y, x) cube,
+    following the multiscales convention of OME-NGFF 0.4 (also used by GeoZarr).
+    """
+    return {
+        "multiscales": [
+            {
+                "version": "0.4",
+                "name": name,
+                "type": "jpeg2000 resolution levels",
+                "axes": [
+                    {"name": "time", "type": "time"},
+                    {"name": "y", "type": "space"},
+                    {"name": "x", "type": "space"},
+                ],
+                "datasets": [
+                    {
+                        "path": str(reduce),
+                        "coordinateTransformations": [{"type": "scale", "scale": [1.0, 2.0**reduce, 2.0**reduce]}],
+                    }
+                    for reduce in range(levels + 1)
+                ],
+            }
+        ]
+    }
+
+
+def product_time(pid: str) -> datetime.datetime:
     date_format = "%Y%m%dT%H%M%S"
     date_str = pid.split("_")[2]
-    time = datetime.datetime.strptime(date_str, date_format)
-    return ds.assign_coords(time=time)
+    return datetime.datetime.strptime(date_str, date_format)
+
+
+def extract_time(ds: xr.Dataset, pid: str) -> xr.Dataset:
+    # Self resolves to Any for mypy with python_version = 3.10
+    ds_time: xr.Dataset = ds.assign_coords(time=product_time(pid))
+    return ds_time
 
 
 @dataclass(frozen=True)
 class Sentinel2Datacube:
-    store_registry: ObjectStoreRegistry
+    store_registry: ObjectStoreRegistry[Any]
     tlm_provider: jp2io.ParquetTLMProvider
 
-    def open_band(self, pid: str, bid: str) -> xr.Dataset:
+    def open_band(self, pid: str, bid: str, reduce: int = 0) -> xr.Dataset:
+        """
+        With `reduce` > 0, opens the overview at 1/2**reduce of the resolution:
+        only the beginning of the tiles is referenced if the index records the end of their resolution levels.
+        """
         tlm = self.tlm_provider.get_tlm(pid, bid)
         assert isinstance(tlm, jp2io.index.VirtualTLMIndex)
-        ranges = tlm.into_tiles_range()
+        ranges = tlm.into_tiles_range(reduce)
 
         path = f"s3://DIAS{tlm.path}"  # assumes CDSE S3
-        manifest_group = make_manifest_group(path, ranges, group_name=bid)
+        manifest_group = make_manifest_group(path, ranges, group_name=bid, reduce=reduce)
 
-        ms = ManifestStore(group=manifest_group, store_registry=self.store_registry)
+        ms = ManifestStore(manifest_group, registry=self.store_registry)
         ms = ms.to_virtual_dataset()
         ms = extract_time(ms, pid)
         return ms
 
-    def open_r10m(self, pid: str) -> xr.Dataset:
-        b02 = self.open_band(pid, "B02")
-        b03 = self.open_band(pid, "B03")
-        b04 = self.open_band(pid, "B04")
-        b08 = self.open_band(pid, "B08")
+    def open_r10m(self, pid: str, reduce: int = 0) -> xr.Dataset:
+        b02 = self.open_band(pid, "B02", reduce)
+        b03 = self.open_band(pid, "B03", reduce)
+        b04 = self.open_band(pid, "B04", reduce)
+        b08 = self.open_band(pid, "B08", reduce)
         return xr.merge([b02, b03, b04, b08])
 
-    def open_all(self) -> xr.Dataset:
+    def product_ids(self) -> list[str]:
+        """
+        Products of the cube, one per date, sorted by date.
+        """
+
         def dateof(pid: str) -> str:
             return pid.split("_")[2]
 
@@ -93,20 +190,63 @@ class Sentinel2Datacube:
 
         # remove duplicate dates as I don't know how to deal with them yet
         product_per_date = {dateof(pid): pid for pid in product_ids}
-        product_ids = list(product_per_date.values())
+        product_ids = set(product_per_date.values())
 
         # sort by ascending date
-        product_ids = sorted(product_ids, key=dateof)
-
-        executor = get_executor(parallel="dask")
-        with executor() as exec:
-            ds = list(exec.map(self.open_r10m, product_ids))
-
-        # 'minimal' to have lazy loading
-        return xr.concat(ds, dim="time", coords="minimal", data_vars="minimal")
-
-
-def get_credentials():
+        return sorted(product_ids, key=dateof)
+
+    def open_all(
+        self,
+        reduce: int = 0,
+        bands: Sequence[str] = ("B02", "B03", "B04", "B08"),
+        product_ids: Sequence[str] | None = None,
+    ) -> xr.Dataset:
+        """
+        Opens the time series of the products (by default all the ones of `product_ids()`), as (time, y, x) variables.
+
+        The indexes of each band are decoded together (see `jp2io.index.stack_tiles_ranges`) into a single manifest
+        per band, instead of a dataset per product and band to concatenate.
+        """
+        if product_ids is None:
+            product_ids = self.product_ids()
+        table = self.tlm_provider.table
+
+        arrays = {}
+        for bid, band_rows in self._band_rows(product_ids, bands).items():
+            tiles_position, tiles_length = stack_tiles_ranges([table["index"][row] for row in band_rows], reduce)
+            paths = [f"s3://DIAS{table['path'][row]}" for row in band_rows]  # assumes CDSE S3
+            arrays[bid] = make_manifest_cube(paths, tiles_position, tiles_length, reduce)
+
+        ms = ManifestStore(ManifestGroup(arrays=arrays), registry=self.store_registry)
+        ds: xr.Dataset = ms.to_virtual_dataset().assign_coords(time=[product_time(pid) for pid in product_ids])
+        # precise enough for any acquisition time, so that new products can be appended with the same encoding
+        ds["time"].encoding = {"units": "seconds since 2015-01-01", "calendar": "proleptic_gregorian", "dtype": "int64"}
+        return ds
+
+    def _band_rows(self, product_ids: Sequence[str], bands: Sequence[str]) -> dict[str, list[int]]:
+        """
+        Rows of the TLM table of the products, for each band.
+        """
+        rows = self.tlm_provider._rows
+        band_rows = {}
+        for bid in bands:
+            try:
+                band_rows[bid] = [rows[(pid, bid)] for pid in product_ids]
+            except KeyError as e:
+                raise TLMIndexNotFound(f"Could not find TLM index for product {e.args[0][0]} and band {bid}")
+        return band_rows
+
+    def open_multiscale(
+        self, levels: int = SENTINEL2_MAX_REDUCE, product_ids: Sequence[str] | None = None
+    ) -> dict[str, xr.Dataset]:
+        """
+        Returns the cube at full resolution ("0") and its overviews ("1" to `levels`), to be written as the groups
+        of a multiscale store (see `multiscales_attributes`). All the levels reference the same tiles.
+        """
+        return {str(reduce): self.open_all(reduce, product_ids=product_ids) for reduce in range(levels + 1)}
+
+
+def get_credentials() -> "S3Credential":
     return {
         "access_key_id": os.environ["CDSE_ACCESS_KEY_ID"],
         "secret_access_key": os.environ["CDSE_SECRET_ACCESS_KEY"],
@@ -115,11 +255,20 @@ def get_credentials():
     }
 
 
-def main_export_to_kerchunk(tlm_index_path: str, output_path: str):
+def main_export_to_kerchunk(tlm_index_path: str, output_path: str, overviews: int = 0, update: bool = False) -> None:
+    """
+    With `overviews` > 0, the full resolution and the overviews 1 to `overviews` are exported in the groups "0",
+    "1", ... with the multiscales attributes.
+
+    The .json and .kerchunk (parquet) outputs are written as the references are generated, see `iter_kerchunk_refs`.
+
+    With `update`, if `output_path` already exists (exported with the same `overviews`), only the products that are
+    more recent than its last time slice are appended to it, see `append_new_products`.
+    """
     store = S3Store(
         bucket="DIAS",
         config={"endpoint": "https://eodata.dataspace.copernicus.eu"},
-        credential_provider=get_credentials,  # type: ignore
+        credential_provider=get_credentials,
     )
     store_registry = ObjectStoreRegistry({"s3://DIAS": store})
 
@@ -127,40 +276,320 @@ def main_export_to_kerchunk(tlm_index_path: str, output_path: str):
 
     datacube = Sentinel2Datacube(store_registry=store_registry, tlm_provider=tlm_provider)
 
-    ds = datacube.open_all()
+    if update and os.path.exists(output_path):
+        appended = append_new_products(datacube, output_path, overviews, store.config["endpoint"])
+        print(appended, "products appended to", output_path)
+        return
 
     if output_path.endswith(".json"):
-        kerchunk = ds.virtualize.to_kerchunk(format="json")
-        with open(output_path, "w") as f:
-            json.dump(kerchunk, f, indent=2)
+        write_kerchunk_json(iter_kerchunk_refs(datacube, overviews), output_path)
     elif output_path.endswith(".kerchunk"):
-        ds.virtualize.to_kerchunk(output_path, format="parquet")
+        write_kerchunk_parquet(iter_kerchunk_refs(datacube, overviews), output_path)
+    elif output_path.endswith(".icechunk") and overviews > 0:
+        export_multiscale(datacube.open_multiscale(overviews), output_path, store.config["endpoint"])
     elif output_path.endswith(".icechunk"):
-        import icechunk
+        ds = datacube.open_all()
+        repo = create_icechunk_repository(output_path, store.config["endpoint"])
+        session = repo.writable_session("main")
+        ds.vz.to_icechunk(session.store)
+        session.commit("init")
+    else:
+        raise ValueError("unsupported output path extension (use .json, .kerchunk or .icechunk)")
 
-        storage = icechunk.local_filesystem_storage(output_path)
-        config = icechunk.RepositoryConfig.default()
-        config.set_virtual_chunk_container(
-            icechunk.VirtualChunkContainer("s3", "s3://", icechunk.s3_store(endpoint_url=store.config["endpoint"]))
-        )
-        credentials = icechunk.containers_credentials(
-            s3=icechunk.s3_credentials(
+    print("dataset exported as kerchunk to", output_path)
+
+
+def create_icechunk_repository(
+    output_path: str, endpoint_url: str, open_existing: bool = False
+) -> "icechunk.Repository":
+    """
+    Local icechunk repository referencing the JP2 files of CDSE S3.
+    """
+    import icechunk
+
+    storage = icechunk.local_filesystem_storage(output_path)
+    config = icechunk.RepositoryConfig.default()
+    config.set_virtual_chunk_container(
+        icechunk.VirtualChunkContainer("s3://DIAS/", icechunk.s3_store(endpoint_url=endpoint_url))
+    )
+    credentials = icechunk.containers_credentials(
+        {
+            "s3://DIAS/": icechunk.s3_credentials(
                 access_key_id=os.environ["CDSE_ACCESS_KEY_ID"],
                 secret_access_key=os.environ["CDSE_SECRET_ACCESS_KEY"],
             )
-        )
-
+        }
+    )
+    repo: icechunk.Repository
+    if open_existing:
+        repo = icechunk.Repository.open(storage, config, credentials)
+    else:
         repo = icechunk.Repository.create(storage, config, credentials)
+    return repo
+
+
+def export_multiscale(levels: dict[str, xr.Dataset], output_path: str, endpoint_url: str) -> None:
+    attributes = multiscales_attributes(len(levels) - 1)
+
+    if output_path.endswith(".icechunk"):
+        import zarr
+
+        repo = create_icechunk_repository(output_path, endpoint_url)
         session = repo.writable_session("main")
-        ds.virtualize.to_icechunk(session.store)
+        for name, ds in levels.items():
+            ds.vz.to_icechunk(session.store, group=name)
+        zarr.open_group(session.store, mode="r+").attrs.update(attributes)
         session.commit("init")
     else:
-        raise ValueError("unsupported output path extension (use .json or .kerchunk")
+        raise ValueError("unsupported output path extension for overviews (use .icechunk, see iter_kerchunk_refs)")
+
+
+def iter_kerchunk_refs(
+    datacube: Sentinel2Datacube,
+    overviews: int = 0,
+    bands: Sequence[str] = ("B02", "B03", "B04", "B08"),
+    product_ids: Sequence[str] | None = None,
+    batch_size: int = 100,
+) -> Iterator[tuple[str, Any]]:
+    """
+    Kerchunk references (zarr v2) of the cube of `Sentinel2Datacube.open_all`, or with `overviews` > 0 of the groups
+    of `Sentinel2Datacube.open_multiscale`, generated without building the datasets: the metadata of all the arrays
+    first, then the chunks of `batch_size` products at a time, so that the memory used does not depend on the number
+    of products.
+    """
+    if product_ids is None:
+        product_ids = datacube.product_ids()
+    table = datacube.tlm_provider.table
+    band_rows = datacube._band_rows(product_ids, bands)
+    groups = {str(reduce): reduce for reduce in range(overviews + 1)} if overviews > 0 else {"": 0}
+
+    # same time encoding as `Sentinel2Datacube.open_all`
+    times = np.array([product_time(pid) for pid in product_ids], dtype="datetime64[us]")
+    values, units, calendar = encode_cf_datetime(
+        times, "seconds since 2015-01-01", "proleptic_gregorian", np.dtype(np.int64)
+    )
+    if overviews > 0:
+        yield ".zgroup", json.dumps({"zarr_format": 2})
+        yield ".zattrs", json.dumps(multiscales_attributes(overviews))
+    for group, reduce in groups.items():
+        prefix = f"{group}/" if group else ""
+        yield f"{prefix}.zgroup", json.dumps({"zarr_format": 2})
+        yield f"{prefix}.zattrs", json.dumps({})
+        yield f"{prefix}time/.zarray", json.dumps(_kerchunk_zarray(values.shape, values.shape, values.dtype.str))
+        yield f"{prefix}time/.zattrs", json.dumps({"units": units, "calendar": calendar, "_ARRAY_DIMENSIONS": ["time"]})
+        yield f"{prefix}time/0", "base64:" + base64.b64encode(values.tobytes()).decode()
+
+        metadata = make_array_metadata(reduce, time=len(product_ids))
+        zarray = _kerchunk_zarray(
+            metadata.shape,
+            metadata.chunks,
+            "<u2",
+            fill_value=0,
+            filters=[{"id": "jp2io.zarr.Sentinel2Jpeg2000Codec", "reduce": reduce}],
+        )
+        for bid in bands:
+            yield f"{prefix}{bid}/.zarray", json.dumps(zarray)
+            yield f"{prefix}{bid}/.zattrs", json.dumps({"_ARRAY_DIMENSIONS": list(metadata.dimension_names or ())})
+
+    for start in range(0, len(product_ids), batch_size):
+        for bid in bands:
+            rows = band_rows[bid][start : start + batch_size]
+            indexes = [table["index"][row] for row in rows]
+            paths = [f"s3://DIAS{table['path'][row]}" for row in rows]  # assumes CDSE S3
+            for group, reduce in groups.items():
+                prefix = f"{group}/" if group else ""
+                tiles_position, tiles_length = stack_tiles_ranges(indexes, reduce)
+                for t, (path, positions, lengths) in enumerate(
+                    zip(paths, tiles_position.tolist(), tiles_length.tolist()), start
+                ):
+                    for tile, (position, length) in enumerate(zip(positions, lengths)):
+                        yield f"{prefix}{bid}/{t}.{tile // 11}.{tile % 11}", [path, position, length]
+
+
+def _kerchunk_zarray(
+    shape: Sequence[int], chunks: Sequence[int], dtype: str, fill_value: Any = None, filters: Any = None
+) -> dict[str, Any]:
+    return {
+        "shape": list(shape),
+        "chunks": list(chunks),
+        "dtype": dtype,
+        "fill_value": fill_value,
+        "order": "C",
+        "filters": filters,
+        "dimension_separator": ".",
+        "compressor": None,
+        "zarr_format": 2,
+    }
 
-    print("dataset exported as kerchunk to", output_path)
 
+def write_kerchunk_json(refs: Iterable[tuple[str, Any]], output_path: str) -> None:
+    """
+    Writes kerchunk references to a JSON file as they are generated, one reference per line.
+    """
+    with open(output_path, "w") as f:
+        f.write('{"version": 1, "refs": {')
+        for i, (key, value) in enumerate(refs):
+            f.write(f"{',' if i else ''}\n{json.dumps(key)}: {json.dumps(value)}")
+        f.write("\n}}\n")
+
+
+def write_kerchunk_parquet(refs: Iterable[tuple[str, Any]], output_path: str, record_size: int = 10000) -> None:
+    """
+    Writes kerchunk references to a parquet references directory, as they are generated:
+    each parquet file of `record_size` references of an array is written as soon as it is complete.
+
+    The metadata of an array must come before its chunks, see `fsspec.implementations.reference.LazyReferenceMapper`.
+    """
+    from fsspec.implementations.reference import LazyReferenceMapper
+
+    lazy_refs = LazyReferenceMapper.create(output_path, record_size=record_size)
+    for key, value in refs:
+        lazy_refs[key] = value
+    lazy_refs.flush()
+
+
+def append_new_products(datacube: Sentinel2Datacube, output_path: str, overviews: int, endpoint_url: str) -> int:
+    """
+    Appends to the cube exported at `output_path` the products of `datacube` that are more recent than its last
+    time slice: as a new commit for .icechunk, by adding their references for .json and .kerchunk
+    (for .kerchunk, only the parquet files containing the new references are rewritten).
+
+    Returns the number of products appended.
+
+    Raises:
+        JP2IOException: if products missing from the cube are older than its last time slice,
+        the cube has to be exported again.
+    """
+    groups = [str(reduce) for reduce in range(overviews + 1)] if overviews > 0 else [""]
+
+    refs: MutableMapping[str, Any]
+    if output_path.endswith(".icechunk"):
+        import zarr
+
+        repo = create_icechunk_repository(output_path, endpoint_url, open_existing=True)
+        path = f"{groups[0]}/time" if groups[0] else "time"
+        time = zarr.open_array(repo.readonly_session("main").store, path=path, mode="r")
+        stored_times = _decode_times(np.asarray(time[:]), time.attrs)
+    elif output_path.endswith(".json"):
+        with open(output_path) as f:
+            refs = json.load(f)["refs"]
+        stored_times = _read_kerchunk_times(refs, groups[0])
+    elif output_path.endswith(".kerchunk"):
+        from fsspec.implementations.reference import LazyReferenceMapper
+
+        lazy_refs = LazyReferenceMapper(output_path)
+        refs = lazy_refs
+        stored_times = _read_kerchunk_times(refs, groups[0])
+    else:
+        raise ValueError("unsupported output path extension (use .json, .kerchunk or .icechunk)")
+
+    product_ids = datacube.product_ids()
+    times = np.array([product_time(pid) for pid in product_ids], dtype="datetime64[us]")
+    missing = ~np.isin(times, stored_times.astype("datetime64[us]"))
+    if len(stored_times) > 0 and np.any(missing & (times <= stored_times.max())):
+        older = [pid for pid, m, t in zip(product_ids, missing, times) if m and t <= stored_times.max()]
+        raise JP2IOException(
+            f"{len(older)} products ({older[0]}, ...) are older than the last time slice of {output_path},"
+            " export the cube again without update"
+        )
+    product_ids = [pid for pid, m in zip(product_ids, missing) if m]
+    if not product_ids:
+        return 0
+
+    levels = {group: datacube.open_all(int(group or 0), product_ids=product_ids) for group in groups}
+    if output_path.endswith(".icechunk"):
+        session = repo.writable_session("main")
+        for group, ds in levels.items():
+            ds.vz.to_icechunk(session.store, group=group or None, append_dim="time")
+        session.commit(f"append {len(product_ids)} products")
+        return len(product_ids)
 
-def cli_export_to_kerchunk():
+    for group, ds in levels.items():
+        append_kerchunk_refs(refs, ds.vz.to_kerchunk(format="dict")["refs"], prefix=f"{group}/" if group else "")
+    if output_path.endswith(".json"):
+        write_kerchunk_json(refs.items(), output_path)
+    else:
+        lazy_refs.flush()
+    return len(product_ids)
+
+
+def append_kerchunk_refs(
+    refs: MutableMapping[str, Any], new_refs: Mapping[str, Any], dim: str = "time", prefix: str = ""
+) -> None:
+    """
+    Appends along `dim` the arrays of the (zarr v2) kerchunk references `new_refs` to the ones of `refs`,
+    in the group `prefix` of `refs`. The arrays without `dim` are left unchanged.
+
+    The arrays with `dim` have chunks of size 1 along it, except the coordinate `dim`, a single inlined chunk
+    of CF-encoded times, which is encoded again with the units of `refs` when possible.
+    """
+    for key in list(new_refs):
+        if not key.endswith("/.zarray"):
+            continue
+        name = key.removesuffix("/.zarray")
+        dims = json.loads(new_refs[f"{name}/.zattrs"])["_ARRAY_DIMENSIONS"]
+        if dim not in dims:
+            continue
+        axis = dims.index(dim)
+        zarray, new_zarray = json.loads(refs[f"{prefix}{key}"]), json.loads(new_refs[key])
+        length, new_length = zarray["shape"][axis], new_zarray["shape"][axis]
+        zarray["shape"][axis] = length + new_length
+
+        if name == dim:
+            zattrs = json.loads(refs[f"{prefix}{name}/.zattrs"])
+            times = np.concatenate(
+                [
+                    _read_kerchunk_times(refs, prefix.rstrip("/"), dim),
+                    _read_kerchunk_times(new_refs, "", dim),
+                ]
+            )
+            # xarray falls back to finer units if the ones of `refs` can not represent the new times
+            values, zattrs["units"], zattrs["calendar"] = encode_cf_datetime(
+                times, zattrs["units"], zattrs.get("calendar"), np.dtype(zarray["dtype"])
+            )
+            zarray["chunks"], zarray["dtype"] = [len(values)], values.dtype.str
+            refs[f"{prefix}{key}"] = json.dumps(zarray)
+            refs[f"{prefix}{name}/.zattrs"] = json.dumps(zattrs)
+            refs[f"{prefix}{name}/0"] = "base64:" + base64.b64encode(values.tobytes()).decode()
+            continue
+
+        if zarray["chunks"][axis] != 1 or new_zarray["chunks"][axis] != 1:
+            raise JP2IOException(f"{name} should have chunks of size 1 along {dim}")
+        # the metadata first, a LazyReferenceMapper locates the chunks from the shape of the array
+        refs[f"{prefix}{key}"] = json.dumps(zarray)
+        separator = new_zarray.get("dimension_separator") or "."
+        for chunk_key in new_refs:
+            if not chunk_key.startswith(f"{name}/") or chunk_key.rsplit("/", 1)[1].startswith(".z"):
+                continue
+            indices = chunk_key.rsplit("/", 1)[1].split(separator)
+            indices[axis] = str(int(indices[axis]) + length)
+            refs[f"{prefix}{name}/{separator.join(indices)}"] = new_refs[chunk_key]
+
+
+def _read_kerchunk_times(refs: Mapping[str, Any], group: str = "", dim: str = "time") -> NDArray[np.datetime64]:
+    """
+    Values of the coordinate `dim`, stored as a single inlined chunk, in the group `group` of kerchunk references.
+    """
+    prefix = f"{group}/{dim}" if group else dim
+    zarray, zattrs = json.loads(refs[f"{prefix}/.zarray"]), json.loads(refs[f"{prefix}/.zattrs"])
+    if zarray["shape"][0] == 0:
+        return np.empty(0, dtype="datetime64[us]")
+    if zarray["compressor"] is not None or zarray["filters"] or zarray["chunks"] != zarray["shape"]:
+        raise JP2IOException(f"{prefix} should be stored in a single uncompressed chunk")
+    raw = refs[f"{prefix}/0"]
+    if isinstance(raw, str):
+        raw = base64.b64decode(raw[7:]) if raw.startswith("base64:") else raw.encode()
+    if not isinstance(raw, bytes):
+        raise JP2IOException(f"{prefix} should be inlined in the references")
+    return _decode_times(np.frombuffer(raw, dtype=zarray["dtype"]), zattrs)
+
+
+def _decode_times(values: NDArray[Any], attrs: Mapping[str, Any]) -> NDArray[np.datetime64]:
+    times: NDArray[np.datetime64] = decode_cf_datetime(values, attrs["units"], attrs.get("calendar"))
+    return times
+
+
+def cli_export_to_kerchunk() -> None:
     import fire
 
     fire.Fire(main_export_to_kerchunk)
@@ -1,4 +1,10 @@
+import datetime
+import hashlib
+import io
 import os
+import struct
+import warnings
+from dataclasses import dataclass, field
 from typing import Any
 
 import pytest
@@ -28,3 +34,224 @@ def maybe_skip_s3() -> None:
 @pytest.fixture(scope="session")
 def s3_client(maybe_skip_s3: None) -> Any:
     return _s3_client
+
+
+def make_index_bytes(tiles_length: list[int], position_first_sot: int = 1000) -> bytes:
+    """
+    Builds an index in the format of s2tlm-indexer (see s2tlm-indexer/README.md).
+    """
+    large = max(tiles_length, default=0) > 0xFFFF
+    ttlm = ">B" if len(tiles_length) <= 255 else ">H"
+    stlm = (0b01_00_0000 if large else 0) | (0b00_01_0000 if ttlm == ">B" else 0b00_10_0000)
+
+    entries = b"".join(
+        struct.pack(ttlm, i) + struct.pack(">I" if large else ">H", n) for i, n in enumerate(tiles_length)
+    )
+    tlm_segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, stlm) + entries
+
+    file_size = position_first_sot + sum(tiles_length) + 2
+    return struct.pack(">QQL", file_size, position_first_sot, len(tlm_segment)) + tlm_segment
+
+
+def make_tlm_table(n_products: int, bands: tuple[str, ...] = ("B02", "B03", "B04", "B08")) -> Any:
+    """
+    Builds a pyarrow table with the same schema as the parquet files of s2tlm-indexer, sorted by product_id.
+    """
+    import pyarrow as pa
+
+    dates = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(n_products)]
+    product_ids = [f"S2A_MSIL2A_{date:%Y%m%d}T105031_N0511_R051_T31UDQ_20241016T151206" for date in dates]
+    return pa.table(
+        {
+            "product_id": [pid for pid in product_ids for _ in bands],
+            "band_id": list(bands) * n_products,
+            "path": [f"/eodata/{pid}/{bid}.jp2" for pid in product_ids for bid in bands],
+            "index": [make_index_bytes([i + 1] * 121) for i in range(n_products * len(bands))],
+        }
+    )
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for a boto3 S3 client, counting the requests and the bytes sent.
+    """
+
+    class exceptions:
+        class ClientError(Exception):
+            def __init__(self, code: str) -> None:
+                self.response = {"Error": {"Code": code}}
+
+        class NoSuchKey(ClientError):
+            def __init__(self) -> None:
+                super().__init__("NoSuchKey")
+
+    def __init__(self, objects: dict[tuple[str, str], bytes]) -> None:
+        self.objects = objects
+        self.requests: list[dict[str, Any]] = []
+        self.bytes_sent = 0
+
+    def get_object(
+        self, Bucket: str, Key: str, Range: str | None = None, IfNoneMatch: str | None = None
+    ) -> dict[str, Any]:
+        self.requests.append(dict(Bucket=Bucket, Key=Key, Range=Range, IfNoneMatch=IfNoneMatch))
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey()
+        data = self.objects[(Bucket, Key)]
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if IfNoneMatch == etag:
+            raise self.exceptions.ClientError("304")
+
+        response: dict[str, Any] = {"ETag": etag}
+        if Range is not None:
+            start_str, end_str = Range.removeprefix("bytes=").split("-")
+            if start_str == "":
+                start, end = max(len(data) - int(end_str), 0), len(data)
+            else:
+                start, end = int(start_str), min(int(end_str) + 1, len(data))
+            response["ContentRange"] = f"bytes {start}-{end - 1}/{len(data)}"
+            data = data[start:end]
+
+        self.bytes_sent += len(data)
+        response["Body"] = io.BytesIO(data)
+        response["ContentLength"] = len(data)
+        return response
+
+
+def index_jp2(data: bytes, embed_main_header: bool = False, resolution_ends: bool = False) -> bytes:
+    """
+    Indexes a JP2 file in memory, like s2tlm-indexer: walks the boxes, then the markers until the first SOT,
+    then the SOT markers until the end of the codestream.
+    """
+    cur = 0
+    while True:
+        length, boxtype = struct.unpack_from(">II", data, cur)
+        if boxtype == 0x6A703263:  # jp2c
+            cur += 8
+            break
+        cur += length
+
+    cur += 2  # SOC
+    while True:
+        code, length = struct.unpack_from(">HH", data, cur)
+        if code == 0xFF90:  # SOT
+            break
+        cur += 2 + length
+    position_first_sot = cur
+
+    tiles_length = []
+    while struct.unpack_from(">H", data, cur)[0] != 0xFFD9:  # EOC
+        psot = struct.unpack_from(">I", data, cur + 6)[0]
+        tiles_length.append(psot)
+        cur += psot
+
+    index = struct.pack(">Q", len(data)) + make_index_bytes(tiles_length, position_first_sot)[8:]
+    if embed_main_header:
+        index += struct.pack(">4sL", b"MHDR", position_first_sot) + data[:position_first_sot]
+    if resolution_ends:
+        from jp2io.codestream import MainHeader
+
+        header = MainHeader.parse(data[:position_first_sot])
+        payload = bytes([header.cod.levels + 1])
+        tile_position = position_first_sot
+        for tile_index, length in enumerate(tiles_length):
+            ends = header.resolution_ends(tile_index, data[tile_position : tile_position + length])
+            assert ends is not None
+            payload += struct.pack(f">{len(ends)}I", *ends)
+            tile_position += length
+        index += struct.pack(">4sL", b"RESO", len(payload)) + payload
+    return index
+
+
+@dataclass(frozen=True)
+class SyntheticJP2:
+    path: str
+    array: Any
+    index: bytes
+    index_with_main_header: bytes
+    index_with_resolution_ends: bytes
+
+
+@pytest.fixture(scope="session")
+def synthetic_jp2(tmp_path_factory: Any) -> SyntheticJP2:
+    """
+    Small tiled JP2 encoded like Sentinel-2 rasters (lossless, 15 bits, LRCP, precincts, PLT markers, no TLM).
+    """
+    import numpy as np
+    import rasterio
+
+    height, width = 700, 650
+    yy, xx = np.mgrid[0:height, 0:width]
+    noise = np.random.default_rng(0).integers(0, 200, (height, width))
+    array = ((np.sin(xx / 17) + np.cos(yy / 23)) * 3000 + 8000 + noise).astype(np.uint16)
+
+    path = str(tmp_path_factory.mktemp("jp2") / "synthetic.jp2")
+    profile = dict(driver="JP2OpenJPEG", width=width, height=height, count=1, dtype="uint16")
+    options = dict(
+        blockxsize=256,
+        blockysize=256,
+        CODEC="JP2",
+        QUALITY=100,
+        REVERSIBLE="YES",
+        NBITS=15,
+        RESOLUTIONS=4,
+        PRECINCTS="{64,64},{64,64},{64,64},{64,64}",
+        CODEBLOCK_WIDTH=32,
+        CODEBLOCK_HEIGHT=32,
+        PLT="ON",
+        TLM="OFF",
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(path, "w", **profile, **options) as dst:
+            dst.write(array, 1)
+
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+
+    # GDAL writes the length of the codestream box, which would not match once the TLM is injected:
+    # use 0 instead ("until the end of the file"), as the codestream box is the last one
+    jp2c = data.index(b"jp2c") - 4
+    data[jp2c : jp2c + 4] = struct.pack(">I", 0)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    return SyntheticJP2(
+        path=path,
+        array=array,
+        index=index_jp2(bytes(data)),
+        index_with_main_header=index_jp2(bytes(data), embed_main_header=True),
+        index_with_resolution_ends=index_jp2(bytes(data), resolution_ends=True),
+    )
+
+
+@pytest.fixture
+def synthetic_tlm_index(synthetic_jp2: SyntheticJP2) -> Any:
+    """
+    Index of `synthetic_jp2`, without extension.
+    """
+    from jp2io.index import TLMIndex, TLMMetadata
+
+    meta = TLMMetadata(
+        product_id="S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206",
+        band_id="B03",
+        path=synthetic_jp2.path,
+    )
+    return TLMIndex.from_bytes(synthetic_jp2.index, meta)
+
+
+def make_counting_range_reader() -> Any:
+    """
+    Returns a LocalRangeReader that records the requests it receives.
+    """
+    from jp2io.rangereader import LocalRangeReader
+
+    @dataclass(frozen=True)
+    class CountingRangeReader(LocalRangeReader):
+        requests: list[tuple[int, int]] = field(default_factory=list)
+
+        def read(self, uri: str, offset: int, length: int) -> bytes:
+            self.requests.append((offset, length))
+            return super().read(uri, offset, length)
+
+    return CountingRangeReader()
@@ -0,0 +1,139 @@
+import os
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import ParquetTLMProvider
+from jp2io.exception import TLMIndexNotFound
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+
+
+@pytest.fixture
+def object_store_provider(synthetic_jp2: Any) -> Any:
+    """
+    ObjectStoreTLMProvider of the parquet file of 31UDQ, which only contains the B04 of `product_id`.
+    """
+    pytest.importorskip("obstore")
+    import obstore
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from obstore.store import MemoryStore
+
+    from jp2io.aio import ObjectStoreTLMProvider
+
+    path = os.path.basename(synthetic_jp2.path)
+    table = pa.table({"product_id": [product_id], "band_id": ["B04"], "path": [path], "index": [synthetic_jp2.index]})
+    buf = pa.BufferOutputStream()
+    pq.write_table(table, buf)
+    parquet_store = MemoryStore()
+    obstore.put(parquet_store, "L2A/31UDQ.parquet", buf.getvalue().to_pybytes())
+    return ObjectStoreTLMProvider(store=parquet_store, path_pattern="{level}/{mgrs_tile}.parquet")
+
+
+def test_aio_read_window(synthetic_jp2: Any, object_store_provider: Any) -> None:
+    pytest.importorskip("imagecodecs")
+    import asyncio
+
+    from obstore.store import LocalStore
+
+    from jp2io.aio import read_window
+
+    raster_store = LocalStore(prefix=os.path.dirname(synthetic_jp2.path))
+    windows = [rasterio.windows.Window(x, y, 90, 70) for x in range(0, 560, 80) for y in range(0, 630, 90)]
+
+    async def read(window: Any) -> Any:
+        tlm = await object_store_provider.get_tlm(product_id, "B04")
+        return await read_window(tlm, raster_store, tlm.path, window)
+
+    async def main() -> list[Any]:
+        return await asyncio.gather(*(read(w) for w in windows))
+
+    arrays = asyncio.run(main())
+    for a, w in zip(arrays, windows):
+        assert np.array_equal(a, synthetic_jp2.array[w.toslices()])
+
+
+def test_objectstoreprovider_not_found(object_store_provider: Any) -> None:
+    import asyncio
+
+    async def main() -> None:
+        with pytest.raises(TLMIndexNotFound):
+            await object_store_provider.get_tlm(product_id.replace("T31UDQ", "T31UDP"), "B04")
+        with pytest.raises(TLMIndexNotFound):
+            await object_store_provider.get_tlm(product_id, "B01")
+
+    asyncio.run(main())
+    # the parquet files are loaded once, the missing ones are remembered
+    assert list(object_store_provider._providers) == [("L2A", "31UDQ")]
+    assert list(object_store_provider._missing) == [("L2A", "31UDP")]
+
+
+@pytest.fixture
+def large_object_store(tmp_path: Any) -> Any:
+    """
+    MemoryStore with the parquet file of 400 products of 31UDQ, in row groups of 64 rows.
+    """
+    pytest.importorskip("obstore")
+    import obstore
+    import pyarrow.parquet as pq
+    from conftest import make_tlm_table
+    from obstore.store import MemoryStore
+
+    table = make_tlm_table(400)
+    pq.write_table(table, tmp_path / "tlm.parquet", row_group_size=64)
+    store = MemoryStore()
+    obstore.put(store, "L2A/31UDQ.parquet", (tmp_path / "tlm.parquet").read_bytes())
+    return store
+
+
+def test_objectstoreprovider_range_requests(tmp_path: Any, large_object_store: Any, monkeypatch: Any) -> None:
+    import asyncio
+
+    import obstore
+    from conftest import make_tlm_table
+
+    from jp2io.aio import ObjectStoreTLMProvider
+
+    requests = []
+    get_range = obstore.get_range
+
+    def counting_get_range(store: Any, path: str, *, start: int, end: int) -> Any:
+        requests.append((start, end))
+        return get_range(store, path, start=start, end=end)
+
+    monkeypatch.setattr(obstore, "get_range", counting_get_range)
+    provider = ObjectStoreTLMProvider(store=large_object_store, path_pattern="{level}/{mgrs_tile}.parquet")
+    table = make_tlm_table(400)
+    pid = table["product_id"][1000].as_py()
+
+    tlm = asyncio.run(provider.get_tlm(pid, "B03"))
+    assert tlm == ParquetTLMProvider.from_pyarray(table).get_tlm(pid, "B03")
+    # the footer is fetched with the first request, then a single row group
+    assert len(requests) == 1
+    assert sum(end - start for start, end in requests) < (tmp_path / "tlm.parquet").stat().st_size * 0.25
+
+
+def test_objectstoreprovider_negative_cache_traceback(large_object_store: Any) -> None:
+    import asyncio
+
+    from jp2io.aio import ObjectStoreTLMProvider
+
+    provider = ObjectStoreTLMProvider(store=large_object_store, path_pattern="{level}/{mgrs_tile}.parquet")
+    missing_pid = product_id.replace("T31UDQ", "T31UDP")
+
+    async def main() -> list[int]:
+        with pytest.raises(TLMIndexNotFound):
+            await provider.get_tlm(missing_pid, "B03")
+        depths = []
+        for _ in range(3):
+            with pytest.raises(TLMIndexNotFound) as excinfo:
+                await provider.get_tlm(missing_pid, "B03")
+            depths.append(len(excinfo.traceback))
+        return depths
+
+    # the cached exception does not accumulate the frames of the previous lookups
+    depths = asyncio.run(main())
+    assert depths[0] == depths[1] == depths[2]
@@ -0,0 +1,109 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import ParquetTLMProvider, TLMIndex
+
+product_ids = [f"S2A_MSIL2A_202401{day:02d}T105031_N0511_R051_T31UDQ_20241016T151206" for day in (1, 6, 11)]
+
+
+@pytest.fixture
+def provider(synthetic_jp2: Any) -> ParquetTLMProvider:
+    """
+    B03 with the main header in its index, B04 with the end of the resolution levels, for each product.
+    """
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            "product_id": [pid for pid in product_ids for _ in range(2)],
+            "band_id": ["B03", "B04"] * 3,
+            "path": [synthetic_jp2.path] * 6,
+            "index": [synthetic_jp2.index_with_main_header, synthetic_jp2.index_with_resolution_ends] * 3,
+        }
+    )
+    return ParquetTLMProvider.from_pyarray(table)
+
+
+def test_xarray_backend(synthetic_jp2: Any, provider: ParquetTLMProvider) -> None:
+    pytest.importorskip("dask")
+    from typing import cast
+
+    import xarray as xr
+    from conftest import make_counting_range_reader
+
+    from jp2io.backend import JP2IOBackendEntrypoint
+
+    range_reader = make_counting_range_reader()
+    ds = xr.open_dataset(
+        # xarray only types the inputs of its own backends, the jp2io engine accepts a TLMProvider
+        cast(Any, provider),
+        engine=JP2IOBackendEntrypoint,
+        product_ids=product_ids,
+        bands=["B03", "B04"],
+        range_reader=range_reader,
+        chunks={},
+    )
+    # only the main header of B04, not embedded in its index, is read when opening
+    assert len(range_reader.requests) == 1
+    assert ds.sizes == {"time": 3, "y": 700, "x": 650}
+    assert ds["B04"].dtype == np.uint16
+    assert ds["B04"].chunks == ((1, 1, 1), (256, 256, 188), (256, 256, 138))
+    assert ds["product_id"].values.tolist() == product_ids
+
+    np.testing.assert_array_equal(ds["B04"][1, 200:300, 250:270].values, synthetic_jp2.array[200:300, 250:270])
+    np.testing.assert_array_equal(ds["B03"][:, ::7, 600].values, np.stack([synthetic_jp2.array[::7, 600]] * 3))
+
+
+def test_backend_reads_selected_tiles(synthetic_jp2: Any, provider: ParquetTLMProvider) -> None:
+    from conftest import make_counting_range_reader
+
+    from jp2io.backend import JP2IOBackendEntrypoint
+    from jp2io.index import VirtualTLMIndex
+
+    range_reader = make_counting_range_reader()
+    ds = JP2IOBackendEntrypoint().open_dataset(
+        provider, product_ids=product_ids, bands=["B03"], range_reader=range_reader
+    )
+    range_reader.requests.clear()
+    np.testing.assert_array_equal(ds["B03"][:, ::600, ::600].values, np.stack([synthetic_jp2.array[::600, ::600]] * 3))
+
+    # only the tiles containing the selected pixels are fetched, here the 4 corners of the 3x3 tiles
+    tlm = provider.get_tlm(product_ids[0], "B03")
+    assert isinstance(tlm, VirtualTLMIndex)
+    ranges = tlm.into_tiles_range()
+    corners = [(int(ranges.tiles_position[i]), int(ranges.tiles_length[i])) for i in (0, 2, 6, 8)]
+    assert sorted(range_reader.requests) == sorted(corners * 3)
+
+
+def test_backend_reduce(synthetic_jp2: Any, provider: ParquetTLMProvider) -> None:
+    from jp2io.backend import open_tlm_dataset
+
+    reduced = open_tlm_dataset(provider, product_ids[:1], ["B04"], reduce=2)
+    assert reduced.sizes == {"time": 1, "y": 175, "x": 163}
+    tlm = provider.get_tlm(product_ids[0], "B04")
+    np.testing.assert_array_equal(
+        reduced["B04"][0].values, tlm.read_window(synthetic_jp2.path, rasterio.windows.Window(0, 0, 163, 175), reduce=2)
+    )
+
+
+def test_backend_executor(synthetic_jp2: Any, provider: ParquetTLMProvider) -> None:
+    import concurrent.futures
+    import threading
+
+    from jp2io.backend import open_tlm_dataset
+
+    threads = set()
+
+    def uri_of(tlm: TLMIndex) -> str:
+        threads.add(threading.current_thread().name)
+        return tlm.path
+
+    # the time steps of an access are read concurrently in the executor
+    with concurrent.futures.ThreadPoolExecutor(3, thread_name_prefix="jp2io-test") as executor:
+        ds = open_tlm_dataset(provider, product_ids, ["B03"], uri_of=uri_of, executor=executor)
+        threads.clear()
+        np.testing.assert_array_equal(ds["B03"][:, 10:20, 300].values, np.stack([synthetic_jp2.array[10:20, 300]] * 3))
+    assert threads and all(name.startswith("jp2io-test") for name in threads)
@@ -0,0 +1,79 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import JP2IOException, ParquetTLMProvider, ReaderSession, TLMIndex
+from jp2io.exception import TLMIndexNotFound
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+bands = ["B04", "B05", "B01"]
+window = rasterio.windows.Window(101, 203, 60, 45)
+
+
+@pytest.fixture
+def provider(synthetic_jp2: Any) -> ParquetTLMProvider:
+    """
+    The same raster for all the bands, B05 is read as a 20m band and B01 as a 60m band.
+    """
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            "product_id": [product_id] * len(bands),
+            "band_id": bands,
+            "path": [synthetic_jp2.path] * len(bands),
+            "index": [synthetic_jp2.index] * len(bands),
+        }
+    )
+    return ParquetTLMProvider.from_pyarray(table)
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_bands(synthetic_jp2: Any, provider: ParquetTLMProvider) -> None:
+    out = provider.read_bands(product_id, bands, window, uri_of=lambda tlm: tlm.path)
+    assert out.shape == (3, 45, 60)
+    assert np.array_equal(out[0], synthetic_jp2.array[window.toslices()])
+    for band, factor in ((1, 2), (2, 6)):
+        rows = np.arange(203, 203 + 45) // factor
+        cols = np.arange(101, 101 + 60) // factor
+        assert np.array_equal(out[band], synthetic_jp2.array[np.ix_(rows, cols)])
+
+
+def test_read_bands_not_found(provider: ParquetTLMProvider) -> None:
+    with pytest.raises(TLMIndexNotFound):
+        provider.read_bands(product_id, ["B04", "B08"], window, uri_of=lambda tlm: tlm.path)
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_bands_session(provider: ParquetTLMProvider) -> None:
+    out = provider.read_bands(product_id, bands, window, uri_of=lambda tlm: tlm.path)
+
+    # the datasets of a session are reused from one call to the next
+    with ReaderSession(max_workers=3) as session:
+        for _ in range(3):
+            again = provider.read_bands(product_id, bands, window, uri_of=lambda tlm: tlm.path, session=session)
+            assert np.array_equal(again, out)
+        assert session.stats.hits > 0
+        assert session.stats.opens <= 3 * len(bands)
+        assert sum(len(cache) for cache in session._caches.values()) == session.stats.opens
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_bands_multi_component(tmp_path: Any) -> None:
+    from conftest import index_jp2
+
+    from jp2io.bands import read_bands
+    from jp2io.index import TLMMetadata
+
+    # TCI rasters are rejected
+    path = str(tmp_path / "TCI.jp2")
+    profile = dict(driver="JP2OpenJPEG", width=200, height=200, count=3, dtype="uint8")
+    with rasterio.open(path, "w", **profile, blockxsize=128, blockysize=128, CODEC="JP2") as dst:
+        dst.write(np.zeros((3, 200, 200), dtype=np.uint8))
+    with open(path, "rb") as f:
+        index = index_jp2(f.read())
+    tci = TLMIndex.from_bytes(index, TLMMetadata(product_id=product_id, band_id="TCI", path=path))
+    with pytest.raises(JP2IOException):
+        read_bands([tci], rasterio.windows.Window(0, 0, 50, 50), uri_of=lambda tlm: tlm.path)
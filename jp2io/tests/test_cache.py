@@ -0,0 +1,91 @@
+import os
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import ShardDiskCache, TLMIndex
+
+
+def test_shard_disk_cache_eviction(tmp_path: Any) -> None:
+    cache = ShardDiskCache(str(tmp_path), max_size=250)
+    cache.put("s3://bucket/a.parquet", b"a" * 100, '"etag-a"')
+    cache.put("s3://bucket/b.parquet", b"b" * 100, '"etag-b"')
+    os.utime(cache.get("s3://bucket/b.parquet").path, (0, 0))  # type: ignore
+    assert cache.get("s3://bucket/a.parquet") == cache.get("s3://bucket/a.parquet")
+
+    # b is the least recently used
+    cache.put("s3://bucket/c.parquet", b"c" * 100, '"etag-c"')
+    assert cache.get("s3://bucket/b.parquet") is None
+    assert cache.get("s3://bucket/a.parquet").etag == '"etag-a"'  # type: ignore
+    assert cache.get("s3://bucket/c.parquet") is not None
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_tile_byte_cache(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex, tmp_path: Any) -> None:
+    pytest.importorskip("imagecodecs")
+    from conftest import make_counting_range_reader
+
+    from jp2io.cache import TileByteCache
+    from jp2io.index import VirtualTLMIndex
+    from jp2io.rangereader import prefetch_tiles
+
+    assert isinstance(synthetic_tlm_index, VirtualTLMIndex)
+    byte_cache = TileByteCache(str(tmp_path / "tiles"))
+    window = rasterio.windows.Window(100, 10, 300, 50)
+
+    # direct reader: the second read only fetches the main header
+    for n_requests in (2, 1):
+        range_reader = make_counting_range_reader()
+        a = synthetic_tlm_index.read_window(
+            synthetic_jp2.path, window, range_reader=range_reader, byte_cache=byte_cache
+        )
+        assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+        assert len(range_reader.requests) == n_requests
+    assert (byte_cache.stats.hits, byte_cache.stats.misses) == (2, 2)
+
+    # GDAL: tiles in the cache are read from their local file
+    prefetch_tiles(synthetic_tlm_index, synthetic_jp2.path, byte_cache)
+    assert len(os.listdir(tmp_path / "tiles")) == 9
+    sparsefile = synthetic_tlm_index.make_vsi_file_for_uri(synthetic_jp2.path, byte_cache)
+    assert sparsefile._content.count(b".seg</Filename>") == 9
+    sparsefile.close()
+    with synthetic_tlm_index.open(synthetic_jp2.path, byte_cache=byte_cache) as src:
+        assert np.array_equal(src.read(1), synthetic_jp2.array)
+
+    # a budget of 4 tiles of 256x256 pixels
+    byte_cache = TileByteCache(
+        str(tmp_path / "small"), max_size=4 * int(synthetic_tlm_index.into_tiles_range().tiles_length[0])
+    )
+    prefetch_tiles(synthetic_tlm_index, synthetic_jp2.path, byte_cache)
+    assert 0 < len(os.listdir(tmp_path / "small")) < 9
+    assert byte_cache.stats.evictions > 0
+
+
+def test_read_window_tile_cache(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex) -> None:
+    pytest.importorskip("imagecodecs")
+    from conftest import make_counting_range_reader
+
+    from jp2io.cache import TileCache
+
+    tile_cache = TileCache()
+    # tiles 0 and 1, then tiles 1 and 2
+    for window in (rasterio.windows.Window(100, 10, 300, 50), rasterio.windows.Window(300, 20, 300, 50)):
+        a = synthetic_tlm_index.read_window(synthetic_jp2.path, window, tile_cache=tile_cache)
+        assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+    assert (tile_cache.stats.hits, tile_cache.stats.misses) == (1, 3)
+    # the last column of tiles is 650 - 512 = 138 pixels wide
+    assert tile_cache.nbytes == (2 * 256 + 138) * 256 * 2
+
+    # only the main header is fetched when all the tiles are cached
+    range_reader = make_counting_range_reader()
+    window = rasterio.windows.Window(0, 0, 650, 200)
+    a = synthetic_tlm_index.read_window(synthetic_jp2.path, window, range_reader=range_reader, tile_cache=tile_cache)
+    assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+    assert len(range_reader.requests) == 1
+
+    # budget of 2 tiles
+    tile_cache = TileCache(max_bytes=2 * 256 * 256 * 2)
+    synthetic_tlm_index.read_window(synthetic_jp2.path, window, tile_cache=tile_cache)
+    assert (tile_cache.stats.evictions, tile_cache.nbytes) == (1, (256 + 138) * 256 * 2)
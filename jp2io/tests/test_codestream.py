@@ -0,0 +1,144 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import TLMIndex
+from jp2io.index import TLMMetadata, VirtualTLMIndex
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+
+
+@pytest.mark.parametrize("reduce", [0, 1])
+def test_decode_tile_region(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex, reduce: int) -> None:
+    pytest.importorskip("imagecodecs")
+    from jp2io.codestream import MainHeader
+    from jp2io.reader import decode_tile
+
+    assert isinstance(synthetic_tlm_index, VirtualTLMIndex)
+    with open(synthetic_jp2.path, "rb") as f:
+        data = f.read()
+    header = MainHeader.parse(data[: synthetic_tlm_index.position_first_sot]).reduced(reduce)
+    ranges = synthetic_tlm_index.into_tiles_range()
+
+    rng = np.random.default_rng(0)
+    for tile_index in (0, 4, 8):
+        offset, length = int(ranges.tiles_position[tile_index]), int(ranges.tiles_length[tile_index])
+        tile_data = data[offset : offset + length]
+        full = decode_tile(header, tile_index, tile_data)
+        for _ in range(10):
+            # in the first of the 64x64 precincts of the highest resolution level
+            x0, y0 = rng.integers(0, 30, 2)
+            x1, y1 = x0 + rng.integers(1, 30), y0 + rng.integers(1, 30)
+            region = (int(x0), int(y0), int(x1), int(y1))
+            # the packets of the other precincts are emptied
+            assert len(header.tile_codestream(tile_data, tile_index, region)) < len(
+                header.tile_codestream(tile_data, tile_index)
+            )
+            tile = decode_tile(header, tile_index, tile_data, region)
+            assert np.array_equal(tile[y0:y1, x0:x1], full[y0:y1, x0:x1])
+
+
+@pytest.mark.parametrize("reduce", [0, 1, 2])
+def test_decode_tile_region_precinct_boundary(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex, reduce: int) -> None:
+    pytest.importorskip("imagecodecs")
+    from jp2io.codestream import MainHeader
+    from jp2io.reader import decode_tile
+
+    assert isinstance(synthetic_tlm_index, VirtualTLMIndex)
+    with open(synthetic_jp2.path, "rb") as f:
+        data = f.read()
+    header = MainHeader.parse(data[: synthetic_tlm_index.position_first_sot]).reduced(reduce)
+    ranges = synthetic_tlm_index.into_tiles_range()
+    offset, length = int(ranges.tiles_position[4]), int(ranges.tiles_length[4])
+    tile_data = data[offset : offset + length]
+    full = decode_tile(header, 4, tile_data)
+
+    # 64x64 precincts at every resolution level: the region starts or ends on a precinct border of the level
+    # decoded at full size, and of the lower levels where the synthesis filters reach over the border
+    border = 64
+    for x0, x1 in ((border - 1, border), (border, border + 1), (border - 2, border + 2), (border, 2 * border)):
+        for y0, y1 in ((0, 1), (border - 1, border + 1)):
+            region = (x0, y0, x1, y1)
+            tile = decode_tile(header, 4, tile_data, region)
+            assert np.array_equal(tile[y0:y1, x0:x1], full[y0:y1, x0:x1]), region
+            tile = decode_tile(header, 4, tile_data, (y0, x0, y1, x1))
+            assert np.array_equal(tile[x0:x1, y0:y1], full[x0:x1, y0:y1]), region
+
+
+@pytest.fixture
+def irreversible_tlm_index(tmp_path: Any) -> VirtualTLMIndex:
+    """
+    Index of a lossy 9/7 wavelet raster, whose filters spread further than the margin around a region.
+    """
+    from jp2io.indexer import make_index
+
+    path = str(tmp_path / "irreversible.jp2")
+    yy, xx = np.mgrid[0:512, 0:512]
+    noise = np.random.default_rng(0).integers(0, 200, (512, 512))
+    array = ((np.sin(xx / 17) + np.cos(yy / 23)) * 3000 + 8000 + noise).astype(np.uint16)
+    profile = dict(driver="JP2OpenJPEG", width=512, height=512, count=1, dtype="uint16")
+    options = dict(blockxsize=256, blockysize=256, CODEC="JP2", QUALITY=50, REVERSIBLE="NO", NBITS=15, RESOLUTIONS=4)
+    options |= dict(PRECINCTS="{32,32},{32,32},{32,32},{32,32}", CODEBLOCK_WIDTH=32, CODEBLOCK_HEIGHT=32, PLT="ON")
+    with rasterio.open(path, "w", **profile, **options) as dst:
+        dst.write(array, 1)
+
+    tlm = TLMIndex.from_bytes(make_index(path), TLMMetadata(product_id=product_id, band_id="B04", path=path))
+    assert isinstance(tlm, VirtualTLMIndex)
+    return tlm
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_decode_tile_region_irreversible(irreversible_tlm_index: VirtualTLMIndex) -> None:
+    pytest.importorskip("imagecodecs")
+    from jp2io.codestream import MainHeader
+    from jp2io.reader import decode_tile
+
+    tlm = irreversible_tlm_index
+    with open(tlm.path, "rb") as f:
+        data = f.read()
+    header = MainHeader.parse(data[: tlm.position_first_sot])
+    assert not header._can_empty_packets()
+    ranges = tlm.into_tiles_range()
+
+    rng = np.random.default_rng(1)
+    for tile_index in range(4):
+        offset, length = int(ranges.tiles_position[tile_index]), int(ranges.tiles_length[tile_index])
+        tile_data = data[offset : offset + length]
+        full = decode_tile(header, tile_index, tile_data)
+        for _ in range(20):
+            x0, y0 = rng.integers(0, 250, 2)
+            x1, y1 = x0 + rng.integers(1, 60), y0 + rng.integers(1, 60)
+            tile = decode_tile(header, tile_index, tile_data, (int(x0), int(y0), int(x1), int(y1)))
+            assert np.array_equal(tile[y0:y1, x0:x1], full[y0:y1, x0:x1])
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_window_irreversible(irreversible_tlm_index: VirtualTLMIndex) -> None:
+    pytest.importorskip("imagecodecs")
+    tlm = irreversible_tlm_index
+    window = rasterio.windows.Window(200, 230, 90, 70)
+    with rasterio.open(tlm.path) as src:
+        assert np.array_equal(tlm.read_window(tlm.path, window), src.read(1, window=window))
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_can_empty_packets(irreversible_tlm_index: VirtualTLMIndex) -> None:
+    import dataclasses
+    import struct
+
+    from jp2io.codestream import MainHeader
+
+    tlm = irreversible_tlm_index
+    with open(tlm.path, "rb") as f:
+        header = MainHeader.parse(f.read(tlm.position_first_sot))
+
+    # only the packets of the reversible wavelet can be emptied outside of the region
+    assert not header._can_empty_packets()
+    reversible = dataclasses.replace(header, cod=dataclasses.replace(header.cod, transformation=1))
+    assert reversible._can_empty_packets()
+
+    # the order of the packets may also be changed by COC or POC markers
+    poc = struct.pack(">HHBBHBBB", 0xFF5F, 9, 0, 0, 1, 4, 1, 0)
+    assert not dataclasses.replace(reversible, markers=reversible.markers + poc)._can_empty_packets()
@@ -0,0 +1,87 @@
+import math
+from typing import Any
+
+import numpy as np
+import pytest
+
+from jp2io import TLMIndex
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+band_id = "B03"
+
+
+def test_stack_tiles_ranges(synthetic_jp2: Any) -> None:
+    from conftest import index_jp2, make_index_bytes
+
+    from jp2io.index import TLMMetadata, UnsupportedJP2Exception, VirtualTLMIndex, stack_tiles_ranges
+
+    meta = TLMMetadata(product_id=product_id, band_id=band_id, path="")
+    with open(synthetic_jp2.path, "rb") as f:
+        data = f.read()
+    rng = np.random.default_rng(0)
+    cases = [
+        # with and without extensions, in any order
+        (
+            [
+                synthetic_jp2.index_with_resolution_ends,
+                synthetic_jp2.index,
+                index_jp2(data, embed_main_header=True, resolution_ends=True),
+            ],
+            (0, 1, 2),
+        ),
+        # u16 and u32 lengths
+        ([make_index_bytes(rng.integers(100, n, 121).tolist(), int(n)) for n in (60_000, 2_000_000, 50_000)], (0, 1)),
+    ]
+    for indexes, reduces in cases:
+        for reduce in reduces:
+            tiles_position, tiles_length = stack_tiles_ranges(indexes, reduce)
+            for i, index in enumerate(indexes):
+                tlm = TLMIndex.from_bytes(index, meta)
+                assert isinstance(tlm, VirtualTLMIndex)
+                ranges = tlm.into_tiles_range(reduce)
+                assert tiles_position[i].tolist() == ranges.tiles_position.tolist()
+                assert tiles_length[i].tolist() == ranges.tiles_length.tolist()
+
+    with pytest.raises(UnsupportedJP2Exception):
+        stack_tiles_ranges([make_index_bytes([100] * 121), make_index_bytes([100] * 81)])
+    with pytest.raises(UnsupportedJP2Exception):
+        stack_tiles_ranges([make_index_bytes([100] * 121), b""])
+    with pytest.raises(UnsupportedJP2Exception):
+        stack_tiles_ranges([make_index_bytes([100] * 121)[:-1]])
+
+
+@pytest.mark.parametrize(
+    "n_tiles, max_length",
+    [
+        (121, 60_000),  # 10m bands
+        (121, 2_000_000),  # 10m bands, with u32 lengths
+        (81, 60_000),  # 20m bands
+        (100, 60_000),  # 60m bands
+        (484, 60_000),  # more than 255 tiles (u16 indices), as for TCI
+    ],
+)
+def test_into_tiles_range(n_tiles: int, max_length: int) -> None:
+    import struct
+
+    from conftest import make_index_bytes
+
+    from jp2io.index import TLMMetadata, VirtualTLMIndex
+
+    tiles_length = np.random.default_rng(n_tiles).integers(100, max_length, n_tiles).tolist()
+    meta = TLMMetadata(product_id=product_id, band_id=band_id, path="")
+    tlm = TLMIndex.from_bytes(make_index_bytes(tiles_length, position_first_sot=1234), meta)
+    assert isinstance(tlm, VirtualTLMIndex)
+
+    ranges = tlm.into_tiles_range()
+    assert ranges.tiles_position.dtype == np.uint64
+    assert ranges.tiles_length.tolist() == tiles_length
+    assert ranges.tiles_position.tolist() == (1234 + np.cumsum([0] + tiles_length[:-1])).tolist()
+    assert ranges.grid_shape == (math.isqrt(n_tiles),) * 2
+    assert tlm.into_tiles_range() is ranges
+
+    # without Ttlm (tiles in order)
+    entries = b"".join(struct.pack(">H", n) for n in tiles_length if max_length < 0xFFFF)
+    if entries:
+        segment = struct.pack(">HHBB", 0xFF55, 4 + len(entries), 0, 0) + entries
+        tlm = VirtualTLMIndex(file_size=0, position_first_sot=1234, tlm_segment=segment, meta=meta)
+        assert np.array_equal(tlm.into_tiles_range().tiles_position, ranges.tiles_position)
@@ -0,0 +1,158 @@
+import os
+import struct
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import JP2IOException, ParquetTLMProvider
+from jp2io.exception import TLMIndexNotFound
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+new_product_id = product_id.replace("20241016T105031", "20241019T105031")
+
+
+def rewrite_main_header(synthetic_jp2: Any, path: str, markers: bytes, tiles: bool = True) -> None:
+    """
+    Writes a copy of `synthetic_jp2` with `markers` at the end of the main header, without the tiles if not `tiles`.
+    """
+    with open(synthetic_jp2.path, "rb") as f:
+        data = f.read()
+    (position_first_sot,) = struct.unpack_from(">Q", synthetic_jp2.index, 8)
+    with open(path, "wb") as f:
+        f.write(data[:position_first_sot] + markers)
+        f.write(data[position_first_sot:] if tiles else struct.pack(">H", 0xFFD9))
+
+
+def test_make_index(synthetic_jp2: Any) -> None:
+    from conftest import make_counting_range_reader
+
+    from jp2io.indexer import make_index
+
+    range_reader = make_counting_range_reader()
+    assert make_index(synthetic_jp2.path, range_reader=range_reader) == synthetic_jp2.index
+    # the boxes and the main header, then one request per tile (3x3 tiles)
+    assert len(range_reader.requests) == 1 + 9
+    assert make_index(synthetic_jp2.path, embed_main_header=True) == synthetic_jp2.index_with_main_header
+    assert make_index(synthetic_jp2.path, resolution_ends=True) == synthetic_jp2.index_with_resolution_ends
+
+
+def test_make_index_with_poc(synthetic_jp2: Any, tmp_path: Any) -> None:
+    from jp2io.indexer import make_index
+
+    # a POC marker may change the order of the packets, the end of the resolution levels is not indexed
+    path = str(tmp_path / "poc.jp2")
+    rewrite_main_header(synthetic_jp2, path, struct.pack(">HHBBHBBB", 0xFF5F, 9, 0, 0, 1, 6, 1, 0))
+    with pytest.warns(UserWarning, match="not resolution-progressive"):
+        assert make_index(path, resolution_ends=True) == make_index(path)
+
+
+def test_make_index_without_tiles(synthetic_jp2: Any, tmp_path: Any) -> None:
+    from jp2io.indexer import make_index
+
+    # there is no resolution level to record
+    path = str(tmp_path / "empty.jp2")
+    rewrite_main_header(synthetic_jp2, path, b"", tiles=False)
+    assert make_index(path, resolution_ends=True) == make_index(path)
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_make_index_with_tlm(tmp_path: Any) -> None:
+    from jp2io.indexer import make_index
+
+    # nothing to inject in a raster that already has a TLM marker
+    path = str(tmp_path / "tlm.jp2")
+    profile = dict(driver="JP2OpenJPEG", width=300, height=300, count=1, dtype="uint8")
+    with rasterio.open(path, "w", **profile, blockxsize=128, blockysize=128, CODEC="JP2", TLM="ON") as dst:
+        dst.write(np.zeros((300, 300), dtype=np.uint8), 1)
+    assert make_index(path) == b""
+
+
+def test_make_index_invalid() -> None:
+    from jp2io.indexer import make_index
+
+    with pytest.raises(JP2IOException):
+        make_index(__file__)
+
+
+def test_make_indexes(synthetic_jp2: Any) -> None:
+    pytest.importorskip("obstore")
+    import asyncio
+
+    from obstore.store import LocalStore
+
+    from jp2io.indexer import make_indexes
+
+    store = LocalStore(prefix=os.path.dirname(synthetic_jp2.path))
+    name = os.path.basename(synthetic_jp2.path)
+    indexes = asyncio.run(make_indexes(store, [name, "missing.jp2", name], max_concurrency=2))
+    assert indexes[0] == indexes[2] == synthetic_jp2.index
+    assert isinstance(indexes[1], Exception)
+
+
+def make_indexing_provider(synthetic_jp2: Any, range_reader: Any) -> Any:
+    """
+    IndexingTLMProvider over a parquet file that only knows the B04 of `product_id`, B04 being `synthetic_jp2`.
+    """
+    import pyarrow as pa
+
+    from jp2io import IndexingTLMProvider
+
+    table = pa.table({"product_id": [product_id], "band_id": ["B04"], "path": ["indexed"], "index": [b""]})
+    return IndexingTLMProvider(
+        provider=ParquetTLMProvider.from_pyarray(table),
+        path_of=lambda pid, bid: synthetic_jp2.path if bid == "B04" else "/missing.jp2",
+        range_reader=range_reader,
+    )
+
+
+def test_indexing_provider(synthetic_jp2: Any) -> None:
+    from conftest import make_counting_range_reader
+
+    from jp2io.index import VirtualTLMIndex
+
+    range_reader = make_counting_range_reader()
+    provider = make_indexing_provider(synthetic_jp2, range_reader)
+
+    # known by the parquet files
+    assert provider.get_tlm(product_id, "B04").path == "indexed"
+    assert not range_reader.requests
+
+    # indexed on the first request only
+    tlm = provider.get_tlm(new_product_id, "B04")
+    assert isinstance(tlm, VirtualTLMIndex)
+    assert tlm.path == synthetic_jp2.path
+    assert tlm.to_bytes() == synthetic_jp2.index_with_main_header
+    n_requests = len(range_reader.requests)
+    assert provider.get_tlm(new_product_id, "B04") is tlm
+    assert len(range_reader.requests) == n_requests
+    assert (provider.stats.loads, provider.stats.hits) == (1, 1)
+
+
+def test_indexing_provider_not_found(synthetic_jp2: Any) -> None:
+    from conftest import make_counting_range_reader
+
+    provider = make_indexing_provider(synthetic_jp2, make_counting_range_reader())
+
+    # the callers fall back as for any missing index, without trying again
+    for _ in range(2):
+        with pytest.raises(TLMIndexNotFound):
+            provider.get_tlm(new_product_id, "B03")
+    assert provider.stats.negative_hits == 1
+
+
+def test_indexing_provider_transient_errors(synthetic_jp2: Any) -> None:
+    from jp2io.rangereader import LocalRangeReader
+
+    class UnreachableRangeReader(LocalRangeReader):
+        def read(self, uri: str, offset: int, length: int) -> bytes:
+            raise TimeoutError(uri)
+
+    provider = make_indexing_provider(synthetic_jp2, UnreachableRangeReader())
+
+    # raised, and the next request tries again
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            provider.get_tlm(new_product_id, "B04")
+    assert (provider.stats.loads, provider.stats.negative_hits) == (2, 0)
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 import time
 from typing import Any
@@ -6,7 +7,13 @@ import numpy as np
 import pytest
 import rasterio
 
-from jp2io import JP2IOException, ParquetTLMProvider, S3TLMProvider, TLMIndex, TLMProvider
+from jp2io import (
+    JP2IOException,
+    ParquetTLMProvider,
+    S3TLMProvider,
+    TLMIndex,
+    TLMProvider,
+)
 from jp2io.exception import TLMIndexNotFound
 
 uri = "https://storage.googleapis.com/gcp-public-data-sentinel-2/L2/tiles/31/U/DQ/S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206.SAFE/GRANULE/L2A_T31UDQ_A048668_20241016T105303/IMG_DATA/R10m/T31UDQ_20241016T105031_B03_10m.jp2"
@@ -95,3 +102,34 @@ def test_s3provider_parquet_not_found(s3_tlm_provider: TLMProvider) -> None:
     with pytest.raises(TLMIndexNotFound):
         # this MGRS tile does not exist
         s3_tlm_provider.get_tlm("S2B_MSIL1C_20170730T111111_N9999_R051_T99AAA_20170730T111111", "B02")
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_index_with_main_header(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex) -> None:
+    from conftest import make_counting_range_reader
+
+    from jp2io.index import VirtualTLMIndex
+
+    tlm_index = TLMIndex.from_bytes(synthetic_jp2.index_with_main_header, synthetic_tlm_index._get_tlmmetadata())
+    assert isinstance(tlm_index, VirtualTLMIndex)
+    assert isinstance(synthetic_tlm_index, VirtualTLMIndex)
+    assert tlm_index.main_header is not None
+    assert len(tlm_index.main_header) == tlm_index.position_first_sot
+    assert tlm_index.to_bytes() == synthetic_jp2.index_with_main_header
+    assert synthetic_tlm_index.main_header is None
+    assert synthetic_tlm_index.to_bytes() == synthetic_jp2.index
+
+    # the header is served from memory
+    sparsefile = tlm_index.make_vsi_file_for_uri(f"/vsis3/{uri}")
+    assert sparsefile._content.count(f"/vsis3/{uri}".encode()) == 1
+    sparsefile.close()
+
+    window = rasterio.windows.Window(200, 240, 100, 30)
+    with tlm_index.open(synthetic_jp2.path) as src:
+        assert np.array_equal(src.read(1, window=window), synthetic_jp2.array[window.toslices()])
+
+    if importlib.util.find_spec("imagecodecs") is not None:
+        range_reader = make_counting_range_reader()
+        a = tlm_index.read_window(synthetic_jp2.path, window, range_reader=range_reader)
+        assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+        assert len(range_reader.requests) == 1
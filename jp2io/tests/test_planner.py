@@ -0,0 +1,49 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import TLMIndex
+
+
+def test_plan_ranges() -> None:
+    from jp2io.index import TilesRange
+    from jp2io.planner import plan_ranges
+
+    # 3x3 tiles, contiguous in raster order, except a gap of 10 bytes before tile 4
+    tiles_length = [100, 100, 100, 100, 100, 100, 100, 100, 100]
+    tiles_position = [1000 + 100 * i + (10 if i >= 4 else 0) for i in range(9)]
+    ranges = TilesRange(np.array(tiles_position, dtype=np.uint64), np.array(tiles_length, dtype=np.uint64))
+
+    # one row of the window
+    plan = plan_ranges(ranges, [0, 1, 2])
+    assert [(r.offset, r.length, r.tiles) for r in plan] == [(1000, 300, (0, 1, 2))]
+    assert plan[0].tiles_offset == (0, 100, 200)
+
+    # two rows: the ranges of the first column are not adjacent
+    plan = plan_ranges(ranges, [4, 3, 0, 1], max_gap=0)
+    assert [(r.offset, r.length, r.tiles) for r in plan] == [(1000, 200, (0, 1)), (1300, 100, (3,)), (1410, 100, (4,))]
+    plan = plan_ranges(ranges, [4, 3, 0, 1], max_gap=100)
+    assert [(r.offset, r.length, r.tiles) for r in plan] == [(1000, 510, (0, 1, 3, 4))]
+    assert plan[0].split(bytes(range(256)) * 2)[3].tobytes() == (bytes(range(256)) * 2)[410:510]
+
+    plan = plan_ranges(ranges, [0, 1, 2], max_length=250)
+    assert [(r.offset, r.length, r.tiles) for r in plan] == [(1000, 200, (0, 1)), (1200, 100, (2,))]
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_window_coalesces_requests(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex) -> None:
+    pytest.importorskip("imagecodecs")
+    from conftest import make_counting_range_reader
+
+    # 2 rows of 3 tiles: header + 1 request (tiles are contiguous)
+    window = rasterio.windows.Window(10, 10, 600, 300)
+    range_reader = make_counting_range_reader()
+    a = synthetic_tlm_index.read_window(synthetic_jp2.path, window, range_reader=range_reader)
+    assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+    assert len(range_reader.requests) == 2
+
+    range_reader = make_counting_range_reader()
+    synthetic_tlm_index.read_window(synthetic_jp2.path, window, range_reader=range_reader, max_gap=-1)
+    assert len(range_reader.requests) == 1 + 6
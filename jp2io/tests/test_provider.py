@@ -0,0 +1,245 @@
+import os
+import time
+from typing import Any
+
+import pytest
+
+from jp2io import CompactTLMProvider, LazyParquetTLMProvider, ParquetTLMProvider, S3TLMProvider, ShardDiskCache
+from jp2io.exception import TLMIndexNotFound
+
+
+def test_parquetprovider_lookup() -> None:
+    from conftest import make_tlm_table
+
+    table = make_tlm_table(50)
+    provider = ParquetTLMProvider.from_pyarray(table, cache_maxsize=8)
+    pid = table["product_id"][40].as_py()
+
+    tlm = provider.get_tlm(pid, "B04")
+    assert tlm.path == f"/eodata/{pid}/B04.jp2"
+    assert tlm.band_id == "B04"
+    assert provider.get_tlm(pid, "B04") is tlm
+    assert provider.get_tlms(pid, ["B08", "B04"]) == [provider.get_tlm(pid, "B08"), tlm]
+
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm(pid, "B01")
+    with pytest.raises(TLMIndexNotFound, match="B01"):
+        provider.get_tlms(pid, ["B04", "B01"])
+
+
+def test_compactprovider_lookup() -> None:
+    from conftest import make_tlm_table
+
+    tables = [make_tlm_table(30), make_tlm_table(20, bands=("B01", "B02"))]
+    provider = CompactTLMProvider.from_pyarrays(tables, cache_maxsize=8)
+    reference = ParquetTLMProvider.from_pyarray(tables[0])
+    assert len(provider.product_ids) == 30
+    assert set(provider.band_ids) == {"B01", "B02", "B03", "B04", "B08"}
+
+    for row in (0, 17, 119):
+        pid, bid = tables[0]["product_id"][row].as_py(), tables[0]["band_id"][row].as_py()
+        assert provider.get_tlm(pid, bid) == reference.get_tlm(pid, bid)
+    # duplicated (product_id, band_id) in the second table: the first row wins
+    assert provider.get_tlm(tables[1]["product_id"][0].as_py(), "B02") == reference.get_tlm(
+        tables[0]["product_id"][0].as_py(), "B02"
+    )
+    assert provider.get_tlm(tables[1]["product_id"][0].as_py(), "B01").band_id == "B01"
+
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm(tables[0]["product_id"][4 * 25].as_py(), "B01")
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm("unknown", "B02")
+
+
+def test_lazyparquetprovider_reads_matching_row_groups(tmp_path: Any) -> None:
+    import pyarrow.parquet as pq
+    from conftest import make_tlm_table
+
+    table = make_tlm_table(50)
+    pq.write_table(table, tmp_path / "tlm.parquet", row_group_size=16)
+    provider = LazyParquetTLMProvider.from_local_file(str(tmp_path / "tlm.parquet"))
+    pid = table["product_id"][40].as_py()
+
+    tlm = provider.get_tlm(pid, "B04")
+    assert tlm == ParquetTLMProvider.from_pyarray(table).get_tlm(pid, "B04")
+    assert provider._read_row_group.cache_info().currsize == 1  # type: ignore
+
+    # the bands of a product are looked up in the same row groups
+    tlms = provider.get_tlms(pid, ["B08", "B02", "B04"])
+    assert [tlm.band_id for tlm in tlms] == ["B08", "B02", "B04"]
+    assert tlms[2] is tlm
+    assert provider._read_row_group.cache_info().currsize == 1  # type: ignore
+
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm(pid, "B01")
+    with pytest.raises(TLMIndexNotFound, match="B01"):
+        provider.get_tlms(pid, ["B04", "B01"])
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm("S2C_MSIL2A_20250305T104951_N0511_R051_T31UDQ_20250305T144913", "B02")
+
+
+def test_s3provider_uses_range_requests(tmp_path: Any) -> None:
+    import pyarrow.parquet as pq
+    from conftest import FakeS3Client, make_tlm_table
+
+    table = make_tlm_table(400)
+    pq.write_table(table, tmp_path / "tlm.parquet", row_group_size=64)
+    data = (tmp_path / "tlm.parquet").read_bytes()
+
+    s3_client = FakeS3Client({("tlm-bucket", "v1/L2A-31UDQ.parquet"): data})
+    provider = S3TLMProvider(s3_path_pattern="s3://tlm-bucket/v1/{level}-{mgrs_tile}.parquet", s3_client=s3_client)
+    pid = table["product_id"][1000].as_py()
+
+    tlm = provider.get_tlm(pid, "B03")
+    assert tlm == ParquetTLMProvider.from_pyarray(table).get_tlm(pid, "B03")
+
+    # footer, then a single row group
+    assert len(s3_client.requests) == 2
+    assert s3_client.bytes_sent < len(data) * 0.25
+
+    # the row group is already in memory
+    provider.get_tlm(pid, "B04")
+    assert len(s3_client.requests) == 2
+
+    # a single lookup of the parquet file for all the bands
+    hits = provider.stats.hits
+    tlms = provider.get_tlms(pid, ["B02", "B03", "B04", "B08"])
+    assert [tlm.band_id for tlm in tlms] == ["B02", "B03", "B04", "B08"]
+    assert provider.stats.hits == hits + 1
+    assert len(s3_client.requests) == 2
+
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm("S2B_MSIL1C_20170730T111111_N9999_R051_T99AAA_20170730T111111", "B02")
+
+
+def make_disk_cached_provider(tmp_path: Any, s3_client: Any, disk_cache_type: type = ShardDiskCache) -> S3TLMProvider:
+    """
+    S3TLMProvider of a new process, sharing the disk cache of `tmp_path` with the previous ones.
+    """
+    return S3TLMProvider(
+        s3_path_pattern="s3://tlm-bucket/v1/{level}-{mgrs_tile}.parquet",
+        s3_client=s3_client,
+        disk_cache=disk_cache_type(str(tmp_path / "cache")),
+    )
+
+
+def test_s3provider_disk_cache(tmp_path: Any) -> None:
+    import pyarrow.parquet as pq
+    from conftest import FakeS3Client, make_tlm_table
+
+    table = make_tlm_table(20)
+    pq.write_table(table, tmp_path / "tlm.parquet")
+    s3_client = FakeS3Client({("tlm-bucket", "v1/L2A-31UDQ.parquet"): (tmp_path / "tlm.parquet").read_bytes()})
+    pid = table["product_id"][10].as_py()
+
+    # the first process downloads the file
+    tlm = make_disk_cached_provider(tmp_path, s3_client).get_tlm(pid, "B03")
+    assert s3_client.requests[-1]["IfNoneMatch"] is None
+    assert s3_client.bytes_sent == (tmp_path / "tlm.parquet").stat().st_size
+
+    # the second one only revalidates it
+    assert make_disk_cached_provider(tmp_path, s3_client).get_tlm(pid, "B03") == tlm
+    assert s3_client.requests[-1]["IfNoneMatch"] is not None
+    assert s3_client.bytes_sent == (tmp_path / "tlm.parquet").stat().st_size
+
+
+def test_s3provider_disk_cache_modified(tmp_path: Any) -> None:
+    import pyarrow.parquet as pq
+    from conftest import FakeS3Client, make_tlm_table
+
+    table = make_tlm_table(20)
+    pq.write_table(table, tmp_path / "tlm.parquet")
+    s3_client = FakeS3Client({("tlm-bucket", "v1/L2A-31UDQ.parquet"): (tmp_path / "tlm.parquet").read_bytes()})
+    make_disk_cached_provider(tmp_path, s3_client).get_tlm(table["product_id"][10].as_py(), "B03")
+
+    # the file changes on S3, the new version replaces the previous one in the cache
+    table = make_tlm_table(30)
+    pq.write_table(table, tmp_path / "tlm.parquet")
+    s3_client.objects[("tlm-bucket", "v1/L2A-31UDQ.parquet")] = (tmp_path / "tlm.parquet").read_bytes()
+    pid = table["product_id"][25].as_py()
+    assert make_disk_cached_provider(tmp_path, s3_client).get_tlm(pid, "B03") == ParquetTLMProvider.from_pyarray(
+        table
+    ).get_tlm(pid, "B03")
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_s3provider_disk_cache_evicted(tmp_path: Any) -> None:
+    import pyarrow.parquet as pq
+    from conftest import FakeS3Client, make_tlm_table
+
+    table = make_tlm_table(20)
+    pq.write_table(table, tmp_path / "tlm.parquet")
+    s3_client = FakeS3Client({("tlm-bucket", "v1/L2A-31UDQ.parquet"): (tmp_path / "tlm.parquet").read_bytes()})
+    pid = table["product_id"][10].as_py()
+    make_disk_cached_provider(tmp_path, s3_client).get_tlm(pid, "B03")
+
+    # the file is evicted by another process between the revalidation and the open
+    class EvictingDiskCache(ShardDiskCache):
+        def get(self, key: str) -> Any:
+            cached = super().get(key)
+            if cached is not None:
+                os.unlink(cached.path)
+            return cached
+
+    make_disk_cached_provider(tmp_path, s3_client, EvictingDiskCache).get_tlm(pid, "B03")
+    assert [r["IfNoneMatch"] is None for r in s3_client.requests[-2:]] == [False, True]
+
+
+missing_product_id = "S2B_MSIL2A_20170730T111111_N9999_R051_T99AAA_20170730T111111"
+
+
+def test_s3provider_single_flight(tmp_path: Any) -> None:
+    import concurrent.futures
+    import threading
+
+    import pyarrow.parquet as pq
+    from conftest import FakeS3Client, make_tlm_table
+
+    table = make_tlm_table(20)
+    pq.write_table(table, tmp_path / "tlm.parquet")
+
+    class SlowS3Client(FakeS3Client):
+        def get_object(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+            time.sleep(0.05)
+            return super().get_object(*args, **kwargs)
+
+    s3_client = SlowS3Client({("tlm-bucket", "v1/L2A-31UDQ.parquet"): (tmp_path / "tlm.parquet").read_bytes()})
+    provider = S3TLMProvider(s3_path_pattern="s3://tlm-bucket/v1/{level}-{mgrs_tile}.parquet", s3_client=s3_client)
+    product_ids = table["product_id"].to_pylist()
+
+    barrier = threading.Barrier(8)
+
+    def worker(i: int) -> None:
+        barrier.wait()
+        for j in range(20):
+            provider.get_tlm(product_ids[(i + j) % len(product_ids)], "B02")
+            with pytest.raises(TLMIndexNotFound):
+                provider.get_tlm(missing_product_id, "B02")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(worker, range(8)))
+
+    # one load per parquet file, whatever the number of threads and lookups
+    assert provider.stats.loads == 2
+    assert provider.stats.coalesced + provider.stats.hits + provider.stats.negative_hits == 8 * 20 * 2 - 2
+    assert provider.stats.coalesced > 0
+    assert provider.stats.negative_hits > 0
+    assert sum(r["Key"] == "v1/L2A-99AAA.parquet" for r in s3_client.requests) == 1
+
+
+def test_s3provider_negative_cache_traceback() -> None:
+    from conftest import FakeS3Client
+
+    s3_client = FakeS3Client({})
+    provider = S3TLMProvider(s3_path_pattern="s3://tlm-bucket/v1/{level}-{mgrs_tile}.parquet", s3_client=s3_client)
+    with pytest.raises(TLMIndexNotFound):
+        provider.get_tlm(missing_product_id, "B02")
+
+    # the cached exception does not accumulate the frames of the previous lookups
+    depths = []
+    for _ in range(3):
+        with pytest.raises(TLMIndexNotFound) as excinfo:
+            provider.get_tlm(missing_product_id, "B02")
+        depths.append(len(excinfo.traceback))
+    assert depths[0] == depths[1] == depths[2]
+    assert provider.stats.negative_hits == 3
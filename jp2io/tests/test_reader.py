@@ -0,0 +1,112 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import JP2IOException, TLMIndex
+
+product_id = "S2A_MSIL2A_20241016T105031_N0511_R051_T31UDQ_20241016T151206"
+band_id = "B03"
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+@pytest.mark.parametrize(
+    "window",
+    [
+        rasterio.windows.Window(0, 0, 650, 700),
+        rasterio.windows.Window(200, 240, 100, 30),
+        rasterio.windows.Window(600, 650, 50, 50),
+        rasterio.windows.Window(10, 300, 1, 1),
+    ],
+)
+def test_read_window_without_gdal(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex, window: Any) -> None:
+    pytest.importorskip("imagecodecs")
+
+    a = synthetic_tlm_index.read_window(synthetic_jp2.path, window)
+    assert a.dtype == np.uint16
+    assert np.array_equal(a, synthetic_jp2.array[window.toslices()])
+
+    with synthetic_tlm_index.open(synthetic_jp2.path) as src:
+        assert np.array_equal(a, src.read(1, window=window))
+
+    with pytest.raises(JP2IOException):
+        synthetic_tlm_index.read_window(synthetic_jp2.path, rasterio.windows.Window(600, 650, 100, 100))
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+@pytest.mark.parametrize("reduce", [1, 2, 3])
+def test_read_window_reduce(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex, reduce: int) -> None:
+    pytest.importorskip("imagecodecs")
+    import dataclasses
+    import struct
+
+    from conftest import make_counting_range_reader
+
+    from jp2io.codestream import MainHeader
+    from jp2io.index import VirtualTLMIndex
+
+    assert isinstance(synthetic_tlm_index, VirtualTLMIndex)
+    tlm = TLMIndex.from_bytes(synthetic_jp2.index_with_resolution_ends, synthetic_tlm_index.meta)
+    assert isinstance(tlm, VirtualTLMIndex)
+    with rasterio.open(synthetic_jp2.path, OVERVIEW_LEVEL=reduce - 1) as src:
+        expected = src.read(1)
+
+    range_reader = make_counting_range_reader()
+    window = rasterio.windows.Window(0, 0, expected.shape[1], expected.shape[0])
+    a = tlm.read_window(synthetic_jp2.path, window, range_reader=range_reader, reduce=reduce, max_gap=-1)
+    assert np.array_equal(a, expected)
+    # only the beginning of each tile is fetched
+    ranges = tlm.into_tiles_range()
+    assert [length for _, length in range_reader.requests[1:]] == tlm.into_tiles_range(reduce).tiles_length.tolist()
+    assert sum(length for _, length in range_reader.requests[1:]) < ranges.tiles_length.sum() * 0.6
+
+    # without the RESO extension, the full tiles are fetched
+    range_reader = make_counting_range_reader()
+    window = rasterio.windows.Window(3, 5, window.width - 10, window.height - 7)
+    a = synthetic_tlm_index.read_window(synthetic_jp2.path, window, range_reader=range_reader, reduce=reduce)
+    assert np.array_equal(a, expected[window.toslices()])
+    assert range_reader.requests[1][1] == ranges.tiles_length.sum()
+
+    assert tlm.to_bytes() == synthetic_jp2.index_with_resolution_ends
+    with pytest.raises(JP2IOException):
+        tlm.read_window(synthetic_jp2.path, window, reduce=4)
+
+    # a POC marker may change the order of the packets
+    with open(synthetic_jp2.path, "rb") as f:
+        header = MainHeader.parse(f.read(tlm.position_first_sot))
+    poc = struct.pack(">HHBBHBBB", 0xFF5F, 9, 0, 0, 1, header.cod.levels + 1, 1, 0)
+    with pytest.raises(JP2IOException, match="POC"):
+        dataclasses.replace(header, markers=header.markers + poc).reduced(reduce)
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_read_window_reduce_without_plt(synthetic_jp2: Any, tmp_path: Any) -> None:
+    pytest.importorskip("imagecodecs")
+    import struct
+
+    from conftest import index_jp2
+
+    from jp2io.codestream import J2K_MS_PLT, MainHeader
+    from jp2io.index import TLMMetadata, VirtualTLMIndex
+
+    # the packets can not be located in the tiles: the full tiles are fetched and decoded at a reduced resolution
+    path = str(tmp_path / "noplt.jp2")
+    profile = dict(driver="JP2OpenJPEG", width=650, height=700, count=1, dtype="uint16")
+    options = dict(QUALITY=100, REVERSIBLE="YES", RESOLUTIONS=5, PROGRESSION="LRCP", PLT="NO", CODEC="JP2")
+    with rasterio.open(path, "w", **profile, blockxsize=256, blockysize=256, **options) as dst:
+        dst.write(synthetic_jp2.array, 1)
+    with open(path, "rb") as f:
+        data = f.read()
+    tlm = TLMIndex.from_bytes(index_jp2(data), TLMMetadata(product_id=product_id, band_id=band_id, path=path))
+    assert isinstance(tlm, VirtualTLMIndex)
+    ranges = tlm.into_tiles_range()
+    tile_data = data[int(ranges.tiles_position[0]) : int(ranges.tiles_position[0] + ranges.tiles_length[0])]
+    assert MainHeader.parse(data[: tlm.position_first_sot]).cod.resolution_progressive
+    assert struct.pack(">H", J2K_MS_PLT) not in tile_data[: tile_data.index(b"\xff\x93")]
+
+    for reduce in (1, 3):
+        with rasterio.open(path, OVERVIEW_LEVEL=reduce - 1) as src:
+            expected = src.read(1)
+        window = rasterio.windows.Window(7, 3, expected.shape[1] - 7, expected.shape[0] - 3)
+        np.testing.assert_array_equal(tlm.read_window(path, window, reduce=reduce), expected[window.toslices()])
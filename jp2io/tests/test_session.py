@@ -0,0 +1,47 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import ReaderSession, TLMIndex
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_reader_session(synthetic_jp2: Any, synthetic_tlm_index: TLMIndex) -> None:
+    import concurrent.futures
+    import dataclasses
+    import threading
+
+    windows = [rasterio.windows.Window(x, y, 100, 100) for x in range(0, 550, 50) for y in (0, 300)]
+    other_band = TLMIndex.from_bytes(
+        synthetic_jp2.index,
+        dataclasses.replace(synthetic_tlm_index.meta, band_id="B04"),  # type: ignore
+    )
+
+    with ReaderSession(maxsize=1) as session:
+        for w in windows:
+            assert np.array_equal(
+                session.read(synthetic_tlm_index, synthetic_jp2.path, w), synthetic_jp2.array[w.toslices()]
+            )
+        assert (session.stats.opens, session.stats.hits) == (1, len(windows) - 1)
+
+        # same uri, other band: the first dataset is evicted and closed
+        handle = session.dataset(synthetic_tlm_index, synthetic_jp2.path)
+        session.read(other_band, synthetic_jp2.path, windows[0])
+        assert (session.stats.opens, session.stats.evictions) == (2, 1)
+        assert handle.dataset.closed
+
+        # one dataset per thread
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            arrays = list(pool.map(lambda w: session.read(synthetic_tlm_index, synthetic_jp2.path, w), windows))
+        assert all(np.array_equal(a, synthetic_jp2.array[w.toslices()]) for a, w in zip(arrays, windows))
+        assert session.stats.opens <= 2 + 2
+        pool_handles = [h for t, c in session._caches.items() if t is not threading.main_thread() for h in c.values()]
+
+        # the datasets of the threads of the pool are closed once they have exited
+        last = session.dataset(synthetic_tlm_index, synthetic_jp2.path)
+        assert list(session._caches) == [threading.main_thread()]
+        assert pool_handles and all(h.dataset.closed for h in pool_handles)
+
+    assert last.dataset.closed
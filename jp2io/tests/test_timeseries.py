@@ -0,0 +1,111 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+
+from jp2io import ParquetTLMProvider, ReaderSession, TLMIndex
+
+
+def test_is_rate_limited() -> None:
+    from jp2io.timeseries import is_rate_limited
+
+    assert is_rate_limited(rasterio.errors.RasterioIOError("HTTP response code: 429"))
+    assert is_rate_limited(RuntimeError("/vsis3/bucket/B04.jp2: HTTP error code: 429 - Too Many Requests"))
+    assert not is_rate_limited(rasterio.errors.RasterioIOError("HTTP response code: 404"))
+    assert not is_rate_limited(RuntimeError("invalid codestream: expected a SOT marker at 429"))
+    assert not is_rate_limited(RuntimeError("tile 429: only tiles in a single tile-part are supported"))
+
+
+product_ids = [f"S2A_MSIL2A_2024{month:02d}16T105031_N0511_R051_T31UDQ_20241016T151206" for month in (5, 1, 3, 2)]
+window = rasterio.windows.Window(300, 200, 80, 50)
+
+
+@pytest.fixture
+def provider(synthetic_jp2: Any) -> ParquetTLMProvider:
+    """
+    B04 of the products, all the same raster `synthetic_jp2`.
+    """
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            "product_id": product_ids,
+            "band_id": ["B04"] * len(product_ids),
+            "path": [synthetic_jp2.path] * len(product_ids),
+            "index": [synthetic_jp2.index] * len(product_ids),
+        }
+    )
+    return ParquetTLMProvider.from_pyarray(table)
+
+
+class FlakySession(ReaderSession):
+    """fails with a 429 on the first read of each product"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.failures: set[str] = set()
+
+    def read(self, tlm: TLMIndex, uri: str, window: Any, indexes: Any = 1) -> Any:
+        if tlm.product_id not in self.failures:
+            self.failures.add(tlm.product_id)
+            raise rasterio.errors.RasterioIOError("HTTP response code: 429")
+        return super().read(tlm, uri, window, indexes)
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_extract_timeseries(synthetic_jp2: Any, provider: ParquetTLMProvider, tmp_path: Any) -> None:
+    from jp2io.timeseries import RetryPolicy, extract_timeseries
+
+    out = np.lib.format.open_memmap(tmp_path / "out.npy", mode="w+", dtype=np.uint16, shape=(4, 50, 80))
+    with FlakySession() as session:
+        items = list(
+            extract_timeseries(
+                provider,
+                product_ids,
+                "B04",
+                window,
+                uri_of=lambda tlm: tlm.path,
+                out=out,
+                max_workers=2,
+                retry=RetryPolicy(initial_delay=0.01),
+                session=session,
+            )
+        )
+    # sorted by date, the rate limited reads being retried
+    assert [item.index for item in items] == [0, 1, 2, 3]
+    assert [item.time.month for item in items] == [1, 2, 3, 5]
+    assert np.array_equal(out, np.stack([synthetic_jp2.array[window.toslices()]] * 4))
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_extract_timeseries_max_attempts(provider: ParquetTLMProvider) -> None:
+    from jp2io.timeseries import RetryPolicy, extract_timeseries
+
+    with FlakySession() as session, pytest.raises(rasterio.errors.RasterioIOError):
+        list(
+            extract_timeseries(
+                provider,
+                product_ids,
+                "B04",
+                window,
+                uri_of=lambda tlm: tlm.path,
+                retry=RetryPolicy(max_attempts=1),
+                session=session,
+            )
+        )
+
+
+@pytest.mark.filterwarnings("ignore::rasterio.errors.NotGeoreferencedWarning")
+def test_extract_timeseries_session(provider: ParquetTLMProvider) -> None:
+    from jp2io.timeseries import extract_timeseries
+
+    # the datasets of a session are reused from one call to the next (the products share the same raster here)
+    with ReaderSession(maxsize=2, max_workers=2) as session:
+        for _ in range(5):
+            items = list(
+                extract_timeseries(provider, product_ids, "B04", window, uri_of=lambda tlm: tlm.path, session=session)
+            )
+            assert len(items) == 4
+        assert session.stats.opens <= 2
+        assert session.stats.hits == 5 * 4 - session.stats.opens
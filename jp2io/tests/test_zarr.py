@@ -0,0 +1,133 @@
+from typing import Any
+
+import numpy as np
+import pytest
+
+from jp2io import ParquetTLMProvider
+
+
+def test_zarr_codec_batch_decode(monkeypatch: Any) -> None:
+    pytest.importorskip("zarr")
+    import asyncio
+    import threading
+
+    from jp2io.zarr import codec
+
+    threads = set()
+
+    def fake_decode(chunk_data: Any, chunk_spec: Any, reduce: int) -> Any:
+        threads.add(threading.current_thread().name)
+        return (chunk_data, reduce)
+
+    monkeypatch.setattr(codec, "_decode_jp2_tile", fake_decode)
+    codec.set_decoder_pool_size(2)
+    chunks = [(None if i % 3 == 0 else f"chunk{i}", None) for i in range(10)]
+    decoded = asyncio.run(codec.Sentinel2Jpeg2000Codec(reduce=1).decode(chunks))  # type: ignore[arg-type]
+    assert list(decoded) == [None if data is None else (data, 1) for data, _ in chunks]
+    assert threads and all(name.startswith("jp2io-zarr-decode") for name in threads)
+    codec.set_decoder_pool_size(None)
+
+    # the header is built once per geometry, the tile data is only copied into the codestream
+    assert codec.sentinel2_main_header(1024, 10980, 10980, 2) is codec.sentinel2_main_header(1024, 10980, 10980, 2)
+    assert codec.sentinel2_main_header(1024, 10980, 10980, 2).reduce == 2
+
+    # decode-only
+    with pytest.raises(NotImplementedError):
+        codec.Sentinel2Jpeg2000Codec().compute_encoded_size(1024, None)  # type: ignore[arg-type]
+
+
+def test_zarr_codec_metadata() -> None:
+    codec = pytest.importorskip("jp2io.zarr.codec", exc_type=ImportError)
+
+    metadata = codec.Sentinel2Jpeg2000Codec(reduce=2).to_dict()
+    assert metadata == {"name": "jp2io.zarr.Sentinel2Jpeg2000Codec", "configuration": {"reduce": 2}}
+    assert codec.Sentinel2Jpeg2000Codec.from_dict(metadata).reduce == 2
+    # written before the codec had a configuration
+    legacy = {"name": "jp2io.zarr.Sentinel2Jpeg2000Codec", "id": "jp2io.zarr.Sentinel2Jpeg2000Codec", "reduce": 1}
+    assert codec.Sentinel2Jpeg2000Codec.from_dict(legacy).reduce == 1
+
+
+@pytest.mark.filterwarnings("ignore:Times can't be serialized faithfully")
+def test_append_kerchunk_refs() -> None:
+    virtualizarr = pytest.importorskip("jp2io.zarr.virtualizarr", exc_type=ImportError)
+    import base64
+    import json
+
+    def make_refs(times: list[str], units: str) -> dict[str, Any]:
+        # as written by virtualizarr: (time, y, x) bands chunked by product, and the times inlined in a single chunk
+        n = len(times)
+        seconds = (np.array(times, dtype="datetime64[s]") - np.datetime64("2015-01-01", "s")).astype("<i8")
+        values = seconds // {"days": 86400, "seconds": 1}[units]
+        zarray = {"dtype": "<u2", "chunks": [1, 2, 2], "compressor": None, "filters": None, "dimension_separator": "."}
+        refs: dict[str, Any] = {
+            ".zgroup": json.dumps({"zarr_format": 2}),
+            "B02/.zarray": json.dumps(zarray | {"shape": [n, 4, 4]}),
+            "B02/.zattrs": json.dumps({"_ARRAY_DIMENSIONS": ["time", "y", "x"]}),
+            "time/.zarray": json.dumps(
+                {"shape": [n], "chunks": [n], "dtype": "<i8", "compressor": None, "filters": None}
+            ),
+            "time/.zattrs": json.dumps({"units": f"{units} since 2015-01-01", "_ARRAY_DIMENSIONS": ["time"]}),
+            "time/0": "base64:" + base64.b64encode(values.tobytes()).decode(),
+        }
+        for t in range(n):
+            for y in range(2):
+                for x in range(2):
+                    refs[f"B02/{t}.{y}.{x}"] = [f"s3://DIAS/{times[t]}.jp2", 1000 + y * 2 + x, 10]
+        return refs
+
+    refs = make_refs(["2024-01-01", "2024-01-06"], "days")
+    new_refs = make_refs(["2024-01-11T10:50:31", "2024-01-16T10:50:31"], "seconds")
+    virtualizarr.append_kerchunk_refs(refs, new_refs)
+
+    assert json.loads(refs["B02/.zarray"])["shape"] == [4, 4, 4]
+    assert refs["B02/3.1.0"] == ["s3://DIAS/2024-01-16T10:50:31.jp2", 1002, 10]
+    assert refs["B02/0.1.0"] == ["s3://DIAS/2024-01-01.jp2", 1002, 10]
+    times = virtualizarr._read_kerchunk_times(refs)
+    assert (
+        times.astype("datetime64[s]").tolist()
+        == np.array(
+            ["2024-01-01", "2024-01-06", "2024-01-11T10:50:31", "2024-01-16T10:50:31"], dtype="datetime64[s]"
+        ).tolist()
+    )
+    # the days of the existing references can not represent the new times
+    assert json.loads(refs["time/.zattrs"])["units"].startswith("seconds")
+
+
+def test_kerchunk_parquet_roundtrip(tmp_path: Any) -> None:
+    virtualizarr = pytest.importorskip("jp2io.zarr.virtualizarr", exc_type=ImportError)
+    pytest.importorskip("jp2io.zarr.codec")  # register the codec
+    import json
+
+    import fsspec
+    import xarray as xr
+    from conftest import make_tlm_table
+
+    table = make_tlm_table(30)
+    datacube = virtualizarr.Sentinel2Datacube(
+        store_registry=virtualizarr.ObjectStoreRegistry({}), tlm_provider=ParquetTLMProvider.from_pyarray(table)
+    )
+    refs = dict(virtualizarr.iter_kerchunk_refs(datacube, overviews=2, batch_size=7))
+    output_path = str(tmp_path / "cube.kerchunk")
+    virtualizarr.write_kerchunk_parquet(
+        virtualizarr.iter_kerchunk_refs(datacube, overviews=2, batch_size=7), output_path, record_size=500
+    )
+
+    # the chunks are the ones of the cube built in memory
+    expected = datacube.open_all(reduce=2).vz.to_kerchunk(format="dict")["refs"]
+    assert {key: refs[f"2/{key}"] for key in expected if key.startswith("B03/") and "/." not in key} == {
+        key: value for key, value in expected.items() if key.startswith("B03/") and "/." not in key
+    }
+
+    fs = fsspec.filesystem("reference", fo=output_path, remote_protocol="file", skip_instance_cache=True)
+    for key in list(refs)[::97]:
+        value = fs.references[key]
+        if key.rsplit("/", 1)[-1].startswith("."):
+            assert json.loads(value) == json.loads(refs[key])
+        elif not key.endswith("time/0"):
+            assert [value[0], int(value[1]), int(value[2])] == refs[key]
+
+    ds = xr.open_zarr(fs.get_mapper("1"), consolidated=False, zarr_format=2)
+    assert ds.sizes == {"time": 30, "y": 5490, "x": 5490}
+    assert ds["time"].values.astype("datetime64[s]").tolist() == [
+        virtualizarr.product_time(pid) for pid in datacube.product_ids()
+    ]
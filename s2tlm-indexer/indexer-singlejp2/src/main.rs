@@ -12,6 +12,14 @@ struct Cli {
 
     #[arg(short, long)]
     full_jp2: bool,
+
+    /// Embed the JP2 main header in the index (ignored with --full-jp2)
+    #[arg(short, long)]
+    embed_main_header: bool,
+
+    /// Record the end of each resolution level in each tile, to read overviews (ignored with --full-jp2)
+    #[arg(short, long)]
+    resolution_ends: bool,
 }
 
 #[tokio::main]
@@ -31,20 +39,26 @@ async fn main() -> Result<()> {
     let length = stat.content_length() as usize;
     let reader = operator.reader(path).await.unwrap();
 
-    let idx = indexer::make_index(reader.clone(), length).await.unwrap();
+    let options = indexer::IndexOptions {
+        embed_main_header: cli.embed_main_header && !cli.full_jp2,
+        resolution_ends: cli.resolution_ends && !cli.full_jp2,
+    };
+    let idx = indexer::make_index_with_options(reader.clone(), length, &options)
+        .await
+        .unwrap();
 
     let mut file = std::fs::File::create(cli.output)?;
 
     if cli.full_jp2 {
         let file_length = u64::from_be_bytes(idx[0..8].try_into().unwrap());
         let position_first_sot = u64::from_be_bytes(idx[8..16].try_into().unwrap());
-        let _full_tlm_segment_length = u32::from_be_bytes(idx[16..20].try_into().unwrap());
+        let full_tlm_segment_length = u32::from_be_bytes(idx[16..20].try_into().unwrap()) as usize;
 
         let buf = reader.read(0..position_first_sot).await?;
         let buf = buf.to_vec();
         file.write_all(&buf)?;
 
-        file.write_all(&idx[20..])?;
+        file.write_all(&idx[20..20 + full_tlm_segment_length])?;
 
         let buf = reader.read(position_first_sot..file_length).await?;
         let buf = buf.to_vec();
@@ -14,8 +14,18 @@ const JP2_JP2C: u32 = 0x6a703263;
 
 /// SOC marker value
 const J2K_MS_SOC: u16 = 0xff4f;
+/// SIZ marker value
+const J2K_MS_SIZ: u16 = 0xff51;
+/// COD marker value
+const J2K_MS_COD: u16 = 0xff52;
+/// COC marker value
+const J2K_MS_COC: u16 = 0xff53;
 /// TLM marker value
 const J2K_MS_TLM: u16 = 0xff55;
+/// PLT marker value
+const J2K_MS_PLT: u16 = 0xff58;
+/// POC marker value
+const J2K_MS_POC: u16 = 0xff5f;
 /// SOT marker value
 const J2K_MS_SOT: u16 = 0xff90;
 /// SOD marker value
@@ -23,6 +33,23 @@ const J2K_MS_SOD: u16 = 0xff93;
 /// EOC marker value
 const J2K_MS_EOC: u16 = 0xffd9;
 
+/// Index extension containing the beginning of the JP2 file, until the first SOT marker
+const INDEX_EXTENSION_MAIN_HEADER: &[u8; 4] = b"MHDR";
+/// Index extension containing, for each tile, the position where the packets of each resolution level end
+const INDEX_EXTENSION_RESOLUTION_ENDS: &[u8; 4] = b"RESO";
+
+/// Options of the generated index
+#[derive(Debug, Default, Clone)]
+pub struct IndexOptions {
+    /// Embed the JP2 boxes and the codestream main header in the index,
+    /// so that readers do not need to fetch them from the original file.
+    pub embed_main_header: bool,
+    /// Record the end of each resolution level in each tile, read from the PLT markers,
+    /// so that readers can fetch only the beginning of the tiles to decode them at a reduced resolution.
+    /// Requires to read the header of each tile.
+    pub resolution_ends: bool,
+}
+
 #[derive(Debug)]
 struct BoxHeader {
     boxtype: u32,
@@ -112,6 +139,207 @@ impl SOTMarker {
     }
 }
 
+/// Content of the SIZ marker needed to locate the packets of a tile
+#[derive(Debug)]
+struct ImageAndTileSize {
+    xsiz: u32,
+    ysiz: u32,
+    xosiz: u32,
+    yosiz: u32,
+    xtsiz: u32,
+    ytsiz: u32,
+    xtosiz: u32,
+    ytosiz: u32,
+    /// (XRsiz, YRsiz) of each component
+    components: Vec<(u8, u8)>,
+}
+
+impl ImageAndTileSize {
+    /// `s` starts after Lsiz
+    fn from_marker(s: &[u8]) -> Result<Self> {
+        anyhow::ensure!(s.len() >= 36, "incomplete SIZ marker");
+        let u32_at = |i: usize| u32::from_be_bytes(s[i..i + 4].try_into().unwrap());
+        let csiz = u16::from_be_bytes(s[34..36].try_into().unwrap()) as usize;
+        anyhow::ensure!(s.len() >= 36 + 3 * csiz, "incomplete SIZ marker");
+        let components = (0..csiz)
+            .map(|c| (s[36 + 3 * c + 1], s[36 + 3 * c + 2]))
+            .collect();
+
+        Ok(ImageAndTileSize {
+            xsiz: u32_at(2),
+            ysiz: u32_at(6),
+            xosiz: u32_at(10),
+            yosiz: u32_at(14),
+            xtsiz: u32_at(18),
+            ytsiz: u32_at(22),
+            xtosiz: u32_at(26),
+            ytosiz: u32_at(30),
+            components,
+        })
+    }
+
+    /// (x0, y0, x1, y1) of the tile on the reference grid
+    fn tile_bounds(&self, isot: u16) -> (u64, u64, u64, u64) {
+        let n_tiles_x = (self.xsiz - self.xtosiz).div_ceil(self.xtsiz);
+        let p = isot as u32 % n_tiles_x;
+        let q = isot as u32 / n_tiles_x;
+        let x0 = (self.xtosiz + p * self.xtsiz).max(self.xosiz);
+        let y0 = (self.ytosiz + q * self.ytsiz).max(self.yosiz);
+        let x1 = (self.xtosiz + (p + 1) * self.xtsiz).min(self.xsiz);
+        let y1 = (self.ytosiz + (q + 1) * self.ytsiz).min(self.ysiz);
+        (x0 as u64, y0 as u64, x1 as u64, y1 as u64)
+    }
+}
+
+/// Content of the COD marker needed to locate the packets of a tile
+#[derive(Debug)]
+struct CodingStyle {
+    progression: u8,
+    layers: u16,
+    /// number of decomposition levels (NL), the tiles have NL + 1 resolution levels
+    levels: u8,
+    /// (PPx, PPy) of each resolution level, from the lowest
+    precincts: Vec<(u8, u8)>,
+}
+
+impl CodingStyle {
+    /// `s` starts after Lcod
+    fn from_marker(s: &[u8]) -> Result<Self> {
+        anyhow::ensure!(s.len() >= 10, "incomplete COD marker");
+        let levels = s[5];
+        let precincts = if s[0] & 0x01 != 0 {
+            anyhow::ensure!(s.len() >= 10 + levels as usize + 1, "incomplete COD marker");
+            s[10..10 + levels as usize + 1]
+                .iter()
+                .map(|p| (p & 0x0f, p >> 4))
+                .collect()
+        } else {
+            vec![(15, 15); levels as usize + 1]
+        };
+
+        Ok(CodingStyle {
+            progression: s[1],
+            layers: u16::from_be_bytes(s[2..4].try_into().unwrap()),
+            levels,
+            precincts,
+        })
+    }
+
+    /// True if, in each tile, the packets of a resolution level come before the packets of the higher levels
+    /// (LRCP with a single layer, RLCP, RPCL)
+    fn resolution_progressive(&self) -> bool {
+        self.progression == 1
+            || self.progression == 2
+            || (self.progression == 0 && self.layers == 1)
+    }
+
+    /// Number of packets of each resolution level of the tile, all components and layers included
+    fn packets_per_resolution(&self, siz: &ImageAndTileSize, isot: u16) -> Vec<usize> {
+        let (x0, y0, x1, y1) = siz.tile_bounds(isot);
+        let mut packets = Vec::with_capacity(self.precincts.len());
+        for (r, &(ppx, ppy)) in self.precincts.iter().enumerate() {
+            let scale = 1u64 << (self.levels as usize - r);
+            let mut n = 0;
+            for &(dx, dy) in &siz.components {
+                let (dx, dy) = (dx as u64, dy as u64);
+                // bounds of the tile-component at this resolution level
+                let rx0 = x0.div_ceil(dx).div_ceil(scale);
+                let rx1 = x1.div_ceil(dx).div_ceil(scale);
+                let ry0 = y0.div_ceil(dy).div_ceil(scale);
+                let ry1 = y1.div_ceil(dy).div_ceil(scale);
+                if rx1 > rx0 && ry1 > ry0 {
+                    let nx = rx1.div_ceil(1 << ppx) - (rx0 >> ppx);
+                    let ny = ry1.div_ceil(1 << ppy) - (ry0 >> ppy);
+                    n += (nx * ny) as usize;
+                }
+            }
+            packets.push(n * self.layers as usize);
+        }
+        packets
+    }
+}
+
+/// Append the packet lengths of a PLT marker (`s` starts after Lplt) to `out`
+fn parse_plt(s: &[u8], out: &mut Vec<u32>) {
+    // Zplt, then values of 7 bits per byte, the highest bit being set on all the bytes of a value except the last one
+    let mut value = 0u32;
+    for b in &s[1..] {
+        value = (value << 7) | (b & 0x7f) as u32;
+        if b & 0x80 == 0 {
+            out.push(value);
+            value = 0;
+        }
+    }
+}
+
+/// Position relative to the SOT marker where the packets of each resolution level end,
+/// `None` if the tile-part header has no PLT marker.
+async fn read_resolution_ends(
+    reader: &mut CachedReader,
+    sot_marker: &MarkerHeader,
+    siz: &ImageAndTileSize,
+    cod: &CodingStyle,
+    isot: u16,
+) -> Result<Option<Vec<u32>>> {
+    let tile_start = sot_marker.data_start - 4;
+    let mut cur = sot_marker.data_start + sot_marker.data_length;
+
+    let mut packet_lengths = Vec::new();
+    let mut has_plt = false;
+    loop {
+        let marker = MarkerHeader::read(reader, &mut cur).await?;
+        if marker.code == J2K_MS_SOD {
+            break;
+        }
+        if marker.code == J2K_MS_PLT {
+            let s = reader
+                .read(marker.data_start..marker.data_start + marker.data_length)
+                .await?;
+            anyhow::ensure!(s.len() >= marker.data_length, "incomplete PLT read");
+            parse_plt(&s[..marker.data_length], &mut packet_lengths);
+            has_plt = true;
+        }
+    }
+    if !has_plt {
+        return Ok(None);
+    }
+
+    let mut end = (cur - tile_start) as u32;
+    let mut n = 0;
+    let mut ends = Vec::with_capacity(cod.precincts.len());
+    for count in cod.packets_per_resolution(siz, isot) {
+        anyhow::ensure!(
+            n + count <= packet_lengths.len(),
+            "tile {isot}: missing packets in PLT"
+        );
+        end += packet_lengths[n..n + count].iter().sum::<u32>();
+        n += count;
+        ends.push(end);
+    }
+    anyhow::ensure!(
+        n == packet_lengths.len(),
+        "tile {isot}: expected {n} packets, found {} in PLT",
+        packet_lengths.len()
+    );
+    Ok(Some(ends))
+}
+
+/// Payload of the RESO extension: the number of resolution levels (u8),
+/// then for each tile and each resolution level, the position relative to the SOT marker where its packets end (u32).
+fn generate_resolution_ends(mut ends: Vec<(u16, Vec<u32>)>) -> Vec<u8> {
+    ends.sort_by_key(|(isot, _)| *isot);
+    let n_resolutions = ends.first().map_or(0, |(_, e)| e.len());
+
+    let mut out = Vec::with_capacity(1 + 4 * n_resolutions * ends.len());
+    out.push(n_resolutions as u8);
+    for (_, e) in ends {
+        for end in e {
+            out.extend_from_slice(&end.to_be_bytes());
+        }
+    }
+    out
+}
+
 #[derive(Debug)]
 struct JP2FileMetadata {
     file_length: u64,
@@ -217,7 +445,23 @@ fn generate_tlmindex(file_metadata: &JP2FileMetadata, mut tile_entries: Vec<SOTM
     out
 }
 
+/// Append an extension to an index: tag (4 bytes), u32 big endian length, payload.
+/// Indexes without extensions remain valid, and readers ignore the extensions they do not know.
+fn append_extension(out: &mut Vec<u8>, tag: &[u8; 4], payload: &[u8]) {
+    out.extend_from_slice(tag);
+    out.extend_from_slice(&(payload.len() as u32).to_be_bytes());
+    out.extend_from_slice(payload);
+}
+
 pub async fn make_index(reader: Reader, length: usize) -> anyhow::Result<Vec<u8>> {
+    make_index_with_options(reader, length, &IndexOptions::default()).await
+}
+
+pub async fn make_index_with_options(
+    reader: Reader,
+    length: usize,
+    options: &IndexOptions,
+) -> anyhow::Result<Vec<u8>> {
     let mut reader = CachedReader::from(reader, length).await?;
 
     let mut cur = 0;
@@ -234,17 +478,64 @@ pub async fn make_index(reader: Reader, length: usize) -> anyhow::Result<Vec<u8>
     let mut marker = MarkerHeader::read(&mut reader, &mut cur).await?;
     assert!(marker.code == J2K_MS_SOC);
 
-    // look for the first SOT marker, skipping the other ones (SIZ, etc)
-    while marker.code != J2K_MS_SOT {
+    // look for the first SOT marker, skipping the other ones (SIZ, etc); a codestream may have no tile at all
+    let mut siz = None;
+    let mut cod = None;
+    let mut has_coc = false;
+    let mut has_poc = false;
+    while marker.code != J2K_MS_SOT && marker.code != J2K_MS_EOC {
         anyhow::ensure!(marker.code != J2K_MS_TLM, "file already has a TLM marker");
         if marker.code == J2K_MS_TLM {
             return Ok(vec![]);
         }
 
+        if options.resolution_ends && (marker.code == J2K_MS_SIZ || marker.code == J2K_MS_COD) {
+            let (i, j) = (marker.data_start, marker.data_start + marker.data_length);
+            let s = reader.read(i..j).await?;
+            anyhow::ensure!(s.len() >= j - i, "incomplete marker read");
+            if marker.code == J2K_MS_SIZ {
+                siz = Some(ImageAndTileSize::from_marker(&s[..j - i])?);
+            } else {
+                cod = Some(CodingStyle::from_marker(&s[..j - i])?);
+            }
+        }
+        has_coc |= marker.code == J2K_MS_COC;
+        has_poc |= marker.code == J2K_MS_POC;
+
         marker = MarkerHeader::read(&mut reader, &mut cur).await?;
     }
 
-    let position_first_sot = (marker.data_start - 4) as u64;
+    // the resolution levels can only be located if they are in the same order in all the tiles and components,
+    // and if the progression order of the COD marker is not changed by a POC marker
+    let layout = match (siz, cod) {
+        (Some(siz), Some(cod)) if cod.resolution_progressive() && !has_coc && !has_poc => {
+            Some((siz, cod))
+        }
+        _ => {
+            if options.resolution_ends {
+                log::warn!(
+                    "codestream not resolution-progressive, the end of the resolution levels is not indexed"
+                );
+            }
+            None
+        }
+    };
+    let mut resolution_ends = layout
+        .as_ref()
+        .map(|_| Vec::<(u16, Vec<u32>)>::with_capacity(121));
+
+    // the EOC marker has no length
+    let marker_header_length = if marker.code == J2K_MS_EOC { 2 } else { 4 };
+    let position_first_sot = (marker.data_start - marker_header_length) as u64;
+
+    let main_header = if options.embed_main_header {
+        let end = position_first_sot as usize;
+        let s = reader.read(0..end).await?;
+        anyhow::ensure!(s.len() >= end, "incomplete main header read");
+        Some(s[..end].to_vec())
+    } else {
+        None
+    };
 
     // Sentinel-2 10m bands have 121 tiles (except TCI which has many more)
     let mut tile_entries = Vec::<_>::with_capacity(121);
@@ -267,6 +558,19 @@ pub async fn make_index(reader: Reader, length: usize) -> anyhow::Result<Vec<u8>
         anyhow::ensure!(sot.tpsot == 0, "only TpSOT=0 is supported");
         anyhow::ensure!(sot.tnsot == 1, "only TnSOT=1 is supported");
 
+        if let (Some((siz, cod)), Some(ends)) = (&layout, &mut resolution_ends) {
+            match read_resolution_ends(&mut reader, &marker, siz, cod, sot.isot).await? {
+                Some(e) => ends.push((sot.isot, e)),
+                None => {
+                    log::warn!(
+                        "tile {} has no PLT marker, the end of the resolution levels is not indexed",
+                        sot.isot
+                    );
+                    resolution_ends = None;
+                }
+            }
+        }
+
         // jump to the next SOT, skipping the SOD
         let sot_marker_length = 4;
         cur += sot.psot as usize - marker.data_length - sot_marker_length;
@@ -282,6 +586,101 @@ pub async fn make_index(reader: Reader, length: usize) -> anyhow::Result<Vec<u8>
     };
 
     // generate the TLM index
-    let tlm = generate_tlmindex(&file_metadata, tile_entries);
+    let mut tlm = generate_tlmindex(&file_metadata, tile_entries);
+
+    if let Some(main_header) = main_header {
+        append_extension(&mut tlm, INDEX_EXTENSION_MAIN_HEADER, &main_header);
+    }
+
+    // without tiles, there is no resolution level to record
+    if let Some(resolution_ends) = resolution_ends.filter(|ends| !ends.is_empty()) {
+        let payload = generate_resolution_ends(resolution_ends);
+        append_extension(&mut tlm, INDEX_EXTENSION_RESOLUTION_ENDS, &payload);
+    }
+
     Ok(tlm)
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use opendal::Operator;
+    use opendal::services::Memory;
+
+    /// 120x100 lossless JP2 written by GDAL: 2 components, 32x32 tiles (partial on the right and bottom edges),
+    /// LRCP with a single layer, precincts and PLT markers
+    const SAMPLE_JP2: &[u8] = include_bytes!("../test-data/plt-tiles.jp2");
+    /// Index of SAMPLE_JP2 with the RESO extension, made by the Python package from the same file:
+    /// `jp2io.indexer.make_index("plt-tiles.jp2", resolution_ends=True)`, whose resolution ends are computed by
+    /// `MainHeader.resolution_ends`, the code that reads them back
+    const SAMPLE_INDEX: &[u8] = include_bytes!("../test-data/plt-tiles.index");
+
+    async fn index(data: &[u8], options: &IndexOptions) -> Vec<u8> {
+        let operator = Operator::new(Memory::default()).unwrap().finish();
+        operator.write("sample.jp2", data.to_vec()).await.unwrap();
+        let reader = operator.reader("sample.jp2").await.unwrap();
+        make_index_with_options(reader, data.len(), options)
+            .await
+            .unwrap()
+    }
+
+    fn without_extensions(index: &[u8]) -> &[u8] {
+        let tlm_segment_length = u32::from_be_bytes(index[16..20].try_into().unwrap()) as usize;
+        &index[..20 + tlm_segment_length]
+    }
+
+    #[tokio::test]
+    async fn test_resolution_ends_match_python() {
+        let options = IndexOptions {
+            resolution_ends: true,
+            ..Default::default()
+        };
+        assert_eq!(index(SAMPLE_JP2, &options).await, SAMPLE_INDEX);
+        assert_eq!(
+            index(SAMPLE_JP2, &IndexOptions::default()).await,
+            without_extensions(SAMPLE_INDEX)
+        );
+    }
+
+    #[tokio::test]
+    async fn test_resolution_ends_skipped_with_poc() {
+        // POC marker (one progression: resolutions 0 to 3, components 0 to 1, LRCP) before the first SOT
+        let position_first_sot =
+            u64::from_be_bytes(SAMPLE_INDEX[8..16].try_into().unwrap()) as usize;
+        let mut data = SAMPLE_JP2[..position_first_sot].to_vec();
+        data.extend_from_slice(&[0xff, 0x5f, 0x00, 0x09, 0, 0, 0x00, 0x01, 4, 2, 0]);
+        data.extend_from_slice(&SAMPLE_JP2[position_first_sot..]);
+
+        let options = IndexOptions {
+            resolution_ends: true,
+            ..Default::default()
+        };
+        let index = index(&data, &options).await;
+        assert_eq!(index, self::index(&data, &IndexOptions::default()).await);
+        assert!(
+            !index
+                .windows(4)
+                .any(|w| w == INDEX_EXTENSION_RESOLUTION_ENDS)
+        );
+    }
+
+    #[tokio::test]
+    async fn test_resolution_ends_without_tiles() {
+        // the main header directly followed by the EOC marker
+        let position_first_sot =
+            u64::from_be_bytes(SAMPLE_INDEX[8..16].try_into().unwrap()) as usize;
+        let mut data = SAMPLE_JP2[..position_first_sot].to_vec();
+        data.extend_from_slice(&J2K_MS_EOC.to_be_bytes());
+
+        let options = IndexOptions {
+            resolution_ends: true,
+            ..Default::default()
+        };
+        let index = index(&data, &options).await;
+        assert_eq!(index, self::index(&data, &IndexOptions::default()).await);
+        assert_eq!(
+            u64::from_be_bytes(index[8..16].try_into().unwrap()) as usize,
+            position_first_sot
+        );
+    }
+}
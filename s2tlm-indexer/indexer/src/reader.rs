@@ -24,18 +24,19 @@ impl CachedReader {
     /// might return a vec smaller than range.len() in case of end of file
     /// might return a vec larger than range.len() because of prefetching
     pub async fn read(&mut self, range: Range<usize>) -> std::io::Result<&[u8]> {
-        let bytes = if range.end < self.last_offset + self.last.len() {
-            let range = (range.start - self.last_offset)..(range.end - self.last_offset);
-            &self.last[range]
-        } else {
-            let end = (range.end + 128_usize.saturating_sub(range.len())).min(self.length) as _;
-            let r = (range.start as u64)..end;
-            log::debug!("{:?}", &r);
-            let bytes = self.reader.read(r).await?.to_vec();
-            self.last = bytes;
-            self.last_offset = range.start;
-            &self.last
-        };
+        let bytes =
+            if range.start >= self.last_offset && range.end < self.last_offset + self.last.len() {
+                let range = (range.start - self.last_offset)..(range.end - self.last_offset);
+                &self.last[range]
+            } else {
+                let end = (range.end + 128_usize.saturating_sub(range.len())).min(self.length) as _;
+                let r = (range.start as u64)..end;
+                log::debug!("{:?}", &r);
+                let bytes = self.reader.read(r).await?.to_vec();
+                self.last = bytes;
+                self.last_offset = range.start;
+                &self.last
+            };
         Ok(bytes)
     }
 }